@@ -0,0 +1,543 @@
+"""Sales analytics: a day-partitioned Parquet order log with incremental rollups.
+
+Checkout hands every completed order to ``SalesAnalytics.record``. A
+background writer batches them and appends each batch as new Parquet part
+files, one per day, under ``data/analytics``:
+
+    orders/day=YYYY-MM-DD/part-*.parquet       one row per order
+    order_lines/day=YYYY-MM-DD/part-*.parquet  one row per cart line
+    promotions/day=YYYY-MM-DD/part-*.parquet   one row per applied promotion
+
+Right after a part is written its aggregates are added to the rollup tables
+in ``rollups.db`` (revenue per day, per material and per promotion/discount
+code), in the same transaction that records the part as applied. Parts are
+therefore counted exactly once even with several server processes, and a
+crash between the two steps is repaired by ``catch_up`` on the next start.
+The admin dashboard reads only the rollups, so it costs the same after
+years of orders; the raw parts stay available to ``scan`` for ad-hoc
+analysis.
+
+``python analytics.py rebuild`` recomputes the rollups from the parts and
+``python analytics.py compact`` merges each past day's small parts into one
+file. The merged file is staged under a name scans ignore and swapped in
+only after the rollups record what it replaces, so an interrupted compaction
+is finished on the next start and never counts an order twice.
+"""
+import argparse
+import atexit
+import glob
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from orders import DATA_DIR, connect
+
+ANALYTICS_DIR = os.path.join(DATA_DIR, "analytics")
+BATCH_SIZE = 500          # orders per part file at most
+FLUSH_INTERVAL = 2.0      # seconds the writer waits to fill a batch
+STALE_STAGED_SECONDS = 3600  # staged files older than this with no committed compaction are leftovers
+
+logger = logging.getLogger(__name__)
+
+SCHEMAS = {
+    "orders": pa.schema([
+        ("invoice_number", pa.string()),
+        ("created_at", pa.timestamp("s")),
+        ("order_type", pa.string()),
+        ("lines", pa.int32()),
+        ("units", pa.int32()),
+        ("subtotal_cents", pa.int64()),
+        ("shipping_cents", pa.int64()),
+        ("tax_cents", pa.int64()),
+        ("discount_cents", pa.int64()),
+        ("total_cents", pa.int64()),
+    ]),
+    "order_lines": pa.schema([
+        ("invoice_number", pa.string()),
+        ("created_at", pa.timestamp("s")),
+        ("product_id", pa.string()),
+        ("material", pa.string()),
+        ("quantity", pa.int32()),
+        ("unit_cents", pa.int64()),
+        ("line_cents", pa.int64()),
+    ]),
+    "promotions": pa.schema([
+        ("invoice_number", pa.string()),
+        ("created_at", pa.timestamp("s")),
+        ("promotion_id", pa.string()),
+        ("code", pa.string()),
+        ("label", pa.string()),
+        ("discount_cents", pa.int64()),
+    ]),
+}
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_sales (
+    day TEXT PRIMARY KEY,
+    orders INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    subtotal_cents INTEGER NOT NULL,
+    shipping_cents INTEGER NOT NULL,
+    tax_cents INTEGER NOT NULL,
+    discount_cents INTEGER NOT NULL,
+    total_cents INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS material_sales (
+    day TEXT NOT NULL,
+    material TEXT NOT NULL,
+    lines INTEGER NOT NULL,
+    units INTEGER NOT NULL,
+    revenue_cents INTEGER NOT NULL,
+    PRIMARY KEY (day, material)
+);
+CREATE TABLE IF NOT EXISTS promotion_usage (
+    day TEXT NOT NULL,
+    promotion_id TEXT NOT NULL,
+    code TEXT NOT NULL,
+    label TEXT NOT NULL,
+    uses INTEGER NOT NULL,
+    discount_cents INTEGER NOT NULL,
+    PRIMARY KEY (day, promotion_id)
+);
+CREATE TABLE IF NOT EXISTS applied_parts (
+    part TEXT PRIMARY KEY,
+    applied_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS replaced_parts (
+    part TEXT PRIMARY KEY,
+    replaced_by TEXT NOT NULL
+);
+"""
+
+_DAILY_COLUMNS = ("lines", "units", "subtotal_cents", "shipping_cents", "tax_cents", "discount_cents", "total_cents")
+
+
+def order_record(invoice_data, cart_lines, breakdown):
+    """Flatten a placed order into the rows the analytics parts store"""
+    created_at = datetime.fromisoformat(invoice_data["created_at"])
+    return {
+        "invoice_number": invoice_data["invoice_number"],
+        "created_at": created_at,
+        "order_type": invoice_data.get("order_type", ""),
+        "subtotal_cents": breakdown.subtotal,
+        "shipping_cents": breakdown.shipping,
+        "tax_cents": breakdown.tax,
+        "discount_cents": breakdown.discount,
+        "total_cents": breakdown.total,
+        "lines": [
+            (line.product.id, line.product.material, line.quantity, round(line.product.price * 100), int(total))
+            for line, total in zip(cart_lines, breakdown.line_totals)
+        ],
+        "promotions": [
+            (applied.rule.id, applied.rule.code or "", applied.rule.label, int(applied.amount))
+            for applied in breakdown.promotions
+        ],
+    }
+
+
+def _tables(records):
+    """Build the three part tables for one day's records"""
+    orders = {name: [] for name in SCHEMAS["orders"].names}
+    lines = {name: [] for name in SCHEMAS["order_lines"].names}
+    promotions = {name: [] for name in SCHEMAS["promotions"].names}
+    for r in records:
+        number, created_at = r["invoice_number"], r["created_at"]
+        orders["invoice_number"].append(number)
+        orders["created_at"].append(created_at)
+        orders["order_type"].append(r["order_type"])
+        orders["lines"].append(len(r["lines"]))
+        orders["units"].append(sum(line[2] for line in r["lines"]))
+        for column in ("subtotal_cents", "shipping_cents", "tax_cents", "discount_cents", "total_cents"):
+            orders[column].append(r[column])
+        for product_id, material, quantity, unit_cents, line_cents in r["lines"]:
+            for column, value in zip(SCHEMAS["order_lines"].names,
+                                     (number, created_at, product_id, material, quantity, unit_cents, line_cents)):
+                lines[column].append(value)
+        for promotion_id, code, label, discount in r["promotions"]:
+            for column, value in zip(SCHEMAS["promotions"].names,
+                                     (number, created_at, promotion_id, code, label, discount)):
+                promotions[column].append(value)
+    return {
+        "orders": pa.table(orders, schema=SCHEMAS["orders"]),
+        "order_lines": pa.table(lines, schema=SCHEMAS["order_lines"]),
+        "promotions": pa.table(promotions, schema=SCHEMAS["promotions"]),
+    }
+
+
+def _sum(table, column):
+    return int(pc.sum(table[column]).as_py() or 0)
+
+
+class SalesAnalytics:
+    """Append-only Parquet order log plus SQLite rollups, written in the background"""
+
+    def __init__(self, root=ANALYTICS_DIR, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.root = root
+        self.db_path = os.path.join(root, "rollups.db")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        for dataset in SCHEMAS:
+            os.makedirs(os.path.join(root, dataset), exist_ok=True)
+        conn = connect(self.db_path)
+        with conn:
+            conn.executescript(ROLLUP_SCHEMA)
+        conn.close()
+
+        self._local = threading.local()
+        self._parts = 0
+        self._parts_lock = threading.Lock()
+        self.catch_up()
+
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="analytics-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+            conn.isolation_level = None  # explicit transactions only
+        return conn
+
+    # -- writes ------------------------------------------------------------
+
+    def record(self, invoice_data, cart_lines, breakdown):
+        """Queue a completed order and return immediately"""
+        if self._closed:
+            raise RuntimeError("Analytics store is closed")
+        self._queue.put(order_record(invoice_data, cart_lines, breakdown))
+
+    def flush(self):
+        """Block until every recorded order is written and rolled up"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                self._write_batch(batch)
+            except Exception:
+                logger.exception("Failed to write %d orders to %s", len(batch), self.root)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                break
+
+    def _part_name(self):
+        with self._parts_lock:
+            self._parts += 1
+            return f"part-{int(time.time() * 1000)}-{os.getpid()}-{self._parts}"
+
+    def _part_path(self, dataset, day, part, staged=False):
+        # Staged (compacted, not yet swapped in) parts start with "_", so scans and catch_up skip them
+        return os.path.join(self.root, dataset, f"day={day}", f"{'_' if staged else ''}{part}.parquet")
+
+    def _write_part(self, day, part, tables, staged=False):
+        for dataset, table in tables.items():
+            path = self._part_path(dataset, day, part, staged)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Dot-prefixed while being written, so a leftover is never read as data
+            tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+
+    def _write_batch(self, batch):
+        by_day = {}
+        for record in batch:
+            by_day.setdefault(record["created_at"].date().isoformat(), []).append(record)
+        for day, records in by_day.items():
+            part = self._part_name()
+            tables = _tables(records)
+            # The orders part goes last: its presence marks the part complete for catch_up
+            self._write_part(day, part, {name: tables[name] for name in ("order_lines", "promotions", "orders")})
+            self._apply(day, part, tables)
+
+    # -- rollups -----------------------------------------------------------
+
+    def _apply(self, day, part, tables):
+        """Add one part's aggregates to the rollups, unless it was already applied"""
+        orders, lines, promotions = tables["orders"], tables["order_lines"], tables["promotions"]
+        daily = [_sum(orders, column) for column in _DAILY_COLUMNS]
+        materials = lines.group_by("material").aggregate(
+            [("quantity", "count"), ("quantity", "sum"), ("line_cents", "sum")]
+        ).to_pylist()
+        promos = promotions.group_by(["promotion_id", "code", "label"]).aggregate(
+            [("discount_cents", "count"), ("discount_cents", "sum")]
+        ).to_pylist()
+
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            claimed = conn.execute(
+                "INSERT OR IGNORE INTO applied_parts (part, applied_at) VALUES (?, ?)", (f"{day}/{part}", time.time())
+            ).rowcount
+            if claimed and orders.num_rows:
+                conn.execute(
+                    "INSERT INTO daily_sales (day, orders, lines, units, subtotal_cents, shipping_cents, tax_cents, "
+                    "discount_cents, total_cents) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day) DO UPDATE SET "
+                    + ", ".join(f"{c} = {c} + excluded.{c}" for c in ("orders",) + _DAILY_COLUMNS),
+                    (day, orders.num_rows, *daily),
+                )
+                conn.executemany(
+                    "INSERT INTO material_sales (day, material, lines, units, revenue_cents) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (day, material) DO UPDATE SET lines = lines + excluded.lines, "
+                    "units = units + excluded.units, revenue_cents = revenue_cents + excluded.revenue_cents",
+                    [(day, m["material"], m["quantity_count"], m["quantity_sum"], m["line_cents_sum"]) for m in materials],
+                )
+                conn.executemany(
+                    "INSERT INTO promotion_usage (day, promotion_id, code, label, uses, discount_cents) "
+                    "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (day, promotion_id) DO UPDATE SET "
+                    "uses = uses + excluded.uses, discount_cents = discount_cents + excluded.discount_cents",
+                    [(day, p["promotion_id"], p["code"], p["label"], p["discount_cents_count"], p["discount_cents_sum"])
+                     for p in promos],
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return bool(claimed)
+
+    def _parts_on_disk(self):
+        """``(day, part)`` for every complete part, oldest day first"""
+        parts = []
+        for path in glob.glob(os.path.join(self.root, "orders", "day=*", "part-*.parquet")):
+            parts.append((os.path.basename(os.path.dirname(path))[4:], os.path.basename(path)[:-8]))
+        return sorted(parts)
+
+    def _read_part(self, day, part):
+        tables = {}
+        for dataset, schema in SCHEMAS.items():
+            path = self._part_path(dataset, day, part)
+            tables[dataset] = pq.read_table(path, schema=schema) if os.path.exists(path) else schema.empty_table()
+        return tables
+
+    def catch_up(self):
+        """Roll up parts written but not applied (a crash between the two steps); returns the count"""
+        self._recover_compactions()
+        conn = self._conn()
+        applied = {row[0] for row in conn.execute("SELECT part FROM applied_parts")}
+        replaced = {row[0] for row in conn.execute("SELECT part FROM replaced_parts")}
+        count = 0
+        for day, part in self._parts_on_disk():
+            if f"{day}/{part}" not in applied and f"{day}/{part}" not in replaced:
+                count += self._apply(day, part, self._read_part(day, part))
+        if count:
+            logger.info("Rolled up %d analytics parts left unapplied", count)
+        return count
+
+    def rebuild(self):
+        """Recompute every rollup from the Parquet parts"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for table in ("daily_sales", "material_sales", "promotion_usage", "applied_parts"):
+                conn.execute(f"DELETE FROM {table}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return self.catch_up()
+
+    def compact(self, before=None):
+        """Merge each day's parts into one file, for days before ``before`` (default: today)
+
+        Returns the number of days compacted. Run it while the day is no
+        longer being written to; rollups are unchanged.
+        """
+        before = str(before or date.today().isoformat())
+        self.catch_up()  # every input must be counted before it is marked replaced
+        by_day = {}
+        for day, part in self._parts_on_disk():
+            if day < before:
+                by_day.setdefault(day, []).append(part)
+        compacted = 0
+        for day, parts in by_day.items():
+            if len(parts) < 2:
+                continue
+            merged = {
+                dataset: pa.concat_tables([self._read_part(day, part)[dataset] for part in parts])
+                for dataset in SCHEMAS
+            }
+            new_part = self._part_name()
+            self._write_part(day, new_part, merged, staged=True)
+            conn = self._conn()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Already counted via the parts it replaces
+                conn.execute("INSERT INTO applied_parts (part, applied_at) VALUES (?, ?)", (f"{day}/{new_part}", time.time()))
+                conn.executemany(
+                    "INSERT INTO replaced_parts (part, replaced_by) VALUES (?, ?)",
+                    [(f"{day}/{part}", f"{day}/{new_part}") for part in parts],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            self._finish_compaction(day, parts, new_part)
+            compacted += 1
+        return compacted
+
+    def _finish_compaction(self, day, parts, new_part):
+        """Swap a committed compaction in: drop the replaced parts, then unstage the merged one"""
+        for part in parts:
+            for dataset in SCHEMAS:
+                try:
+                    os.remove(self._part_path(dataset, day, part))
+                except FileNotFoundError:
+                    pass
+        # The orders file goes last: its presence marks the part complete
+        for dataset in ("order_lines", "promotions", "orders"):
+            try:
+                os.replace(self._part_path(dataset, day, new_part, staged=True), self._part_path(dataset, day, new_part))
+            except FileNotFoundError:
+                pass  # already swapped in, possibly by another process
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM replaced_parts WHERE replaced_by = ?", (f"{day}/{new_part}",))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _recover_compactions(self):
+        """Finish compactions a crash interrupted after their commit and clear stale staged files
+
+        A merged part is written staged, then committed together with the list
+        of parts it replaces, then swapped in. Until the swap completes the
+        old parts stay authoritative for scans, and ``replaced_parts`` keeps
+        them out of ``catch_up`` and ``rebuild``.
+        """
+        pending = {}
+        for part, replaced_by in self._conn().execute("SELECT part, replaced_by FROM replaced_parts"):
+            pending.setdefault(replaced_by, []).append(part.split("/", 1)[1])
+        for replaced_by, parts in pending.items():
+            day, new_part = replaced_by.split("/", 1)
+            self._finish_compaction(day, parts, new_part)
+        # Staged or temporary files with no committed compaction: a crash before COMMIT
+        cutoff = time.time() - STALE_STAGED_SECONDS
+        for pattern in ("_part-*.parquet", ".*.tmp"):
+            for path in glob.glob(os.path.join(self.root, "*", "day=*", pattern)):
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # -- reads -------------------------------------------------------------
+
+    def _rows(self, sql, params):
+        return [dict(row) for row in self._conn().execute(sql, params).fetchall()]
+
+    def summary(self, start, end):
+        """Totals for a date range (inclusive), with average order value and cart size"""
+        row = self._rows(
+            "SELECT COUNT(*) AS days, COALESCE(SUM(orders), 0) AS orders, COALESCE(SUM(units), 0) AS units, "
+            "COALESCE(SUM(lines), 0) AS lines, COALESCE(SUM(subtotal_cents), 0) AS subtotal_cents, "
+            "COALESCE(SUM(discount_cents), 0) AS discount_cents, COALESCE(SUM(total_cents), 0) AS total_cents "
+            "FROM daily_sales WHERE day BETWEEN ? AND ?",
+            (str(start), str(end)),
+        )[0]
+        orders = row["orders"]
+        row["average_order_cents"] = row["total_cents"] / orders if orders else 0.0
+        row["average_units"] = row["units"] / orders if orders else 0.0
+        row["average_lines"] = row["lines"] / orders if orders else 0.0
+        return row
+
+    def daily(self, start, end):
+        """One row per day with orders, ordered by day"""
+        return self._rows("SELECT * FROM daily_sales WHERE day BETWEEN ? AND ? ORDER BY day", (str(start), str(end)))
+
+    def by_material(self, start, end):
+        return self._rows(
+            "SELECT material, SUM(lines) AS lines, SUM(units) AS units, SUM(revenue_cents) AS revenue_cents "
+            "FROM material_sales WHERE day BETWEEN ? AND ? GROUP BY material ORDER BY revenue_cents DESC",
+            (str(start), str(end)),
+        )
+
+    def by_material_daily(self, start, end):
+        return self._rows(
+            "SELECT day, material, units, revenue_cents FROM material_sales WHERE day BETWEEN ? AND ? ORDER BY day",
+            (str(start), str(end)),
+        )
+
+    def by_promotion(self, start, end):
+        return self._rows(
+            "SELECT promotion_id, code, label, SUM(uses) AS uses, SUM(discount_cents) AS discount_cents "
+            "FROM promotion_usage WHERE day BETWEEN ? AND ? GROUP BY promotion_id ORDER BY uses DESC",
+            (str(start), str(end)),
+        )
+
+    def scan(self, start, end, dataset="order_lines", columns=None):
+        """Raw rows for a date range as an Arrow table; only the matching day partitions are read"""
+        path = os.path.join(self.root, dataset)
+        data = ds.dataset(path, format="parquet", partitioning="hive", schema=SCHEMAS[dataset].append(
+            pa.field("day", pa.string())))
+        return data.to_table(columns=columns, filter=(ds.field("day") >= str(start)) & (ds.field("day") <= str(end)))
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Sales analytics maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="recompute the rollups from the Parquet parts")
+    compact = sub.add_parser("compact", help="merge each past day's parts into one file")
+    compact.add_argument("--before", help="only days before this date (default: today)")
+    report = sub.add_parser("report", help="print rollups for a date range")
+    report.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    analytics = SalesAnalytics()
+    if args.command == "rebuild":
+        print(f"Rolled up {analytics.rebuild()} parts")
+    elif args.command == "compact":
+        print(f"Compacted {analytics.compact(args.before)} days")
+    else:
+        end = date.today()
+        start = end - timedelta(days=args.days - 1)
+        summary = analytics.summary(start, end)
+        print(f"{start} to {end}: {summary['orders']} orders, ${summary['total_cents'] / 100:,.2f}, "
+              f"{summary['average_units']:.1f} units per order")
+        for row in analytics.by_material(start, end):
+            print(f"  {row['material']:8} {row['units']:6} units  ${row['revenue_cents'] / 100:12,.2f}")
+        for row in analytics.by_promotion(start, end):
+            print(f"  {row['label']:24} {row['uses']:6} uses  -${row['discount_cents'] / 100:10,.2f}")
+    analytics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""Headless JSON API over the store's catalog, pricing and orders.
+
+Runs next to the Streamlit UI, against the same data files (store data,
+inventory, promotions and orders under ``./data``), for ERP and kiosk
+integrations:
+
+    python api.py --port 8502 --workers 2
+
+Endpoints (amounts in integer cents unless noted):
+
+``GET  /api/health``
+``GET  /api/catalog``                 paginated, filterable product list
+``GET  /api/products?ids=a,b``        batch SKU lookup with live availability
+``POST /api/products/lookup``         same, ``{"ids": [...]}`` for long lists
+``POST /api/quotes``                  price up to ``MAX_BATCH`` carts in one call
+``POST /api/orders``                  place an order; returns the invoice (dollars)
+``GET  /api/orders/{number}``         stored invoice
+``GET  /api/orders/{number}/invoice.pdf`` / ``invoice.html``
+
+GET responses carry an ``ETag`` and answer ``If-None-Match`` with ``304``.
+Catalog pages are cached per store data version, so repeat requests are
+served from memory.
+"""
+import argparse
+import hashlib
+import json
+import re
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Route
+
+from analytics import SalesAnalytics
+from catalog import SORT_OPTIONS, paginate
+from checkout import CONTACT_FIELDS, place_order
+from inventory import Inventory, OutOfStock
+from invoices import FORMATS, InvoiceRenderer
+from orders import OrderStore
+from promotions import PromotionExhausted
+from store_data import StoreData
+
+DEFAULT_PER_PAGE = 50
+MAX_PER_PAGE = 500
+MAX_BATCH = 1000            # carts per quote request / ids per lookup
+MAX_QUANTITY = 10_000       # units per cart line; keeps cent totals well inside int64
+PAGE_CACHE_SIZE = 1024      # rendered catalog pages kept per process
+
+INVOICE_TYPES = {"pdf": "application/pdf", "html": "text/html; charset=utf-8"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, **details):
+        self.status = status
+        self.body = {"error": message, **details}
+        super().__init__(message)
+
+
+def _json_bytes(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _etag(body):
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def _conditional(request, body, media_type="application/json", etag=None, status=200):
+    """Return ``body`` with an ETag, or an empty 304 if the client already has it"""
+    etag = etag or _etag(body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+        return Response(status_code=304, headers=headers)
+    return Response(body, status_code=status, media_type=media_type, headers=headers)
+
+
+def _json(data, status=200, headers=None):
+    return Response(_json_bytes(data), status_code=status, media_type="application/json", headers=headers)
+
+
+def _int_param(request, name, default, low, high):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        return min(max(int(value), low), high)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+
+
+def _float_param(request, name):
+    value = request.query_params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+
+
+def _list_param(request, name):
+    """Repeated and/or comma-separated query values"""
+    return [v for raw in request.query_params.getlist(name) for v in raw.split(",") if v]
+
+
+async def _body(request):
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(422, "Request body must be a JSON object")
+    return body
+
+
+def _cart(items):
+    """Accept ``{"id": qty}`` or ``[{"id": ..., "quantity": ...}]`` and return ``{id: qty}``"""
+    if isinstance(items, dict):
+        pairs = items.items()
+    elif isinstance(items, list):
+        try:
+            pairs = [(item["id"], item.get("quantity", 1)) for item in items]
+        except (KeyError, TypeError, AttributeError):
+            raise ApiError(422, 'Cart lines need an "id" and a "quantity"')
+    else:
+        raise ApiError(422, "Cart items must be an object or a list")
+    cart = {}
+    for product_id, quantity in pairs:
+        if not isinstance(quantity, int) or isinstance(quantity, bool):
+            raise ApiError(422, f"Quantity for {product_id} must be an integer")
+        cart[str(product_id)] = cart.get(str(product_id), 0) + quantity
+    too_many = [product_id for product_id, quantity in cart.items() if quantity > MAX_QUANTITY]
+    if too_many:
+        raise ApiError(422, f"At most {MAX_QUANTITY} units per product", ids=too_many)
+    return cart
+
+
+class StoreApi:
+    """Shared resources and request handlers"""
+
+    def __init__(self, store_data=None, inventory=None, order_store=None, renderer=None, analytics=None):
+        self.store_data = store_data
+        self.inventory = inventory
+        self.order_store = order_store
+        self.renderer = renderer
+        self.analytics = analytics
+        self._synced_version = None
+        self._pages = OrderedDict()
+
+    def start(self):
+        # Built on startup (not import) so worker processes each open their own connections
+        self.store_data = self.store_data or StoreData()
+        self.inventory = self.inventory or Inventory()
+        self.order_store = self.order_store or OrderStore()
+        self.renderer = self.renderer or InvoiceRenderer()
+        self.analytics = self.analytics or SalesAnalytics()
+
+    def stop(self):
+        self.order_store.close()
+        self.analytics.close()
+
+    def snapshot(self):
+        """Current store data, syncing stock rows for a new catalog (SQLite; call off the event loop)"""
+        snapshot = self.store_data.snapshot()
+        if snapshot.version != self._synced_version:
+            # New products get stock rows once per catalog version
+            self.inventory.sync(snapshot.catalog)
+            self._synced_version = snapshot.version
+        return snapshot
+
+    # -- catalog ---------------------------------------------------------------
+
+    async def health(self, request):
+        snapshot = await run_in_threadpool(self.snapshot)
+        return _json({"status": "ok", "version": snapshot.version, "products": len(snapshot.catalog)})
+
+    async def catalog(self, request):
+        snapshot = await run_in_threadpool(self.snapshot)
+        sort = request.query_params.get("sort", "featured")
+        if sort not in SORT_OPTIONS:
+            raise ApiError(400, f"sort must be one of {', '.join(SORT_OPTIONS)}")
+        query = (
+            tuple(sorted(_list_param(request, "material"))),
+            tuple(sorted(_list_param(request, "color"))),
+            _float_param(request, "min_price"),
+            _float_param(request, "max_price"),
+            request.query_params.get("in_stock", "") in ("1", "true"),
+            sort,
+            _int_param(request, "page", 1, 1, 10**6),
+            _int_param(request, "per_page", DEFAULT_PER_PAGE, 1, MAX_PER_PAGE),
+        )
+        if query[4]:
+            # "In stock only" depends on live stock, so those pages are never cached
+            body = await run_in_threadpool(self._catalog_page, snapshot, query)
+            return _conditional(request, body)
+        key = (snapshot.version,) + query
+        cached = self._pages.get(key)
+        if cached is None:
+            body = await run_in_threadpool(self._catalog_page, snapshot, query)
+            cached = self._pages[key] = (body, _etag(body))
+            while len(self._pages) > PAGE_CACHE_SIZE:
+                self._pages.popitem(last=False)
+        else:
+            self._pages.move_to_end(key)
+        body, etag = cached
+        return _conditional(request, body, etag=etag)
+
+    def _catalog_page(self, snapshot, query):
+        materials, colors, min_price, max_price, in_stock, sort, page, per_page = query
+        results = snapshot.catalog.query(materials, colors, min_price, max_price, False, sort)
+        if in_stock:
+            # Live stock rather than the catalog's static labels, as in the store view
+            results = self.inventory.in_stock(results)
+        items, page, pages = paginate(results, page, per_page)
+        return _json_bytes({
+            "version": snapshot.version,
+            "page": page,
+            "per_page": per_page,
+            "pages": pages,
+            "total": len(results),
+            "items": [p.to_dict() for p in items],
+        })
+
+    async def products(self, request):
+        if request.method == "POST":
+            ids = (await _body(request)).get("ids")
+            if not isinstance(ids, list):
+                raise ApiError(422, 'Body must be {"ids": [...]}')
+        else:
+            ids = _list_param(request, "ids")
+        if len(ids) > MAX_BATCH:
+            raise ApiError(413, f"At most {MAX_BATCH} ids per request")
+        body = await run_in_threadpool(self._product_rows, ids)
+        return _conditional(request, body)
+
+    def _product_rows(self, ids):
+        snapshot = self.snapshot()
+        levels = self.inventory.levels()
+        items, missing = [], []
+        for product_id in ids:
+            product = snapshot.catalog.get(str(product_id))
+            if product is None:
+                missing.append(product_id)
+                continue
+            available = levels.get(product.id, (0,))[0]
+            items.append(dict(
+                product.to_dict(),
+                stock=self.inventory.label(product.id, product.stock),
+                available=max(available, 0),
+            ))
+        return _json_bytes({"version": snapshot.version, "items": items, "missing": missing})
+
+    # -- pricing -----------------------------------------------------------------
+
+    async def quotes(self, request):
+        """Price many carts: ``{"carts": [{"items": {...}, "code": "..."}]}``"""
+        carts = (await _body(request)).get("carts")
+        if not isinstance(carts, list):
+            raise ApiError(422, 'Body must be {"carts": [...]}')
+        if len(carts) > MAX_BATCH:
+            raise ApiError(413, f"At most {MAX_BATCH} carts per request")
+        pairs = []
+        for cart in carts:
+            if not isinstance(cart, dict):
+                raise ApiError(422, 'Each cart must be {"items": ..., "code": ...}')
+            pairs.append((_cart(cart.get("items", {})), str(cart.get("code") or "")))
+        # Pricing reads promotion usage from SQLite, so the batch runs in the threadpool
+        return _json(await run_in_threadpool(self._price_carts, pairs))
+
+    def _price_carts(self, pairs):
+        snapshot = self.snapshot()
+        problems = []
+        for index, (cart, _) in enumerate(pairs):
+            unknown = [pid for pid in cart if pid not in snapshot.catalog]
+            not_positive = [pid for pid, quantity in cart.items() if quantity <= 0]
+            if unknown or not_positive:
+                problems.append({"cart": index, "unknown": unknown, "not_positive": not_positive})
+        if problems:
+            raise ApiError(422, "Unknown products or quantities below 1", carts=problems)
+        batch = snapshot.pricing.price_carts(pairs, snapshot.catalog)
+        columns = [batch.subtotal.tolist(), batch.shipping.tolist(), batch.tax.tolist(),
+                   batch.discount.tolist(), batch.total.tolist()]
+        quotes = [
+            {"subtotal": subtotal, "shipping": shipping, "tax": tax, "discount": discount, "total": total}
+            for subtotal, shipping, tax, discount, total in zip(*columns)
+        ]
+        return {"version": snapshot.version, "currency": "SGD", "quotes": quotes}
+
+    # -- orders --------------------------------------------------------------------
+
+    async def create_order(self, request):
+        """``{"items": {...}, "code": "...", "customer": {"name", "email", "phone", "address"}}``"""
+        body = await _body(request)
+        cart = _cart(body.get("items", {}))
+        if not cart or any(quantity <= 0 for quantity in cart.values()):
+            raise ApiError(422, "The order needs at least one item with a positive quantity")
+        raw_customer = body.get("customer") or {}
+        if not isinstance(raw_customer, dict):
+            raise ApiError(422, 'customer must be {"name", "email", "phone", "address"}')
+        customer = {field: str(raw_customer.get(field.removeprefix("customer_"), "")).strip()
+                    for field in CONTACT_FIELDS}
+        missing = [field.removeprefix("customer_") for field, value in customer.items() if not value]
+        if missing:
+            raise ApiError(422, "Missing contact fields", fields=missing)
+        snapshot = await run_in_threadpool(self.snapshot)
+        unknown = [pid for pid in cart if pid not in snapshot.catalog]
+        if unknown:
+            raise ApiError(422, "Unknown products", ids=unknown)
+        try:
+            invoice_data = await run_in_threadpool(
+                place_order, snapshot, self.inventory, self.order_store, f"api-{uuid.uuid4().hex}",
+                cart, str(body.get("code") or ""), customer, self.renderer, self.analytics,
+            )
+        except OutOfStock as e:
+            raise ApiError(409, "Not enough stock", available=e.shortages)
+        except PromotionExhausted:
+            raise ApiError(409, "A promotion in this order has run out")
+        number = invoice_data["invoice_number"]
+        return _json(invoice_data, status=201, headers={"Location": f"/api/orders/{number}"})
+
+    async def _order(self, request):
+        number = request.path_params["number"]
+        invoice_data = await run_in_threadpool(self.order_store.get, number)
+        if invoice_data is None:
+            raise ApiError(404, f"No order {number}")
+        return invoice_data
+
+    async def get_order(self, request):
+        # Orders never change once placed, so the body hash is a stable ETag
+        return _conditional(request, _json_bytes(await self._order(request)))
+
+    async def get_invoice(self, request):
+        fmt = request.path_params["fmt"]
+        if fmt not in FORMATS:
+            raise ApiError(404, f"Invoices come as {' or '.join(FORMATS)}")
+        invoice_data = await self._order(request)
+        etag = f'"{invoice_data["invoice_number"]}-{fmt}"'
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers={"ETag": etag})
+        document = await run_in_threadpool(self.renderer.get, invoice_data, fmt)
+        return _conditional(request, document, media_type=INVOICE_TYPES[fmt], etag=etag)
+
+
+def _handler(fn):
+    async def endpoint(request):
+        try:
+            return await fn(request)
+        except ApiError as e:
+            return _json(e.body, status=e.status)
+    return endpoint
+
+
+def create_app(api=None):
+    """Build the Starlette app (``api`` lets tests inject resources)"""
+    api = api or StoreApi()
+
+    @asynccontextmanager
+    async def lifespan(app):
+        api.start()
+        yield
+        api.stop()
+
+    routes = [
+        Route("/api/health", _handler(api.health)),
+        Route("/api/catalog", _handler(api.catalog)),
+        Route("/api/products", _handler(api.products)),
+        Route("/api/products/lookup", _handler(api.products), methods=["POST"]),
+        Route("/api/quotes", _handler(api.quotes), methods=["POST"]),
+        Route("/api/orders", _handler(api.create_order), methods=["POST"]),
+        Route("/api/orders/{number}", _handler(api.get_order)),
+        Route("/api/orders/{number}/invoice.{fmt}", _handler(api.get_invoice)),
+    ]
+    app = Starlette(routes=routes, lifespan=lifespan)
+    app.state.api = api
+    return app
+
+
+app = create_app()
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Serve the store's JSON API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes")
+    args = parser.parse_args()
+    uvicorn.run("api:app", host=args.host, port=args.port, workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,27 @@
 import streamlit as st
-from datetime import datetime
-import random
-from openai import OpenAI
+import datetime
+import hmac
+import logging
+import os
+import time
+import uuid
+import assets
+import templating
+import assistant
+import metrics
+import scheduler
+from checkout import CONTACT_FIELDS, place_order
+from inventory import Inventory, OutOfStock
+from invoices import InvoiceRenderer
+from knowledge import KnowledgeBase
+from orders import OrderStore
+from promotions import PromotionExhausted
+from response_cache import ResponseCache
+from sessions import MAX_CHAT_MESSAGES, SessionStore
+from stl_quote import BUILD_VOLUME, UNITS, StlError, StlQuoter, material_prices
+from store_data import StoreData
+from chat_history import HistoryManager, count_tokens, message_tokens, model_summarizer
+from catalog import SORT_OPTIONS, paginate
 
 # Page Configuration
 st.set_page_config(
@@ -11,280 +31,169 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Custom CSS Styling
-st.markdown("""
-    <style>
-    /* Hide Streamlit branding */
-    #MainMenu, footer, header {visibility: hidden;}
-    
-    /* Button styling */
-    .stButton button {
-        width: 100%;
-        border-radius: 8px;
-        height: 3rem;
-        font-weight: 500;
-        transition: all 0.3s ease;
-    }
-    
-    .stButton button:hover {
-        transform: translateY(-2px);
-        box-shadow: 0 4px 12px rgba(0,0,0,0.15);
-    }
-    
-    /* Product image styling */
-    .product-image {
-        width: 100%;
-        height: 200px;
-        object-fit: cover;
-        border-radius: 8px;
-        margin-bottom: 1rem;
-    }
-    
-    /* Metric card styling */
-    .metric-card {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 12px;
-        padding: 1.5rem;
-        text-align: center;
-        color: white;
-        box-shadow: 0 4px 12px rgba(102, 126, 234, 0.2);
-    }
-    
-    .metric-card h3 {
-        margin: 0;
-        font-size: 0.9rem;
-        opacity: 0.9;
-        font-weight: 500;
-    }
-    
-    .metric-card .metric-value {
-        font-size: 2rem;
-        font-weight: 700;
-        margin: 0.5rem 0;
-    }
-    
-    .metric-card p {
-        margin: 0;
-        font-size: 0.85rem;
-        opacity: 0.85;
-    }
-    
-    /* Invoice header */
-    .invoice-header {
-        text-align: center;
-        padding: 2rem;
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        border-radius: 12px;
-        color: white;
-        margin-bottom: 2rem;
-    }
-    
-    .invoice-header h1 {
-        margin: 0;
-        font-size: 2.5rem;
-        font-weight: 700;
-    }
-    
-    .invoice-header p {
-        margin: 0.5rem 0;
-        opacity: 0.95;
-    }
-    
-    /* Section headers */
-    .section-header {
-        color: #4f46e5;
-        border-bottom: 3px solid #4f46e5;
-        padding-bottom: 0.5rem;
-        margin-bottom: 1rem;
-        font-weight: 600;
-    }
-    
-    /* Info boxes */
-    .info-box {
-        background: #f8fafc;
-        border-left: 4px solid #4f46e5;
-        padding: 1rem;
-        border-radius: 8px;
-        margin: 1rem 0;
-    }
-    
-    /* Total box */
-    .total-box {
-        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-        color: white;
-        padding: 1.5rem;
-        border-radius: 12px;
-        text-align: center;
-        margin: 1.5rem 0;
-        box-shadow: 0 8px 16px rgba(102, 126, 234, 0.3);
-    }
-    
-    .total-box h2 {
-        margin: 0;
-        font-size: 2rem;
-    }
-    
-    /* Payment info */
-    .payment-info {
-        background: #f0f9ff;
-        border: 2px solid #0ea5e9;
-        border-radius: 12px;
-        padding: 1.5rem;
-        margin-top: 2rem;
-    }
-    
-    .payment-info h4 {
-        color: #0369a1;
-        margin-top: 0;
-    }
-    
-    /* Print button */
-    .print-info {
-        background: #fef3c7;
-        border: 2px solid #f59e0b;
-        border-radius: 8px;
-        padding: 1rem;
-        text-align: center;
-        margin: 1rem 0;
-    }
-    
-    /* Table styling */
-    .invoice-table {
-        width: 100%;
-        border-collapse: collapse;
-        margin: 1rem 0;
-        background: white;
-        border-radius: 8px;
-        overflow: hidden;
-    }
-    
-    .invoice-table th {
-        background: #f8fafc;
-        padding: 1rem;
-        text-align: left;
-        font-weight: 600;
-        border-bottom: 2px solid #e5e7eb;
-    }
-    
-    .invoice-table td {
-        padding: 1rem;
-        border-bottom: 1px solid #f3f4f6;
-    }
-    
-    .invoice-table tr:last-child td {
-        border-bottom: none;
-    }
-    
-    @media print {
-        .stApp > header, .stApp > footer, button, .print-info {
-            display: none !important;
-        }
-        .invoice-header {
-            background: #4f46e5 !important;
-            -webkit-print-color-adjust: exact;
-            print-color-adjust: exact;
-        }
-    }
-    </style>
-""", unsafe_allow_html=True)
+# Custom CSS lives in static/style.css; the browser fetches and caches it once, so
+# each rerun only sends the one-line import instead of the whole stylesheet
+st.html(f'<style>@import url("{assets.stylesheet_url()}");</style>')
 
-DISCOUNT_CODES = {
-    "SAY-NO-TO-POLYMATE": 0.15,
-    "SKEM-FILAMENT-PRICE": 0.20,
-    "PARCEL-DEEZ-NUTS": 0.50
+# Per-session state: small scalars only; carts and chat live in the session store.
+# Callables are evaluated once, when the session starts.
+SESSION_DEFAULTS = {
+    'view': lambda: st.query_params.get('view', 'home'),  # ?view=admin opens the dashboard
+    'show_invoice': False,
+    'invoice_number': None,  # the invoice itself is read back from the order store
+    'store_page': 1,
+    'session_id': lambda: uuid.uuid4().hex,  # session store key and stock reservation holder
+    'print_requests': dict,  # print request -> queued job id, so repeat clicks don't queue it twice
 }
 
-FILAMENTS = [
-    {
-        "id": "pla_white",
-        "name": "PLA Filament - White",
-        "material": "PLA",
-        "price": 25.00,
-        "color": "White",
-        "stock": "In Stock",
-        "rating": 4.8,
-        "image": "white.png"
-    },
-    {
-        "id": "pla_black",
-        "name": "PLA Filament - Black",
-        "material": "PLA",
-        "price": 25.00,
-        "color": "Black",
-        "stock": "In Stock",
-        "rating": 4.9,
-        "image": "black.png"
-    },
-    {
-        "id": "abs_red",
-        "name": "ABS Filament - Red",
-        "material": "ABS",
-        "price": 28.00,
-        "color": "Red",
-        "stock": "In Stock",
-        "rating": 4.7,
-        "image": "red.png"
-    },
-    {
-        "id": "petg_blue",
-        "name": "PETG Filament - Blue",
-        "material": "PETG",
-        "price": 30.00,
-        "color": "Blue",
-        "stock": "In Stock",
-        "rating": 4.6,
-        "image": "blue.png"
-    },
-    {
-        "id": "tpu_clear",
-        "name": "TPU Flexible - Clear",
-        "material": "TPU",
-        "price": 35.00,
-        "color": "Clear",
-        "stock": "Low Stock",
-        "rating": 4.5,
-        "image": "transparent.png"
-    },
-    {
-        "id": "nylon_natural",
-        "name": "Nylon Filament - Natural",
-        "material": "Nylon",
-        "price": 40.00,
-        "color": "Natural",
-        "stock": "In Stock",
-        "rating": 4.8,
-        "image": "tpu.png"
-    }
-]
-
-# Initialize session state variables
-if 'view' not in st.session_state:
-    st.session_state.view = 'home'
-if 'chat_messages' not in st.session_state:
-    st.session_state.chat_messages = []
-if 'filament_cart' not in st.session_state:
-    st.session_state.filament_cart = {}
-if 'discount_code' not in st.session_state:
-    st.session_state.discount_code = ""
-if 'discount_amount' not in st.session_state:
-    st.session_state.discount_amount = 0
-if 'show_invoice' not in st.session_state:
-    st.session_state.show_invoice = False
-if 'invoice_data' not in st.session_state:
-    st.session_state.invoice_data = None
+def init_session():
+    """Fill in missing session state from ``SESSION_DEFAULTS``; a no-op after the first run"""
+    state = st.session_state
+    if state.get('_initialized'):
+        return
+    for key, default in SESSION_DEFAULTS.items():
+        if key not in state:
+            state[key] = default() if callable(default) else default
+    state._initialized = True
+
+init_session()
+
+@st.cache_resource(show_spinner=False)
+def get_store_data():
+    """Catalog, prices and promotions, loaded once and shared by all sessions"""
+    return StoreData()
+
+def get_snapshot():
+    """Current store data version; reloads and file changes show up on the next rerun"""
+    return get_store_data().snapshot()
+
+def get_catalog():
+    return get_snapshot().catalog
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _thumbnail_manifest(version, _catalog):
+    return assets.build_thumbnails([p.image for p in _catalog])
+
+def get_thumbnail_manifest():
+    """Build any missing store thumbnails once per catalog version"""
+    snapshot = get_snapshot()
+    return _thumbnail_manifest(snapshot.version, snapshot.catalog)
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """Shared assistant response cache; tune with a [response_cache] secrets table"""
+    cache = ResponseCache(**st.secrets.get("response_cache", {}))
+    metrics.register_collector("response_cache", cache.metrics)
+    return cache
+
+@st.cache_resource(show_spinner=False)
+def get_chat_executor():
+    """Bounded pool that streams model replies for every session; tune with a [chat_executor] secrets table"""
+    executor = assistant.ChatExecutor(**st.secrets.get("chat_executor", {}))
+    metrics.register_collector("chat_executor", lambda: {"in_flight": executor.in_flight()})
+    return executor
+
+@st.cache_resource(show_spinner=False)
+def get_stl_quoter():
+    """STL mesh analysis shared by all sessions, cached by file hash"""
+    quoter = StlQuoter()
+    metrics.register_collector("stl_quoter", quoter.metrics)
+    return quoter
+
+@st.cache_resource(show_spinner=False)
+def get_job_queue():
+    """Queue of requested prints shared by all sessions (SQLite under ./data)"""
+    return scheduler.JobQueue()
+
+@st.cache_resource(show_spinner=False)
+def get_fleet():
+    """Printer fleet from HUB_PRINTERS_PATH, or the built-in fleet"""
+    return scheduler.load_fleet()
+
+@st.cache_resource(show_spinner=False)
+def get_knowledge_base():
+    """Material knowledge base and its search index, built once per process"""
+    return KnowledgeBase()
+
+@st.cache_resource(show_spinner=False)
+def get_order_store():
+    """Durable order store shared by all sessions (SQLite under ./data by default)"""
+    return OrderStore()
+
+@st.cache_resource(show_spinner=False)
+def _inventory():
+    return Inventory()
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _synced_inventory(version, _catalog):
+    return _inventory().sync(_catalog)
+
+def get_inventory():
+    """Stock levels and cart reservations shared by all sessions (SQLite under ./data)
+
+    New products get stock rows once per catalog version.
+    """
+    snapshot = get_snapshot()
+    return _synced_inventory(snapshot.version, snapshot.catalog)
+
+@st.cache_resource(show_spinner=False)
+def get_session_store():
+    """Carts and chat history of every session
+
+    Sessions idle longer than ``sessions.IDLE_TIMEOUT`` are evicted and their
+    stock reservations released. The store logs its size in bytes every sweep.
+    """
+    return SessionStore(on_evict=_release_session)
+
+def _release_session(session_id, data):
+    if data.chat_job is not None:
+        data.chat_job.cancel()
+    if data.cart:
+        _inventory().release(session_id)
+
+@st.cache_resource(show_spinner=False)
+def start_metrics():
+    """Export shared cache and session stats; serve /metrics if HUB_METRICS_PORT is set"""
+    metrics.register_collector("template_cache", templating.fragments.metrics)
+    metrics.register_collector("session_store", get_session_store().report)
+    return metrics.serve_from_env()
+
+def session():
+    """This session's cart, chat history and stock notices"""
+    return get_session_store().get(st.session_state.session_id)
+
+@st.cache_resource(show_spinner=False)
+def get_analytics():
+    """Sales log (Parquet under ./data/analytics) and the rollups the admin dashboard reads"""
+    # Imported here: pyarrow adds ~0.5 s to startup and only checkout and the dashboard need it
+    from analytics import SalesAnalytics
+    return SalesAnalytics()
+
+@st.cache_resource(show_spinner=False)
+def get_invoice_renderer():
+    """Background invoice renderer; PDF/HTML files are cached under ./data/invoices"""
+    return InvoiceRenderer()
+
+STORE_PAGE_SIZE = 9  # 3x3 grid per page
+
+SORT_LABELS = {
+    "featured": "Featured",
+    "price_asc": "Price: Low to High",
+    "price_desc": "Price: High to Low",
+    "rating": "Top Rated",
+}
 
 def navigate_to(view):
-    """Navigate to different pages in the app"""
+    """Navigate to different pages in the app
+
+    Use it as a button ``on_click`` callback so the click costs one script run;
+    the explicit rerun also escapes fragment-scoped reruns.
+    """
+    if view not in ('ai_assistant', 'printing'):
+        cancel_chat()  # leaving the assistant abandons any reply in flight
     st.session_state.view = view
     st.rerun()
 
-def apply_discount(total, code):
-    """Apply discount code to total amount"""
-    code = code.upper()
-    if code in DISCOUNT_CODES:
-        return total * DISCOUNT_CODES[code]
-    return 0
-
 def display_metric_card(title, content, description):
     """Display a custom metric card using HTML"""
     st.markdown(f"""
@@ -295,132 +204,39 @@ def display_metric_card(title, content, description):
         </div>
     """, unsafe_allow_html=True)
 
+logger = logging.getLogger("printing_hub")
+
+STREAM_REPAINT_INTERVAL = 0.05  # seconds between repaints of a streaming reply
+
+def display_chat_message(message):
+    """Display one chat message with its timing caption"""
+    st.markdown(templating.chat_message(message), unsafe_allow_html=True)
+
 def display_invoice(invoice_data):
-    """Display invoice using Streamlit components with custom styling"""
-    
-    # Header with gradient
-    st.markdown(f"""
-        <div class="invoice-header">
-            <h1>🖨️ 3D PRINTING HUB</h1>
-            <p>Professional 3D Printing Services & Premium Filaments</p>
-            <p style="font-size: 1.1rem; font-weight: 600;">Invoice #{invoice_data['invoice_number']} | {invoice_data['date']}</p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    # Customer and Order Info
-    col1, col2 = st.columns(2, gap="large")
+    """Display the invoice, rendered in one pass from cached template fragments"""
+    st.markdown(templating.invoice(invoice_data), unsafe_allow_html=True)
     
+    # Downloads (rendered in the background at checkout, read from the invoice cache)
+    renderer = get_invoice_renderer()
+    col1, col2 = st.columns(2)
     with col1:
-        st.markdown('<h3 class="section-header">📋 Bill To</h3>', unsafe_allow_html=True)
-        st.markdown(f"""
-            <div class="info-box">
-                <p><strong>Name:</strong> {invoice_data['customer_name']}</p>
-                <p><strong>Email:</strong> {invoice_data['customer_email']}</p>
-                <p><strong>Phone:</strong> {invoice_data['customer_phone']}</p>
-                <p><strong>Address:</strong> {invoice_data['customer_address'].replace('<br>', ', ')}</p>
-            </div>
-        """, unsafe_allow_html=True)
-    
+        st.download_button(
+            "📄 Download PDF",
+            data=renderer.get(invoice_data, "pdf"),
+            file_name=f"{invoice_data['invoice_number']}.pdf",
+            mime="application/pdf",
+            use_container_width=True,
+            key="invoice_pdf"
+        )
     with col2:
-        st.markdown('<h3 class="section-header">📦 Order Details</h3>', unsafe_allow_html=True)
-        st.markdown(f"""
-            <div class="info-box">
-                <p><strong>Type:</strong> {invoice_data['order_type']}</p>
-                <p><strong>Date:</strong> {invoice_data['date']}</p>
-                <p><strong>Terms:</strong> Due on Receipt</p>
-                <p><strong>Status:</strong> <span style="color: #f59e0b; font-weight: 600;">⏳ Pending Payment</span></p>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Items Table using HTML
-    st.markdown('<h3 class="section-header">🛒 Items</h3>', unsafe_allow_html=True)
-    
-    # Build HTML table
-    table_html = """
-    <table class="invoice-table">
-        <thead>
-            <tr>
-                <th>Description</th>
-                <th>Quantity</th>
-                <th>Unit Price</th>
-                <th>Total</th>
-            </tr>
-        </thead>
-        <tbody>
-    """
-    
-    for item in invoice_data['items']:
-        table_html += f"""
-            <tr>
-                <td>{item['description']}</td>
-                <td>{item['quantity']}</td>
-                <td>${item['unit_price']:.2f}</td>
-                <td>${item['total']:.2f}</td>
-            </tr>
-        """
-    
-    table_html += """
-        </tbody>
-    </table>
-    """
-    
-    st.markdown(table_html, unsafe_allow_html=True)
-    st.markdown("<br>", unsafe_allow_html=True)
-    
-    # Totals
-    col1, col2 = st.columns([1.5, 1], gap="large")
-    
-    with col1:
-        st.markdown("")  # Spacer
-    
-    with col2:
-        st.markdown('<h3 class="section-header">💰 Summary</h3>', unsafe_allow_html=True)
-        
-        st.markdown(f"""
-            <div style="font-size: 1.1rem; line-height: 2;">
-                <p><strong>Subtotal:</strong> <span style="float: right;">${invoice_data['subtotal']:.2f}</span></p>
-        """, unsafe_allow_html=True)
-        
-        if invoice_data.get('shipping', 0) > 0:
-            st.markdown(f'<p><strong>Shipping:</strong> <span style="float: right;">${invoice_data["shipping"]:.2f}</span></p>', unsafe_allow_html=True)
-        
-        if invoice_data.get('tax', 0) > 0:
-            st.markdown(f'<p><strong>Tax (9%):</strong> <span style="float: right;">${invoice_data["tax"]:.2f}</span></p>', unsafe_allow_html=True)
-        
-        if invoice_data.get('discount', 0) > 0:
-            st.markdown(f'<p style="color: #10b981;"><strong>Discount ({invoice_data["discount_code"]}):</strong> <span style="float: right;">-${invoice_data["discount"]:.2f}</span></p>', unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown(f"""
-            <div class="total-box">
-                <h2>TOTAL: ${invoice_data['total']:.2f} SGD</h2>
-            </div>
-        """, unsafe_allow_html=True)
-    
-    # Payment Information
-    st.markdown(f"""
-        <div class="payment-info">
-            <h4>💳 Payment Information</h4>
-            <p><strong>Thank you for your business!</strong></p>
-            <p>Payment Instructions: Please transfer to <strong>DBS Singapore</strong></p>
-            <p>Account Number: <strong>123-456789-0</strong></p>
-            <p>Reference: <strong>Invoice #{invoice_data['invoice_number']}</strong></p>
-            <hr style="border-color: #0ea5e9; margin: 1rem 0;">
-            <p style="font-size: 0.9rem; color: #0369a1;">
-                3D Printing Hub | contact@3dprintinghub.sg | +65 9876 5432
-            </p>
-        </div>
-    """, unsafe_allow_html=True)
-    
-    # Print instructions
-    st.markdown("""
-        <div class="print-info">
-            <strong>💡 Press Ctrl+P (or Cmd+P on Mac) to print this invoice</strong>
-        </div>
-    """, unsafe_allow_html=True)
+        st.download_button(
+            "🌐 Download HTML",
+            data=renderer.get(invoice_data, "html"),
+            file_name=f"{invoice_data['invoice_number']}.html",
+            mime="text/html",
+            use_container_width=True,
+            key="invoice_html"
+        )
 
 def show_home():
     """Display home page with service options"""
@@ -451,7 +267,7 @@ def show_home():
     st.markdown("<br><br>", unsafe_allow_html=True)
     
     # Service selection
-    col1, col2 = st.columns(2, gap="large")
+    col1, col2, col3 = st.columns(3, gap="large")
     
     with col1:
         with st.container(border=True):
@@ -462,8 +278,8 @@ def show_home():
             ✓ Print Optimization - Orientation & strength  
             ✓ Troubleshooting - Help with ABS, ASA & more
             """)
-            if st.button("Chat with AI", key="btn_print", use_container_width=True, type="primary"):
-                navigate_to('ai_assistant')
+            st.button("Chat with AI", key="btn_print", use_container_width=True, type="primary",
+                      on_click=navigate_to, args=('ai_assistant',))
     
     with col2:
         with st.container(border=True):
@@ -474,15 +290,214 @@ def show_home():
             ✓ Best Prices - Competitive pricing  
             ✓ Fast Shipping - Same-day dispatch
             """)
-            if st.button("Browse Products", key="btn_filament", use_container_width=True, type="primary"):
-                navigate_to('filament')
+            st.button("Browse Products", key="btn_filament", use_container_width=True, type="primary",
+                      on_click=navigate_to, args=('filament',))
+    
+    with col3:
+        with st.container(border=True):
+            st.markdown("### 📐 Print Quote")
+            st.markdown("""
+            ✓ Instant Pricing - Upload an STL file  
+            ✓ Every Material - Compare PLA to Nylon  
+            ✓ Filament & Time - Grams and print hours  
+            ✓ Any Units - mm, cm or inches
+            """)
+            st.button("Get a Quote", key="btn_quote", use_container_width=True, type="primary",
+                      on_click=navigate_to, args=('printing_checkout',))
+
+def cancel_chat():
+    """Stop this session's reply in flight and drop its unanswered question"""
+    data = session()
+    job = data.chat_job
+    if job is None:
+        return
+    job.cancel()
+    data.chat_job = None
+    if data.chat_messages and data.chat_messages[-1] == {"role": "user", "content": job.question}:
+        data.chat_messages.pop()
+
+def clear_chat():
+    cancel_chat()
+    data = session()
+    data.chat_messages = []
+    data.chat_history_state = {}
+
+@st.fragment(key="chat_panel")
+@metrics.timed("fragment_render_seconds", fragment="chat_panel")
+def chat_panel(client):
+    """Conversation, input and send; sending a message only reruns this fragment"""
+    data = session()
+    # Display chat messages in a container
+    chat_container = st.container(border=True, height=500)
+    
+    with chat_container:
+        if not data.chat_messages:
+            st.info("👋 Hi! I'm your 3D printing assistant. Ask me anything about materials, print settings, orientation, or troubleshooting!")
+        
+        # The whole conversation is one element; unchanged messages come from the fragment cache
+        if data.chat_messages:
+            st.markdown(templating.chat_history(data.chat_messages), unsafe_allow_html=True)
+    
+    # Chat input
+    col1, col2 = st.columns([5, 1])
+    with col1:
+        user_input = st.text_input("Ask me anything about 3D printing...", key="chat_input", label_visibility="collapsed")
+    with col2:
+        send_button = st.button("Send", use_container_width=True, type="primary")
+    
+    # Clear chat button
+    st.button("🗑️ Clear Chat History", use_container_width=True, on_click=clear_chat)
+    
+    cache_stats = get_response_cache().metrics()
+    st.caption(
+        f"Response cache: {cache_stats['entries']} answers · "
+        f"{cache_stats['exact_hits'] + cache_stats['semantic_hits']} hits / {cache_stats['misses']} misses "
+        f"({cache_stats['hit_rate']:.0%} hit rate)"
+    )
+    
+    # Handle message sending
+    job = data.chat_job
+    if send_button and user_input:
+        if job is not None and job.question == user_input:
+            # Send clicked again while this question is being answered: keep waiting for it
+            pass
+        else:
+            if job is not None:
+                # A new question replaces the unanswered one
+                cancel_chat()
+            job = ask(data, client, user_input, chat_container)
+    
+    if job is not None:
+        await_reply(data, client, job, chat_container)
+
+def history_manager(data, client):
+    """The session's HistoryManager and on-screen message cap
+
+    Budgets, the cap and the summarizer ("extractive" or "model") come from a
+    [chat_history] secrets table.
+    """
+    history_settings = dict(st.secrets.get("chat_history", {}))
+    max_messages = history_settings.pop("max_messages", MAX_CHAT_MESSAGES)
+    if history_settings.pop("summarizer", "extractive") == "model":
+        history_settings["summarizer"] = model_summarizer(client, assistant.complete)
+    return HistoryManager(data.chat_history_state, **history_settings), max_messages
+
+def ask(data, client, user_input, chat_container):
+    """Add the question; answer it from the knowledge base or cache, or start a model reply
+
+    Returns the background ``ChatJob`` when the model has to answer.
+    """
+    user_message = {"role": "user", "content": user_input}
+    data.chat_messages.append(user_message)
+    with chat_container:
+        display_chat_message(user_message)
+    history, max_messages = history_manager(data, client)
+    
+    # Answer spec lookups from the knowledge base, and repeated questions
+    # from the shared response cache, without calling the model
+    knowledge_base = get_knowledge_base()
+    lookup_started = time.perf_counter()
+    answer = knowledge_base.direct_answer(user_input)
+    if answer is not None:
+        cached = answer, "knowledge"
+    else:
+        cached = get_response_cache().get(user_input)
+    if cached is not None:
+        answer, match = cached
+        ai_message = {
+            "role": "assistant",
+            "content": answer,
+            "cached": match,
+            "latency": time.perf_counter() - lookup_started,
+        }
+        metrics.inc("chat_answers_total", source=match)
+        metrics.observe("chat_latency_seconds", ai_message["latency"], source=match)
+        data.chat_messages.append(ai_message)
+        history.trim(data.chat_messages, max_messages)
+        with chat_container:
+            display_chat_message(ai_message)
+        return None
+    
+    # Recent turns go to the model verbatim, older ones are folded into a summary.
+    # Only the knowledge chunks relevant to this question (and the previous one) go into the prompt.
+    recent_questions = [m["content"] for m in data.chat_messages if m["role"] == "user"][-2:]
+    system_prompt = assistant.build_system_prompt(knowledge_base.context_for(" ".join(recent_questions)))
+    api_messages, _ = history.build(system_prompt, data.chat_messages)
+    
+    # The reply streams on the shared chat executor, not on this script thread
+    data.chat_job = get_chat_executor().submit(st.session_state.session_id, client, user_input, api_messages)
+    return data.chat_job
+
+def await_reply(data, client, job, chat_container):
+    """Show a background reply as it streams and add it to the chat once complete
+
+    If this run is interrupted (another click, a fragment rerun) the job keeps
+    going and the next run of the panel picks it up again.
+    """
+    with chat_container:
+        placeholder = st.empty()
+    # Repaint at most ~20 times a second so long replies don't flood the websocket
+    while not job.wait(STREAM_REPAINT_INTERVAL):
+        text = job.text + " ▌" if job.text else "<em>AI is thinking...</em>"
+        placeholder.markdown(templating.chat_bubble("assistant", text), unsafe_allow_html=True)
+    
+    data.chat_job = None
+    if job.cancelled:
+        placeholder.empty()
+        return
+    if job.error is not None:
+        # Drop the unanswered question so it can be asked again
+        if data.chat_messages and data.chat_messages[-1]["role"] == "user":
+            data.chat_messages.pop()
+        placeholder.empty()
+        st.error(f"Error communicating with AI: {job.error}")
+        return
+    
+    # Token accounting from the API's usage report, estimated if the provider omits it
+    if job.usage is not None:
+        prompt_tokens = job.usage.prompt_tokens
+        completion_tokens = job.usage.completion_tokens
+    else:
+        prompt_tokens = sum(message_tokens(m) for m in job.messages)
+        completion_tokens = count_tokens(job.text)
+    logger.info(
+        "chat completion: prompt_tokens=%d completion_tokens=%d ttft=%.3fs latency=%.3fs folded=%d",
+        prompt_tokens, completion_tokens, job.ttft or 0.0, job.latency,
+        data.chat_history_state.get("folded", 0),
+    )
+    metrics.inc("chat_answers_total", source="model")
+    metrics.observe("chat_latency_seconds", job.latency, source="model")
+    if job.ttft is not None:
+        metrics.observe("chat_ttft_seconds", job.ttft)
+    metrics.inc("chat_tokens_total", prompt_tokens, kind="prompt")
+    metrics.inc("chat_tokens_total", completion_tokens, kind="completion")
+    metrics.log_event(
+        "chat_completion", ttft=job.ttft, latency=job.latency,
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+    )
+    
+    ai_message = {
+        "role": "assistant",
+        "content": job.text,
+        "ttft": job.ttft,
+        "latency": job.latency,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+    }
+    # Add AI response to chat history
+    data.chat_messages.append(ai_message)
+    history, max_messages = history_manager(data, client)
+    history.trim(data.chat_messages, max_messages)
+    get_response_cache().put(job.question, job.text)
+    with chat_container:
+        placeholder.empty()
+        display_chat_message(ai_message)
 
 def show_ai_assistant():
     """Display AI chatbot for 3D printing guidance"""
     col1, col2 = st.columns([1, 8])
     with col1:
-        if st.button("← Back"):
-            navigate_to('home')
+        st.button("← Back", on_click=navigate_to, args=('home',))
     with col2:
         st.markdown("### 🤖 3D Printing AI Assistant")
     
@@ -507,283 +522,496 @@ def show_ai_assistant():
         """)
         return
     
-    # Initialize OpenAI client
-    client = OpenAI(api_key=OpenAI_Key)
-    
-    # System prompt with 3D printing expertise
-    SYSTEM_PROMPT = """You are an expert 3D printing consultant with years of experience in additive manufacturing. Your role is to help users with:
-
-1. **Material Selection & Properties:**
-   - PLA: Best for beginners, biodegradable, low warping, good detail. Temp: 190-220°C. Use for: prototypes, decorative items, low-stress parts.
-   - ABS: Strong, heat resistant, requires heated bed (80-110°C), prone to warping. Temp: 220-250°C. Use for: functional parts, mechanical components. Tips: Use enclosure, keep room temperature stable, consider ABS slurry for bed adhesion.
-   - PETG: Chemical resistant, strong, flexible, minimal warping. Temp: 220-250°C. Use for: outdoor parts, mechanical parts, water bottles.
-   - TPU/Flexible: Elastic, impact resistant, challenging to print. Temp: 210-230°C. Print slow (20-30mm/s), use direct drive extruder.
-   - Nylon: Very strong, abrasion resistant, hygroscopic (absorbs moisture). Temp: 240-260°C. Dry filament before use.
-   - ASA: Like ABS but UV resistant, better for outdoor use. Temp: 240-260°C. Similar printing challenges as ABS - needs enclosure and heated bed.
-
-2. **Print Orientation for Maximum Strength:**
-   - Layer lines are the weakest point - orient parts so stress is parallel to layers, not perpendicular
-   - For mechanical parts: position so functional surfaces align with layer direction
-   - Overhangs >45° need supports - minimize them by smart orientation
-   - Consider anisotropic properties: parts are weakest in Z-axis (layer separation)
-
-3. **Best Practices for Difficult Materials:**
-   - **ABS/ASA:** Use fully enclosed printer, heated bed 80-110°C, avoid drafts, use ABS juice (ABS dissolved in acetone) for bed adhesion, print in well-ventilated area
-   - **Nylon:** Dry filament at 70°C for 4-6 hours before printing, use glue stick or garolite bed surface, increase bed temp to 70-80°C
-   - **PETG:** Clean bed thoroughly, reduce print speed, avoid bed too hot (can stick too well), use lower retraction than PLA
-   - **TPU:** Print slow, reduce retraction distance, use direct drive if possible, increase flow rate slightly
-
-4. **General Tips:**
-   - First layer is critical - level bed carefully, adjust Z-offset
-   - Print temperature towers to find optimal temp for each filament
-   - Use cooling fan for PLA, reduce/disable for ABS/ASA
-   - Infill: 10-20% for most parts, 50%+ for mechanical strength
-   - Wall thickness: minimum 2-3 perimeters for strength
-
-Always provide specific, actionable advice. Ask clarifying questions when needed. Be friendly and encouraging to beginners while giving detailed technical guidance to advanced users."""
+    # Shared, pooled OpenAI client (OpenAI_Base_URL lets it target a local stub_llm.py server).
+    # Pool size, timeouts and retries can be tuned with an [openai_pool] table in secrets.
+    assistant.configure_pool(**st.secrets.get("openai_pool", {}))
+    client = assistant.get_client(OpenAI_Key, st.secrets.get("OpenAI_Base_URL"))
 
-    # Display chat messages in a container
-    chat_container = st.container(border=True, height=500)
+    chat_panel(client)
+
+def show_printing_checkout():
+    """Quote an uploaded STL file in every printable material"""
+    col1, col2 = st.columns([1, 8])
+    with col1:
+        st.button("← Back", key="back_quote", on_click=navigate_to, args=('home',))
+    with col2:
+        st.markdown("### 📐 3D Print Quote")
     
-    with chat_container:
-        if not st.session_state.chat_messages:
-            st.info("👋 Hi! I'm your 3D printing assistant. Ask me anything about materials, print settings, orientation, or troubleshooting!")
-        
-        for message in st.session_state.chat_messages:
-            if message["role"] == "user":
-                st.markdown(f"""
-                    <div style="background: #4f46e5; color: white; padding: 1rem; border-radius: 8px; margin: 0.5rem 0; max-width: 80%; margin-left: auto;">
-                        <strong>You:</strong><br>{message["content"]}
-                    </div>
-                """, unsafe_allow_html=True)
-            else:
-                st.markdown(f"""
-                    <div style="background: white; padding: 1rem; border-radius: 8px; margin: 0.5rem 0; max-width: 80%; border: 1px solid #e5e7eb;">
-                        <strong>AI Assistant:</strong><br>{message["content"]}
-                    </div>
-                """, unsafe_allow_html=True)
+    st.markdown("---")
     
-    # Chat input
-    col1, col2 = st.columns([5, 1])
+    upload = st.file_uploader("Upload an STL file", type=["stl"], key="stl_upload")
+    col1, col2, col3, col4 = st.columns(4)
     with col1:
-        user_input = st.text_input("Ask me anything about 3D printing...", key="chat_input", label_visibility="collapsed")
+        units = st.selectbox("File units", list(UNITS), key="quote_units")
     with col2:
-        send_button = st.button("Send", use_container_width=True, type="primary")
+        infill = st.slider("Infill", 5, 100, 20, step=5, format="%d%%", key="quote_infill")
+    with col3:
+        layer_height = st.selectbox("Layer height (mm)", [0.12, 0.2, 0.28], index=1, key="quote_layer")
+    with col4:
+        quantity = st.number_input("Quantity", min_value=1, max_value=100, value=1, key="quote_qty")
     
-    # Clear chat button
-    if st.button("🗑️ Clear Chat History", use_container_width=True):
-        st.session_state.chat_messages = []
-        st.rerun()
+    if upload is None:
+        st.info("Upload a binary or ASCII STL to see filament use, print time and price for each material.")
+        return
     
-    # Handle message sending
-    if send_button and user_input:
-        # Add user message to chat history
-        st.session_state.chat_messages.append({"role": "user", "content": user_input})
-        
-        # Prepare messages for API
-        api_messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-        api_messages.extend(st.session_state.chat_messages)
-        
-        # Call OpenAI API
+    data = upload.getvalue()
+    file_key = get_stl_quoter().key(data)
+    try:
+        with metrics.REGISTRY.time("stl_analyze_seconds"):
+            stats = get_stl_quoter().analyze(data, file_key)
+    except StlError as e:
+        st.error(f"⚠️ {upload.name}: {e}")
+        return
+    
+    part = stats.scaled(UNITS[units])
+    x, y, z = part.size
+    col1, col2, col3, col4 = st.columns(4, gap="medium")
+    with col1:
+        display_metric_card("Size", f"{max(x, y, z):.0f}mm", f"{x:.1f} × {y:.1f} × {z:.1f} mm")
+    with col2:
+        display_metric_card("Volume", f"{part.volume / 1000:.1f}cm³", "Solid model volume")
+    with col3:
+        display_metric_card("Surface", f"{part.area / 100:.0f}cm²", "Outer surface area")
+    with col4:
+        display_metric_card("Triangles", f"{stats.triangles:,}", "Mesh facets")
+    
+    if not part.fits():
+        st.error(f"⚠️ This part is larger than our {' × '.join(f'{b:.0f}' for b in BUILD_VOLUME)} mm build volume. "
+                 "Check the file units, or split the model.")
+        return
+    
+    quotes = get_stl_quoter().quote_all(
+        stats, material_prices(get_catalog()), units=units,
+        infill=infill / 100, layer_height=layer_height, quantity=int(quantity),
+    )
+    st.markdown('<h4 class="section-header">💰 Quote by Material</h4>', unsafe_allow_html=True)
+    st.dataframe(
+        [
+            {
+                "Material": q.material,
+                "Filament per part (g)": round(q.grams, 1),
+                "Print time (h)": round(q.print_hours, 1),
+                "Material ($)": q.material_cents / 100,
+                "Machine time ($)": q.machine_cents / 100,
+                "Setup ($)": q.setup_cents / 100,
+                "Total ($)": q.total_cents / 100,
+            }
+            for q in quotes
+        ],
+        hide_index=True,
+        use_container_width=True,
+    )
+    st.caption("Prices exclude tax and shipping. Estimates assume no supports; final pricing is confirmed after slicing.")
+    st.button("💬 Ask the AI which material suits this part", on_click=navigate_to, args=('ai_assistant',))
+    
+    st.markdown('<h4 class="section-header">🖨️ Request This Print</h4>', unsafe_allow_html=True)
+    by_material = {q.material: q for q in quotes}
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        material = st.selectbox("Material", list(by_material), key="job_material")
+    with col2:
+        name = st.text_input("Name *", key="job_name")
+    with col3:
+        email = st.text_input("Email *", key="job_email")
+    chosen = by_material[material]
+    job_queue = get_job_queue()
+    eta = job_queue.estimate(get_fleet(), material, part.size, chosen.print_seconds)
+    if eta is None:
+        st.warning(f"⚠️ None of our printers can take this part in {material}. Try another material or ask us about splitting it.")
+        return
+    st.caption(f"With the current print queue this would be ready in about {max(1, round(eta / 3600))} h.")
+    if eta > scheduler.TURNAROUND:
+        st.warning("⏱️ This order may take longer than our usual 24-48h turnaround.")
+    request = (file_key.hex(), units, infill, layer_height, int(quantity), material)
+    st.button("Request Print", key="request_print", type="primary", on_click=request_print,
+              args=(request, part.size, chosen.print_seconds, chosen.total_cents, upload.name))
+    error = st.session_state.pop('print_request_error', None)
+    if error:
+        st.error(error)
+    job_id = st.session_state.print_requests.get((*request, email.strip().lower()))
+    if job_id is not None:
+        st.success(f"✅ Print job #{job_id} is queued. We'll email {email.strip()} to confirm the final price.")
+
+def request_print(request, size, print_seconds, total_cents, file_name):
+    """Request Print ``on_click``: queue each distinct request once, however often it is clicked"""
+    name = st.session_state.job_name.strip()
+    email = st.session_state.job_email.strip()
+    if not (name and email):
+        st.session_state.print_request_error = "⚠️ Please enter your name and email."
+        return
+    key = (*request, email.lower())
+    if key in st.session_state.print_requests:
+        return
+    material, quantity = request[-1], request[-2]
+    job = get_job_queue().submit(material, size, print_seconds, name, email, total_cents, quantity, file_name=file_name)
+    st.session_state.print_requests[key] = job.id
+
+def add_to_cart(product_id):
+    """Reserve one more unit, then rerun only the product's card and the cart widgets"""
+    data = session()
+    quantity = data.cart.get(product_id, 0) + 1
+    reserved, available = get_inventory().reserve(st.session_state.session_id, product_id, quantity)
+    if reserved:
+        data.cart[product_id] = quantity
+        data.stock_notice.pop(product_id, None)
+    else:
+        data.stock_notice[product_id] = f"Only {max(available, 0)} available"
+    st.rerun([f"card_{product_id}", "cart_badge", "checkout_bar"])
+
+def remove_from_cart(product_id):
+    """Drop a product from the cart and release its stock, rerunning only the affected fragments"""
+    data = session()
+    data.cart.pop(product_id, None)
+    data.stock_notice.pop(product_id, None)
+    get_inventory().release(st.session_state.session_id, product_id)
+    st.rerun([f"card_{product_id}", "cart_badge", "checkout_bar"])
+
+def set_store_page(page):
+    st.session_state.store_page = page
+
+@st.fragment(key="cart_badge")
+@metrics.timed("fragment_render_seconds", fragment="cart_badge")
+def cart_badge():
+    """Cart button in the store header"""
+    cart_count = session().cart.units()
+    if cart_count > 0:
+        st.button(f"🛒 Cart ({cart_count})", use_container_width=True,
+                  on_click=navigate_to, args=('filament_checkout',))
+
+@st.fragment(key="checkout_bar")
+@metrics.timed("fragment_render_seconds", fragment="checkout_bar")
+def checkout_bar():
+    """Checkout button below the product grid"""
+    if session().cart:
+        st.markdown("---")
+        st.button("Proceed to Checkout →", use_container_width=True, type="primary",
+                  on_click=navigate_to, args=('filament_checkout',))
+
+@metrics.timed("fragment_render_seconds", fragment="product_card")
+def product_card(product, thumbnails):
+    """One product card; runs as its own fragment so cart clicks only redraw this card"""
+    # Product Image (size-matched thumbnail, original as fallback)
+    thumbnail = assets.thumbnail_html(thumbnails, product.image, product.name)
+    if thumbnail:
+        st.markdown(thumbnail, unsafe_allow_html=True)
+        metrics.inc("image_bytes_total", assets.thumbnail_bytes(thumbnails, product.image), kind="thumbnail")
+    else:
         try:
-            with st.spinner("AI is thinking..."):
-                completion = client.chat.completions.create(
-                    model="gpt-4o-mini",  # Using gpt-4o-mini for cost efficiency
-                    messages=api_messages,
-                    temperature=0.7,
-                    max_tokens=800
-                )
-                
-                ai_response = completion.choices[0].message.content
-                
-                # Add AI response to chat history
-                st.session_state.chat_messages.append({"role": "assistant", "content": ai_response})
-                
-                st.rerun()
+            st.image(product.image, use_container_width=True, output_format='auto')
+            metrics.inc("image_bytes_total", os.path.getsize(product.image), kind="original")
         except Exception as e:
-            st.error(f"Error communicating with AI: {str(e)}")
-            # Remove the user message if API call failed
-            st.session_state.chat_messages.pop()
+            st.warning(f"Image not found: {product.name}")
+    
+    st.markdown(f"**{product.name}**")
+    inventory = get_inventory()
+    st.caption(f"{product.material} • {product.color} • {inventory.label(product.id, product.stock)}")
+    st.caption(f"⭐ {product.rating}/5")
+    
+    st.markdown(f"### ${product.price:.2f}")
 
-def show_printing_checkout():
-    """Redirect to AI assistant (deprecated)"""
-    navigate_to('ai_assistant')
+    data = session()
+    current_qty = data.cart.get(product.id, 0)
+    
+    st.button("Add to Cart", key=f"add_{product.id}", use_container_width=True, type="primary",
+              disabled=current_qty == 0 and inventory.available(product.id) <= 0,
+              on_click=add_to_cart, args=(product.id,))
+    if product.id in data.stock_notice:
+        st.warning(data.stock_notice[product.id])
+    
+    if current_qty > 0:
+        st.markdown(f"**In Cart: {current_qty}**")
+        st.button("🗑️ Remove", key=f"remove_{product.id}", use_container_width=True,
+                  on_click=remove_from_cart, args=(product.id,))
 
 def show_filament_store():
     """Display filament store with products and shopping cart"""
     col1, col2, col3 = st.columns([1, 6, 3])
     with col1:
-        if st.button("← Back", key="back_fil"):
-            navigate_to('home')
+        st.button("← Back", key="back_fil", on_click=navigate_to, args=('home',))
     with col2:
         st.markdown("### 🧵 Filament Store")
     with col3:
-        cart_count = sum(st.session_state.filament_cart.values())
-        if cart_count > 0:
-            if st.button(f"🛒 Cart ({cart_count})", use_container_width=True):
-                navigate_to('filament_checkout')
+        cart_badge()
 
     st.markdown("---")
     
-    # Display products in grid
+    catalog = get_catalog()
+    thumbnails = get_thumbnail_manifest()
+    
+    # Filters and sorting
+    low, high = catalog.price_range
+    col1, col2, col3, col4 = st.columns([2, 2, 3, 2], gap="medium")
+    with col1:
+        materials = st.multiselect("Material", catalog.materials, key="filter_material")
+    with col2:
+        colors = st.multiselect("Color", catalog.colors, key="filter_color")
+    with col3:
+        if low < high:
+            min_price, max_price = st.slider("Price ($)", low, high, (low, high), step=1.0, key="filter_price")
+        else:
+            min_price, max_price = low, high
+    with col4:
+        sort = st.selectbox("Sort by", list(SORT_OPTIONS), format_func=SORT_LABELS.get, key="filter_sort")
+        in_stock_only = st.checkbox("In stock only", key="filter_in_stock")
+    
+    query = dict(
+        materials=materials,
+        colors=colors,
+        min_price=min_price if min_price > low else None,
+        max_price=max_price if max_price < high else None,
+        in_stock_only=in_stock_only,
+        sort=sort,
+    )
+    # Start from the first page whenever the filters change
+    if st.session_state.get('store_query') != query:
+        st.session_state.store_query = query
+        st.session_state.store_page = 1
+    
+    results = catalog.query(**dict(query, in_stock_only=False))
+    if in_stock_only:
+        # Live stock levels rather than the catalog's static labels
+        results = get_inventory().in_stock(results)
+    products, page, page_count = paginate(results, st.session_state.store_page, STORE_PAGE_SIZE)
+    
+    if not results:
+        st.info("No filaments match these filters.")
+    
+    # Display only the current page of products in the grid, one fragment per card
     cols_per_row = 3
-    for i in range(0, len(FILAMENTS), cols_per_row):
+    for i in range(0, len(products), cols_per_row):
         cols = st.columns(cols_per_row, gap="medium")
         for j, col in enumerate(cols):
-            if i + j < len(FILAMENTS):
-                product = FILAMENTS[i + j]
+            if i + j < len(products):
+                product = products[i + j]
                 with col, st.container(border=True):
-                    # Product Image
-                    try:
-                        st.image(product['image'], use_container_width=True, output_format='auto')
-                    except Exception as e:
-                        st.warning(f"Image not found: {product['name']}")
-                    
-                    st.markdown(f"**{product['name']}**")
-                    st.caption(f"{product['material']} • {product['color']} • {product['stock']}")
-                    st.caption(f"⭐ {product['rating']}/5")
-                    
-                    st.markdown(f"### ${product['price']:.2f}")
-
-                    current_qty = st.session_state.filament_cart.get(product['id'], 0)
-                    
-                    if st.button("Add to Cart", key=f"add_{product['id']}", use_container_width=True, type="primary"):
-                        if current_qty == 0:
-                            st.session_state.filament_cart[product['id']] = 1
-                        else:
-                            st.session_state.filament_cart[product['id']] += 1
-                        st.rerun()
-                    
-                    if current_qty > 0:
-                        st.markdown(f"**In Cart: {current_qty}**")
-                        if st.button("🗑️ Remove", key=f"remove_{product['id']}", use_container_width=True):
-                            del st.session_state.filament_cart[product['id']]
-                            st.rerun()
-    
-    cart_items = sum(st.session_state.filament_cart.values())
-    if cart_items > 0:
+                    st.fragment(product_card, key=f"card_{product.id}")(product, thumbnails)
+    
+    if page_count > 1:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            st.button("← Previous", key="page_prev", use_container_width=True, disabled=page <= 1,
+                      on_click=set_store_page, args=(page - 1,))
+        with col2:
+            st.markdown(f"<p style='text-align: center; padding-top: 0.75rem;'>Page {page} of {page_count} · {len(results)} products</p>", unsafe_allow_html=True)
+        with col3:
+            st.button("Next →", key="page_next", use_container_width=True, disabled=page >= page_count,
+                      on_click=set_store_page, args=(page + 1,))
+    
+    checkout_bar()
+            
+def close_invoice():
+    st.session_state.show_invoice = False
+
+@st.fragment(key="order_summary")
+@metrics.timed("fragment_render_seconds", fragment="order_summary")
+def order_summary():
+    """Checkout totals and invoice button; editing the discount code only reruns this fragment"""
+    st.markdown('<h4 class="section-header">📦 Order Summary</h4>', unsafe_allow_html=True)
+    
+    with st.container(border=True):
+        # Calculate cart totals
+        data = session()
+        snapshot = get_snapshot()
+        cart_lines = snapshot.catalog.resolve_cart(data.cart)
+        for line in cart_lines:
+            st.text(f"{line.product.name} (x{line.quantity}) - ${line.total:.2f}")
+        
         st.markdown("---")
-        if st.button("Proceed to Checkout →", use_container_width=True, type="primary"):
-            navigate_to('filament_checkout')
+        discount_code = st.text_input("Discount Code", placeholder="Optional (separate several with commas)", key="cart_discount")
+        
+        # Shipping, tax and promotions from the shared pricing engine (exact cents)
+        breakdown = snapshot.pricing.price_cart(cart_lines, discount_code)
+        subtotal, shipping, tax, discount, total = (
+            breakdown.as_dollars()[key] for key in ("subtotal", "shipping", "tax", "discount", "total")
+        )
+        
+        st.markdown(f"""
+        <div style="font-size: 1.05rem; line-height: 1.8;">
+            Subtotal: <code>${subtotal:.2f}</code><br>
+            Shipping: <code>{'FREE' if shipping == 0 else f'${shipping:.2f}'}</code><br>
+            Tax (9%): <code>${tax:.2f}</code>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        for applied in breakdown.promotions:
+            st.success(f"✅ {applied.rule.label}: -${applied.amount / 100:.2f}")
+    
+    st.markdown(f"""
+    <div class="total-box">
+        <h2>${total:.2f} SGD</h2>
+    </div>
+    """, unsafe_allow_html=True)
+    
+    if st.button("📄 View Invoice", type="primary", use_container_width=True, key="gen_inv"):
+        # Contact fields live outside this fragment; read their committed values
+        customer_name = st.session_state.fil_name
+        customer_email = st.session_state.fil_email
+        customer_phone = st.session_state.fil_phone
+        customer_address = st.session_state.fil_addr
+        if not all([customer_name, customer_email, customer_phone, customer_address]):
+            st.error("⚠️ Please fill in all contact fields")
+        else:
+            # Count limited-use promotions, then turn this session's reservations
+            # into a stock deduction; either fails if another checkout got there first
+            customer = dict(zip(CONTACT_FIELDS, (customer_name, customer_email, customer_phone, customer_address)))
+            try:
+                invoice_data = place_order(
+                    snapshot, get_inventory(), get_order_store(), st.session_state.session_id,
+                    data.cart, discount_code, customer, renderer=get_invoice_renderer(), analytics=get_analytics(),
+                )
+            except PromotionExhausted:
+                st.error("⚠️ A promotion in this order has just run out. Please review your total.")
+                return
+            except OutOfStock as e:
+                catalog = snapshot.catalog
+                st.error("⚠️ Not enough stock for: " + ", ".join(
+                    f"{catalog[pid].name} ({available} left)" for pid, available in e.shortages.items()
+                ))
+                return
             
+            # The session keeps only the number; the invoice is read back from the order store
+            st.session_state.invoice_number = invoice_data['invoice_number']
+            st.session_state.show_invoice = True
+            # The order consumed the stock; start a fresh cart
+            data.cart.clear()
+            data.stock_notice.clear()
+            st.rerun()
+
 def show_filament_checkout():
     """Display checkout page for filament orders"""
-    if st.session_state.show_invoice and st.session_state.invoice_data:
+    invoice_data = None
+    if st.session_state.show_invoice and st.session_state.invoice_number:
+        invoice_data = get_order_store().get(st.session_state.invoice_number)
+    if invoice_data:
         # Display invoice
-        if st.button("← Back to Checkout", key="back_to_checkout2"):
-            st.session_state.show_invoice = False
-            st.rerun()
+        st.button("← Back to Checkout", key="back_to_checkout2", on_click=close_invoice)
         
         st.markdown("---")
-        display_invoice(st.session_state.invoice_data)
+        display_invoice(invoice_data)
         return
     
     col1, col2 = st.columns([1, 8])
     with col1:
-        if st.button("← Back", key="back_fil_check"):
-            navigate_to('filament')
+        st.button("← Back", key="back_fil_check", on_click=navigate_to, args=('filament',))
     with col2:
         st.markdown("### 🛒 Filament Checkout")
     
     st.markdown("---")
     
-    if not st.session_state.filament_cart:
+    if not session().cart:
         st.error("Your cart is empty.")
-        if st.button("Browse Filaments", use_container_width=True):
-            navigate_to('filament')
+        st.button("Browse Filaments", use_container_width=True, on_click=navigate_to, args=('filament',))
         return
     
     col_left, col_right = st.columns([1.5, 1], gap="large")
     
     with col_left:
         st.markdown('<h4 class="section-header">📝 Contact Information</h4>', unsafe_allow_html=True)
-        customer_name = st.text_input("Name *", key="fil_name")
-        customer_email = st.text_input("Email *", key="fil_email")
-        customer_phone = st.text_input("Phone *", key="fil_phone")
-        customer_address = st.text_area("Address *", height=100, key="fil_addr")
+        st.text_input("Name *", key="fil_name")
+        st.text_input("Email *", key="fil_email")
+        st.text_input("Phone *", key="fil_phone")
+        st.text_area("Address *", height=100, key="fil_addr")
     
     with col_right:
-        st.markdown('<h4 class="section-header">📦 Order Summary</h4>', unsafe_allow_html=True)
-        
-        with st.container(border=True):
-            cart_items_data = []
-            subtotal = 0
-            
-            # Calculate cart totals
-            for product_id, qty in st.session_state.filament_cart.items():
-                product = next(p for p in FILAMENTS if p['id'] == product_id)
-                item_total = product['price'] * qty
-                subtotal += item_total
-                cart_items_data.append({
-                    'product': product,
-                    'quantity': qty,
-                    'total': item_total
-                })
-                st.text(f"{product['name']} (x{qty}) - ${item_total:.2f}")
-
-            # Calculate additional charges
-            shipping = 0 if subtotal >= 100 else 5.00
-            tax = subtotal * 0.09
-            
-            st.markdown("---")
-            discount_code = st.text_input("Discount Code", placeholder="Optional", key="cart_discount")
-            discount = apply_discount(subtotal, discount_code)
-            st.session_state.discount_amount = discount
-            
-            total = subtotal + shipping + tax - discount
-            
-            st.markdown(f"""
-            <div style="font-size: 1.05rem; line-height: 1.8;">
-                Subtotal: <code>${subtotal:.2f}</code><br>
-                Shipping: <code>{'FREE' if shipping == 0 else f'${shipping:.2f}'}</code><br>
-                Tax (9%): <code>${tax:.2f}</code>
-            </div>
-            """, unsafe_allow_html=True)
-            
-            if discount > 0:
-                st.success(f"✅ Discount Applied: -${discount:.2f}")
-        
-        st.markdown(f"""
-        <div class="total-box">
-            <h2>${total:.2f} SGD</h2>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        if st.button("📄 View Invoice", type="primary", use_container_width=True, key="gen_inv"):
-            if not all([customer_name, customer_email, customer_phone, customer_address]):
-                st.error("⚠️ Please fill in all contact fields")
-            else:
-                invoice_number = f"INV-{datetime.now().strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
-                
-                items = []
-                for item in cart_items_data:
-                    items.append({
-                        'description': item['product']['name'],
-                        'quantity': item['quantity'],
-                        'unit_price': item['product']['price'],
-                        'total': item['total']
-                    })
-                
-                invoice_data = {
-                    'invoice_number': invoice_number,
-                    'date': datetime.now().strftime('%B %d, %Y'),
-                    'customer_name': customer_name,
-                    'customer_email': customer_email,
-                    'customer_phone': customer_phone,
-                    'customer_address': customer_address.replace('\n', '<br>'),
-                    'order_type': 'Filament Order',
-                    'items': items,
-                    'subtotal': subtotal,
-                    'shipping': shipping,
-                    'tax': tax,
-                    'discount': discount,
-                    'discount_code': discount_code.upper() if discount > 0 else '',
-                    'total': total
-                }
-                
-                st.session_state.invoice_data = invoice_data
-                st.session_state.show_invoice = True
-                st.rerun()
+        order_summary()
+
+def show_admin():
+    """Sales dashboard for staff; reads only the precomputed analytics rollups"""
+    col1, col2 = st.columns([1, 8])
+    with col1:
+        st.button("← Back", key="back_admin", on_click=navigate_to, args=('home',))
+    with col2:
+        st.markdown("### 📊 Sales Dashboard")
+    
+    st.markdown("---")
+    
+    if not st.session_state.get('admin'):
+        try:
+            admin_password = st.secrets["Admin_Password"]
+        except Exception:
+            st.error("⚠️ Admin_Password not found in secrets. Add `Admin_Password = \"...\"` to `.streamlit/secrets.toml`.")
+            return
+        password = st.text_input("Admin password", type="password", key="admin_password")
+        if not password:
+            return
+        if not hmac.compare_digest(password.encode(), str(admin_password).encode()):
+            st.error("⚠️ Wrong password.")
+            return
+        st.session_state.admin = True
+    
+    today = datetime.date.today()
+    period = st.date_input("Period", (today - datetime.timedelta(days=29), today), max_value=today, key="admin_period")
+    if len(period) != 2:
+        return
+    start, end = period
+    
+    analytics = get_analytics()
+    started = time.perf_counter()
+    summary = analytics.summary(start, end)
+    daily = analytics.daily(start, end)
+    materials = analytics.by_material(start, end)
+    material_daily = analytics.by_material_daily(start, end)
+    promotions = analytics.by_promotion(start, end)
+    elapsed = time.perf_counter() - started
+    
+    col1, col2, col3, col4 = st.columns(4, gap="medium")
+    with col1:
+        display_metric_card("Revenue", f"${summary['total_cents'] / 100:,.0f}", "Incl. tax and shipping")
+    with col2:
+        display_metric_card("Orders", f"{summary['orders']:,}", f"Over {summary['days']} trading days")
+    with col3:
+        display_metric_card("Avg Order", f"${summary['average_order_cents'] / 100:,.2f}", "Order total")
+    with col4:
+        display_metric_card("Cart Size", f"{summary['average_units']:.1f}", f"Units ({summary['average_lines']:.1f} lines) per order")
+    
+    if not daily:
+        st.info("No orders in this period yet.")
+        return
+    
+    st.markdown('<h4 class="section-header">📈 Revenue per Day</h4>', unsafe_allow_html=True)
+    st.line_chart(
+        {"Day": [row['day'] for row in daily], "Revenue ($)": [row['total_cents'] / 100 for row in daily]},
+        x="Day", y="Revenue ($)",
+    )
+    
+    col_left, col_right = st.columns(2, gap="large")
+    with col_left:
+        st.markdown('<h4 class="section-header">🧵 Revenue by Material</h4>', unsafe_allow_html=True)
+        st.bar_chart(
+            {
+                "Day": [row['day'] for row in material_daily],
+                "Material": [row['material'] for row in material_daily],
+                "Revenue ($)": [row['revenue_cents'] / 100 for row in material_daily],
+            },
+            x="Day", y="Revenue ($)", color="Material",
+        )
+        st.dataframe(
+            [
+                {"Material": row['material'], "Units": row['units'], "Revenue ($)": row['revenue_cents'] / 100}
+                for row in materials
+            ],
+            hide_index=True,
+            use_container_width=True,
+        )
+    with col_right:
+        st.markdown('<h4 class="section-header">🏷️ Discounts Used</h4>', unsafe_allow_html=True)
+        if promotions:
+            st.dataframe(
+                [
+                    {
+                        "Promotion": row['label'],
+                        "Code": row['code'] or "(automatic)",
+                        "Uses": row['uses'],
+                        "Discount ($)": row['discount_cents'] / 100,
+                    }
+                    for row in promotions
+                ],
+                hide_index=True,
+                use_container_width=True,
+            )
+        else:
+            st.info("No discounts were used in this period.")
+    st.caption(f"Read from the analytics rollups in {elapsed * 1000:.1f} ms.")
 
 def main():
     """Main function to route between pages"""
@@ -791,13 +1019,16 @@ def main():
         'home': show_home,
         'ai_assistant': show_ai_assistant,
         'printing': show_ai_assistant,  # Redirect old route
-        'printing_checkout': show_printing_checkout,  # Redirect old route
+        'printing_checkout': show_printing_checkout,
         'filament': show_filament_store,
-        'filament_checkout': show_filament_checkout
+        'filament_checkout': show_filament_checkout,
+        'admin': show_admin,
     }
     
-    view_func = views.get(st.session_state.view, show_home)
-    view_func()
+    start_metrics()
+    view = st.session_state.view if st.session_state.view in views else 'home'
+    with metrics.rerun(view):
+        views[view]()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,225 @@
+"""Image asset pipeline for the store grid.
+
+Product photos ship as ~1000x1000 RGBA PNGs (0.6-1 MB each). This module
+derives compressed WebP/JPEG thumbnails at the width the product grid actually
+displays them (plus a 2x variant for high-density tablet screens), names them
+by content hash and writes them under ``static/thumbnails`` so Streamlit's
+static file server can hand them to the browser as ordinary, cacheable files.
+The app stylesheet (``static/style.css``) is served the same way.
+
+Run ``python assets.py`` to pre-build the thumbnails (e.g. in a deploy step);
+the app also builds any missing ones once per process at startup.
+"""
+import argparse
+import functools
+import hashlib
+import html
+import json
+import os
+import re
+
+from PIL import Image
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+THUMBNAIL_DIR = os.path.join(BASE_DIR, "static", "thumbnails")
+# URL the Streamlit static file server exposes ``static/thumbnails`` under
+THUMBNAIL_URL = "app/static/thumbnails"
+STYLESHEET = os.path.join(BASE_DIR, "static", "style.css")
+STYLESHEET_URL = "app/static/style.css"
+MANIFEST_NAME = "manifest.json"
+
+# A product card is one third of the wide layout; ~400 CSS px on the shop tablets
+GRID_IMAGE_WIDTH = 400
+DENSITIES = (1, 2)
+FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+# Bump when the resize/encode settings change so old thumbnails are regenerated
+PIPELINE_VERSION = 1
+
+
+def _source_hash(path):
+    """Hash the source image bytes together with the pipeline settings"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    digest.update(json.dumps([PIPELINE_VERSION, GRID_IMAGE_WIDTH, DENSITIES, FORMATS], sort_keys=True).encode())
+    return digest.hexdigest()[:12]
+
+
+def _resize(image, width):
+    """Downscale an image to the given width, keeping its aspect ratio"""
+    if image.width <= width:
+        return image.copy()
+    height = round(image.height * width / image.width)
+    return image.resize((width, height), Image.LANCZOS)
+
+
+def _flatten(image):
+    """Composite transparent pixels onto white for formats without alpha"""
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def build_thumbnail(source, out_dir=THUMBNAIL_DIR, force=False):
+    """Build every width/format variant for one source image
+
+    Returns the manifest entry: ``{format: {density: filename}}`` plus the
+    display size. Variants that already exist under their content-hashed
+    name are left untouched unless ``force`` is set.
+    """
+    stem = os.path.splitext(os.path.basename(source))[0]
+    digest = _source_hash(source)
+    entry = {"width": GRID_IMAGE_WIDTH, "height": GRID_IMAGE_WIDTH, "hash": digest, "variants": {}}
+    with Image.open(source) as probe:
+        entry["height"] = round(probe.height * GRID_IMAGE_WIDTH / probe.width)
+    image = None
+
+    for fmt, options in FORMATS.items():
+        entry["variants"][fmt] = {}
+        for density in DENSITIES:
+            width = GRID_IMAGE_WIDTH * density
+            filename = f"{stem}-{digest}-{width}w.{fmt}"
+            target = os.path.join(out_dir, filename)
+            entry["variants"][fmt][str(density)] = filename
+            if os.path.exists(target) and not force:
+                continue
+
+            if image is None:
+                image = Image.open(source)
+                image.load()
+            resized = _resize(image, width)
+            if fmt == "jpeg":
+                resized = _flatten(resized)
+            # Write to a temp name first so concurrent builders never serve half a file
+            tmp = f"{target}.{os.getpid()}.tmp"
+            resized.save(tmp, **options)
+            os.replace(tmp, target)
+
+    return entry
+
+
+def build_thumbnails(sources, out_dir=THUMBNAIL_DIR, force=False):
+    """Build thumbnails for all source images and write the manifest
+
+    Missing sources are skipped so the store can fall back to a warning card.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = {}
+    for source in sorted(set(sources)):
+        path = source if os.path.isabs(source) else os.path.join(BASE_DIR, source)
+        if not os.path.exists(path):
+            continue
+        manifest[source] = build_thumbnail(path, out_dir, force)
+
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    _remove_stale(out_dir, manifest)
+    return manifest
+
+
+def _remove_stale(out_dir, manifest):
+    """Delete outdated thumbnails of the images that were just rebuilt"""
+    live = set()
+    for entry in manifest.values():
+        for by_density in entry["variants"].values():
+            live.update(by_density.values())
+    # Match whole thumbnail names: a bare stem prefix would let "pla" claim "pla-white" files
+    stems = "|".join(re.escape(os.path.splitext(os.path.basename(source))[0]) for source in manifest)
+    pattern = re.compile(rf"(?:{stems})-[0-9a-f]{{12}}-\d+w\.(?:{'|'.join(FORMATS)})")
+    for name in os.listdir(out_dir):
+        if name not in live and pattern.fullmatch(name):
+            os.remove(os.path.join(out_dir, name))
+
+
+@functools.lru_cache(maxsize=None)
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def thumbnail_bytes(manifest, source, fmt="webp", density="1", out_dir=THUMBNAIL_DIR):
+    """Size of the thumbnail variant most browsers fetch for ``source`` (0 if none)
+
+    Thumbnail names are content-hashed, so each size is read from disk once.
+    """
+    entry = manifest.get(source)
+    if not entry:
+        return 0
+    return _file_size(os.path.join(out_dir, entry["variants"][fmt][density]))
+
+
+def thumbnail_html(manifest, source, alt):
+    """Return a ``<picture>`` tag serving the size-matched thumbnail for ``source``
+
+    The browser picks WebP or JPEG and the 1x/2x variant itself, and caches
+    the files across reruns. Returns ``None`` when no thumbnail exists.
+    """
+    entry = manifest.get(source)
+    if not entry:
+        return None
+
+    def srcset(fmt):
+        return ", ".join(
+            f"{THUMBNAIL_URL}/{name} {density}x"
+            for density, name in sorted(entry["variants"][fmt].items())
+        )
+
+    fallback = entry["variants"]["jpeg"]["1"]
+    return (
+        f'<picture>'
+        f'<source type="image/webp" srcset="{srcset("webp")}">'
+        f'<img class="product-thumb" src="{THUMBNAIL_URL}/{fallback}" srcset="{srcset("jpeg")}" '
+        f'width="{entry["width"]}" height="{entry["height"]}" alt="{html.escape(alt)}" loading="lazy">'
+        f'</picture>'
+    )
+
+
+@functools.cache
+def stylesheet_url():
+    """URL of the app stylesheet, versioned by its content hash
+
+    The file is read and hashed once per process; every rerun after that
+    gets the cached URL. Browsers cache the file like any static asset, and
+    an edited stylesheet gets a new version when the app restarts.
+    """
+    with open(STYLESHEET, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    return f"{STYLESHEET_URL}?v={digest}"
+
+
+def main():
+    """Command-line entry point: pre-build the store thumbnails"""
+    parser = argparse.ArgumentParser(description="Build size-matched thumbnails for the filament store grid")
+    parser.add_argument("images", nargs="*", help="Source images (defaults to every product image in the catalog)")
+    parser.add_argument("--out", default=THUMBNAIL_DIR, help="Output directory")
+    parser.add_argument("--force", action="store_true", help="Re-encode even if a thumbnail already exists")
+    args = parser.parse_args()
+
+    sources = args.images
+    if not sources:
+        from catalog import load_catalog
+        sources = [product.image for product in load_catalog()]
+
+    manifest = build_thumbnails(sources, args.out, args.force)
+    for source, entry in sorted(manifest.items()):
+        original = os.path.getsize(os.path.join(BASE_DIR, source) if not os.path.isabs(source) else source)
+        sizes = ", ".join(
+            f"{name}: {os.path.getsize(os.path.join(args.out, name)) / 1024:.0f} KB"
+            for by_density in entry["variants"].values()
+            for name in by_density.values()
+        )
+        print(f"{source} ({original / 1024:.0f} KB) -> {sizes}")
+
+
+if __name__ == "__main__":
+    main()
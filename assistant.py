@@ -0,0 +1,318 @@
+"""Chat completion helpers for the AI assistant view.
+
+Kept free of Streamlit so the same calls can be driven from scripts and
+benchmarks (see ``stub_llm.py`` for a local OpenAI-compatible server).
+"""
+import concurrent.futures
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+MODEL = "gpt-4o-mini"  # Using gpt-4o-mini for cost efficiency
+TEMPERATURE = 0.7
+MAX_TOKENS = 800
+
+# System prompt with 3D printing expertise; material specifics are retrieved per
+# question from the knowledge base (knowledge.py) and appended as reference notes
+SYSTEM_PROMPT = """You are an expert 3D printing consultant with years of experience in additive manufacturing. You help users with material selection and properties, print orientation for maximum strength, best practices for difficult materials (ABS, ASA, Nylon, PETG, TPU) and general print troubleshooting.
+
+Always provide specific, actionable advice. Ask clarifying questions when needed. Be friendly and encouraging to beginners while giving detailed technical guidance to advanced users. Prefer the reference notes below when they cover the question."""
+
+
+def build_system_prompt(notes):
+    """Append retrieved reference notes to the base system prompt"""
+    if not notes:
+        return SYSTEM_PROMPT
+    return f"{SYSTEM_PROMPT}\n\n## Reference notes\n\n{notes}"
+
+
+# Process-wide connection pool settings, shared by every Streamlit session
+MAX_CONNECTIONS = 20
+MAX_KEEPALIVE_CONNECTIONS = 10
+KEEPALIVE_EXPIRY = 60.0
+CONNECT_TIMEOUT = 5.0
+READ_TIMEOUT = 60.0
+# Retries use the SDK's exponential backoff with jitter (0.5s doubling, capped at 8s)
+MAX_RETRIES = 3
+
+_pool_lock = threading.Lock()
+_http_client = None
+_clients = {}
+
+
+def _openai():
+    """The OpenAI SDK, imported on first use
+
+    Importing it costs about half a second and most visitors never open the
+    assistant, so the store pages start without it.
+    """
+    import openai
+    return openai
+
+
+def _timeout_errors():
+    """Exception types that mean the provider timed out
+
+    The SDK raises ``APITimeoutError`` for connect, first-token and mid-stream
+    stalls alike; ``TimeoutError`` covers waits on futures.
+    """
+    return _openai().APITimeoutError, concurrent.futures.TimeoutError
+
+
+def _get_http_client():
+    """Return the single pooled HTTP transport shared by all OpenAI clients"""
+    global _http_client
+    if _http_client is None:
+        openai = _openai()
+        # httpx.Limits, taken from openai so we don't depend on httpx directly
+        limits = type(openai.DEFAULT_CONNECTION_LIMITS)
+        _http_client = openai.DefaultHttpxClient(
+            limits=limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY,
+            ),
+            timeout=openai.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+        )
+    return _http_client
+
+
+def get_client(api_key, base_url=None):
+    """Return a cached OpenAI client for this API key and base URL
+
+    Clients are built once per process and all share one keep-alive
+    connection pool, so the connection cap holds across every session and
+    TLS sessions are reused between messages.
+    """
+    key = (api_key, base_url)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _pool_lock:
+        client = _clients.get(key)
+        if client is None:
+            openai = _openai()
+            client = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                http_client=_get_http_client(),
+                timeout=openai.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+                max_retries=MAX_RETRIES,
+            )
+            _clients[key] = client
+    return client
+
+
+def configure_pool(max_connections=None, max_keepalive_connections=None, connect_timeout=None, read_timeout=None, max_retries=None):
+    """Override pool settings; only takes effect before the first client is built"""
+    global MAX_CONNECTIONS, MAX_KEEPALIVE_CONNECTIONS, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES
+    with _pool_lock:
+        if _http_client is not None:
+            return False
+        if max_connections is not None:
+            MAX_CONNECTIONS = int(max_connections)
+        if max_keepalive_connections is not None:
+            MAX_KEEPALIVE_CONNECTIONS = int(max_keepalive_connections)
+        if connect_timeout is not None:
+            CONNECT_TIMEOUT = float(connect_timeout)
+        if read_timeout is not None:
+            READ_TIMEOUT = float(read_timeout)
+        if max_retries is not None:
+            MAX_RETRIES = int(max_retries)
+        return True
+
+
+class ChatStream:
+    """Iterate over a streamed chat completion, one text delta at a time
+
+    Timing is measured from construction: ``ttft`` is the time to the first
+    non-empty token and ``latency`` the time until the stream finished.
+    Both are ``None`` until known. ``text`` holds the reply so far.
+    """
+
+    def __init__(self, client, messages, model=MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS, timeout=None):
+        self.started = time.perf_counter()
+        self.ttft = None
+        self.latency = None
+        self.usage = None
+        self.parts = []
+        self._stream = client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            stream_options={"include_usage": True},
+            **({"timeout": timeout} if timeout is not None else {}),
+        )
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def __iter__(self):
+        try:
+            for chunk in self._stream:
+                if getattr(chunk, "usage", None):
+                    self.usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if self.ttft is None:
+                    self.ttft = time.perf_counter() - self.started
+                self.parts.append(delta)
+                yield delta
+        finally:
+            self.latency = time.perf_counter() - self.started
+
+    def close(self):
+        """Abort the underlying HTTP stream"""
+        self._stream.close()
+
+
+def complete(client, messages, model=MODEL, temperature=TEMPERATURE, max_tokens=MAX_TOKENS):
+    """Non-streaming completion; returns the reply text"""
+    completion = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens
+    )
+    return completion.choices[0].message.content
+
+
+# Background chat execution, shared by every session in the process
+MAX_CONCURRENT_CHATS = 8    # completions streaming at once; later requests queue
+QUEUE_TIMEOUT = 20.0        # seconds a request may wait for a free slot
+STALL_TIMEOUT = 20.0        # seconds without any bytes from the provider
+REQUEST_TIMEOUT = 90.0      # seconds for a whole reply
+CHAT_MAX_RETRIES = 1        # retries per request; each stalled attempt costs STALL_TIMEOUT
+
+
+class ChatTimeout(Exception):
+    """The provider (or the queue in front of it) took too long"""
+
+
+class ChatJob:
+    """One streamed completion running on the ``ChatExecutor``
+
+    ``text`` grows as tokens arrive. Once ``done``, either ``error`` is set or
+    the reply is complete; ``cancel()`` aborts the HTTP stream from any
+    thread and the reply is dropped.
+    """
+
+    def __init__(self, key, question, messages):
+        self.key = key
+        self.question = question
+        self.messages = messages
+        self.text = ""
+        self.ttft = None
+        self.latency = None
+        self.usage = None
+        self.error = None
+        self.cancelled = False
+        self.submitted = time.perf_counter()
+        self._stream = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes or ``timeout`` passes; returns ``done``"""
+        return self._done.wait(timeout)
+
+    def cancel(self):
+        self.cancelled = True
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class ChatExecutor:
+    """Run streamed completions on a bounded thread pool
+
+    At most ``max_concurrent`` replies stream at once, so a slow provider
+    ties up this pool rather than Streamlit's script threads. Each session
+    (``key``) has at most one job in flight: resubmitting the same question
+    returns the running job, a different question cancels it.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_CHATS, queue_timeout=QUEUE_TIMEOUT,
+                 stall_timeout=STALL_TIMEOUT, request_timeout=REQUEST_TIMEOUT, max_retries=CHAT_MAX_RETRIES):
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.stall_timeout = stall_timeout
+        self.request_timeout = request_timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix="chat")
+        self._lock = threading.Lock()
+        self._jobs = {}
+
+    def submit(self, key, client, question, messages):
+        """Start (or join) the session's completion; returns its ``ChatJob``"""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and not job.done:
+                if job.question == question and not job.cancelled:
+                    return job
+                job.cancel()
+            job = self._jobs[key] = ChatJob(key, question, messages)
+        self._pool.submit(self._run, job, client)
+        return job
+
+    def cancel(self, key):
+        """Cancel the session's job in flight; returns whether there was one"""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if job is None or job.done:
+            return False
+        job.cancel()
+        return True
+
+    def in_flight(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if not job.done)
+
+    def _run(self, job, client):
+        try:
+            if job.cancelled:
+                return
+            if time.perf_counter() - job.submitted > self.queue_timeout:
+                raise ChatTimeout("The assistant is busy right now. Please try again in a moment.")
+            deadline = time.perf_counter() + self.request_timeout
+            client = client.with_options(max_retries=self.max_retries)
+            stream = ChatStream(client, job.messages, timeout=_openai().Timeout(self.stall_timeout, connect=CONNECT_TIMEOUT))
+            job._stream = stream
+            if job.cancelled:
+                stream.close()
+                return
+            for _ in stream:
+                job.text = stream.text
+                if job.cancelled:
+                    break
+                if time.perf_counter() > deadline:
+                    raise ChatTimeout(f"The assistant did not finish within {self.request_timeout:g}s.")
+            job.ttft, job.latency, job.usage = stream.ttft, stream.latency, stream.usage
+        except Exception as e:
+            if not job.cancelled:
+                if not isinstance(e, ChatTimeout) and isinstance(e, _timeout_errors()):
+                    e = ChatTimeout(f"The assistant did not respond within {self.stall_timeout:g}s.")
+                job.error = e
+        finally:
+            if job._stream is not None:
+                try:
+                    job._stream.close()
+                except Exception:
+                    pass
+            job._done.set()
+            # Finished jobs are dropped here: the session keeps its own reference
+            # to read the reply, and the executor only tracks work in flight
+            with self._lock:
+                if self._jobs.get(job.key) is job:
+                    del self._jobs[job.key]
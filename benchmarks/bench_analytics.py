@@ -0,0 +1,108 @@
+"""Benchmark the sales dashboard's rollup reads against rescanning raw orders.
+
+    python benchmarks/bench_analytics.py --years 3 --orders-per-day 200
+
+Writes synthetic orders for every day of the period into a temporary
+analytics store (one Parquet part per day, rolled up as it goes), then
+times the dashboard's queries over the last year from the rollups and the
+same figures computed by scanning the Parquet parts. Both must agree.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pyarrow.compute as pc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import SalesAnalytics  # noqa: E402
+from catalog import FILAMENTS  # noqa: E402
+
+CODES = [("SAY-NO-TO-POLYMATE", 0.15), ("SKEM-FILAMENT-PRICE", 0.20), ("PARCEL-DEEZ-NUTS", 0.50)]
+
+
+def synthetic_day(rng, day, n_orders, counter):
+    records = []
+    for _ in range(n_orders):
+        counter[0] += 1
+        lines = []
+        for product in rng.sample(FILAMENTS, rng.randint(1, 4)):
+            quantity = rng.randint(1, 5)
+            unit = round(product["price"] * 100)
+            lines.append((product["id"], product["material"], quantity, unit, unit * quantity))
+        subtotal = sum(line[4] for line in lines)
+        promotions = []
+        if rng.random() < 0.3:
+            code, rate = rng.choice(CODES)
+            promotions.append((code, code, code, round(subtotal * rate)))
+        discount = sum(p[3] for p in promotions)
+        shipping = 0 if subtotal >= 10000 else 500
+        tax = round((subtotal - discount) * 0.09)
+        records.append({
+            "invoice_number": f"INV-{day:%Y%m%d}-{counter[0]:06d}",
+            "created_at": day + timedelta(seconds=rng.randint(0, 86399)),
+            "order_type": "Filament Order",
+            "subtotal_cents": subtotal, "shipping_cents": shipping, "tax_cents": tax, "discount_cents": discount,
+            "total_cents": subtotal - discount + shipping + tax,
+            "lines": lines, "promotions": promotions,
+        })
+    return records
+
+
+def timed(label, fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    print(f"{label:34} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=float, default=3)
+    parser.add_argument("--orders-per-day", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    days = int(args.years * 365)
+    first = datetime(2024, 1, 1)
+    with tempfile.TemporaryDirectory() as root:
+        analytics = SalesAnalytics(root)
+        counter = [0]
+        started = time.perf_counter()
+        for i in range(days):
+            analytics._write_batch(synthetic_day(rng, first + timedelta(days=i), args.orders_per_day, counter))
+        elapsed = time.perf_counter() - started
+        print(f"{counter[0]:,} orders over {days} days written and rolled up in {elapsed:.1f} s "
+              f"({elapsed / days * 1000:.1f} ms per daily batch)")
+
+        end = (first + timedelta(days=days - 1)).date()
+        start = end - timedelta(days=364)
+
+        def dashboard():
+            return (analytics.summary(start, end), analytics.daily(start, end), analytics.by_material(start, end),
+                    analytics.by_material_daily(start, end), analytics.by_promotion(start, end))
+
+        def rescan():
+            orders = analytics.scan(start, end, "orders", ["total_cents", "units"])
+            lines = analytics.scan(start, end, "order_lines", ["material", "line_cents"])
+            return (
+                pc.sum(orders["total_cents"]).as_py(),
+                orders.num_rows,
+                {row["material"]: row["line_cents_sum"]
+                 for row in lines.group_by("material").aggregate([("line_cents", "sum")]).to_pylist()},
+            )
+
+        summary, _, materials, _, _ = timed("dashboard from rollups (1 year)", dashboard)
+        total, orders, by_material = timed("same figures by rescanning Parquet", rescan)
+        assert summary["total_cents"] == total and summary["orders"] == orders
+        assert {row["material"]: row["revenue_cents"] for row in materials} == by_material
+        analytics.close()
+
+
+if __name__ == "__main__":
+    main()
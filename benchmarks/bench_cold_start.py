@@ -0,0 +1,134 @@
+"""Measure the app's cold start: imports and first render in a fresh process.
+
+    python benchmarks/bench_cold_start.py --runs 7
+    python benchmarks/bench_cold_start.py --save-baseline benchmarks/cold_start_baseline.json
+    python benchmarks/bench_cold_start.py --compare benchmarks/cold_start_baseline.json
+
+Each run starts a new Python process (so nothing is cached in memory) with a
+throwaway data directory, and times in it:
+
+* ``import streamlit``;
+* the module-level imports of ``app.py`` (read from its source);
+* the first script run of the home page through ``AppTest``, which is what
+  the first visitor after a deploy waits for;
+* a second run of the same session, i.e. an ordinary rerun.
+
+It also lists which heavy optional modules (the OpenAI SDK, pyarrow,
+pandas) the home page pulled in; they should only load with the views that
+need them. One unmeasured run goes first so thumbnails and ``.pyc`` files
+exist. Medians are reported; ``--compare`` exits non-zero if a median grew
+by more than ``--tolerance`` or a heavy module started loading on the home
+page, so the numbers can be tracked per release.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("openai", "pyarrow", "pandas")
+STAGES = ("import_streamlit_ms", "import_app_modules_ms", "first_run_ms", "second_run_ms")
+
+# Runs in the child process; prints one JSON line with its timings
+CHILD = """
+import ast, json, sys, time
+app, heavy = sys.argv[1], sys.argv[2].split(",")
+timings = {}
+started = time.perf_counter()
+import streamlit
+timings["import_streamlit_ms"] = (time.perf_counter() - started) * 1000
+
+tree = ast.parse(open(app).read())
+imports = ast.Module([node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))], [])
+started = time.perf_counter()
+exec(compile(imports, app, "exec"), {})
+timings["import_app_modules_ms"] = (time.perf_counter() - started) * 1000
+
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(app, default_timeout=120)
+started = time.perf_counter()
+at.run()
+timings["first_run_ms"] = (time.perf_counter() - started) * 1000
+started = time.perf_counter()
+at.run()
+timings["second_run_ms"] = (time.perf_counter() - started) * 1000
+
+timings["exceptions"] = [e.value for e in at.exception]
+timings["heavy_modules"] = [name for name in heavy if name in sys.modules]
+print(json.dumps(timings))
+"""
+
+
+def run_once(app):
+    """Time one cold start in a fresh interpreter"""
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ, HUB_DATA_DIR=workdir, PYTHONPATH=os.path.dirname(app))
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, app, ",".join(HEAVY_MODULES)],
+            cwd=workdir, env=env, capture_output=True, text=True, check=True,
+        ).stdout
+    result = json.loads(out.strip().splitlines()[-1])
+    if result["exceptions"]:
+        raise RuntimeError(f"home page raised: {result['exceptions']}")
+    return result
+
+
+def compare(result, baseline, tolerance):
+    """Return regression messages for stage medians and newly loaded heavy modules"""
+    problems = []
+    for stage in STAGES:
+        base = baseline["median_ms"].get(stage)
+        now = result["median_ms"][stage]
+        if base and now > base * (1 + tolerance) and now - base > 20:
+            problems.append(f"{stage}: {now} ms vs baseline {base} ms")
+    for name in sorted(set(result["heavy_modules"]) - set(baseline.get("heavy_modules", []))):
+        problems.append(f"{name} is now imported by the home page")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline")
+    args = parser.parse_args()
+    app = os.path.abspath(args.app)
+
+    run_once(app)  # warm-up: builds thumbnails and bytecode caches
+    runs = [run_once(app) for _ in range(args.runs)]
+    result = {
+        "runs": args.runs,
+        "median_ms": {stage: round(statistics.median(r[stage] for r in runs), 1) for stage in STAGES},
+        "max_ms": {stage: round(max(r[stage] for r in runs), 1) for stage in STAGES},
+        "heavy_modules": sorted({name for r in runs for name in r["heavy_modules"]}),
+    }
+
+    print(f"{app} · {args.runs} fresh processes")
+    print(f"{'stage':<24}{'median ms':>11}{'max ms':>10}")
+    for stage in STAGES:
+        print(f"{stage:<24}{result['median_ms'][stage]:>11}{result['max_ms'][stage]:>10}")
+    cold = sum(result["median_ms"][stage] for stage in STAGES[:3])
+    print(f"{'cold start (first 3)':<24}{cold:>11.1f}")
+    print(f"heavy modules on the home page: {', '.join(result['heavy_modules']) or 'none'}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions vs baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Benchmark the vectorized pricing engine against the per-cart checkout path.
+
+    python benchmarks/bench_pricing.py --carts 20000 --skus 3000
+
+Prices the same randomly generated carts and reports timings for the
+original float loop from ``show_filament_checkout`` (one cart at a time), a
+``decimal.Decimal`` reference, ``PricingEngine.price_carts`` (dict carts)
+and ``PricingEngine.price_lines`` (columnar input). The engine must agree
+with the Decimal reference to the cent.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import FILAMENTS, Catalog  # noqa: E402
+from pricing import DISCOUNT_CODES, SHIPPING_TIERS, TAX_RATE, PricingEngine  # noqa: E402
+
+CENT = Decimal("0.01")
+
+
+def synthetic_catalog(n_skus, rng):
+    records = []
+    for i in range(n_skus):
+        record = dict(FILAMENTS[i % len(FILAMENTS)])
+        record["id"] = f"{record['id']}_{i}"
+        record["price"] = round(rng.uniform(15, 90), 2)
+        records.append(record)
+    return Catalog(records)
+
+
+def random_carts(catalog, n_carts, rng):
+    codes = list(DISCOUNT_CODES) + [""] * 3
+    ids = [p.id for p in catalog.products]
+    carts = []
+    for _ in range(n_carts):
+        cart = {pid: rng.randint(1, 5) for pid in rng.sample(ids, rng.randint(1, 8))}
+        carts.append((cart, rng.choice(codes)))
+    return carts
+
+
+def legacy_price(cart, code, catalog):
+    """The original per-cart float arithmetic from the checkout page"""
+    subtotal = 0
+    for product_id, qty in cart.items():
+        subtotal += catalog[product_id].price * qty
+    shipping = 0 if subtotal >= 100 else 5.00
+    tax = subtotal * 0.09
+    discount = subtotal * DISCOUNT_CODES[code.upper()] if code.upper() in DISCOUNT_CODES else 0
+    return subtotal + shipping + tax - discount
+
+
+def decimal_price(cart, code, catalog):
+    """Reference implementation with Decimal and half-up cent rounding"""
+    subtotal = sum(Decimal(str(catalog[pid].price)) * qty for pid, qty in cart.items())
+    shipping = Decimal("0")
+    for threshold, fee in sorted(SHIPPING_TIERS):
+        if subtotal >= Decimal(str(threshold)):
+            shipping = Decimal(str(fee))
+    tax = (subtotal * Decimal(str(TAX_RATE))).quantize(CENT, ROUND_HALF_UP)
+    rate = Decimal(str(DISCOUNT_CODES.get(code.upper(), 0)))
+    discount = (subtotal * rate).quantize(CENT, ROUND_HALF_UP)
+    return int((subtotal + shipping + tax - discount) * 100)
+
+
+def timed(label, fn, n):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms   {n / elapsed:12,.0f} carts/s")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=20000)
+    parser.add_argument("--skus", type=int, default=3000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    catalog = synthetic_catalog(args.skus, rng)
+    carts = random_carts(catalog, args.carts, rng)
+    engine = PricingEngine()
+
+    print(f"{args.carts:,} carts over a {args.skus:,}-SKU catalog")
+    legacy, legacy_time = timed("per-cart float (old path)", lambda: [legacy_price(c, d, catalog) for c, d in carts], args.carts)
+    reference, _ = timed("per-cart Decimal", lambda: [decimal_price(c, d, catalog) for c, d in carts], args.carts)
+    batch, batch_time = timed("PricingEngine.price_carts", lambda: engine.price_carts(carts, catalog), args.carts)
+
+    # Columnar input (e.g. a quote file already loaded as arrays) skips the dict flattening
+    cart_ids = [i for i, (cart, _) in enumerate(carts) for _ in cart]
+    unit_cents = [catalog.price_cents[catalog.index_of[pid]] for cart, _ in carts for pid in cart]
+    quantities = [qty for cart, _ in carts for qty in cart.values()]
+    rates = [DISCOUNT_CODES.get(code.upper(), 0) for _, code in carts]
+    timed("PricingEngine.price_lines", lambda: engine.price_lines(cart_ids, unit_cents, quantities, rates), args.carts)
+
+    mismatches = sum(1 for ref, b in zip(reference, batch) if ref != b.total)
+    drift = sum(1 for old, b in zip(legacy, batch) if round(old * 100) != b.total)
+    print(f"speedup vs old path: {legacy_time / batch_time:.1f}x")
+    print(f"cent mismatches vs Decimal reference: {mismatches}")
+    print(f"carts where the old float total displayed a different cent: {drift}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Measure server time per store click with Streamlit's AppTest harness.
+
+    python benchmarks/bench_reruns.py --clicks 50
+    python benchmarks/bench_reruns.py --app /path/to/other/checkout/app.py
+
+Times Add to Cart / Remove clicks and page changes on the filament store and
+compares them with a full script run of the same page. Pointing ``--app`` at
+an older checkout gives the before/after numbers for the same clicks.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from catalog import FILAMENTS  # noqa: E402
+
+
+def synthetic_catalog(n_skus):
+    """Write a catalog with enough products for several store pages"""
+    records = []
+    for i in range(n_skus):
+        record = dict(FILAMENTS[i % len(FILAMENTS)])
+        record["id"] = f"{record['id']}_{i}"
+        records.append(record)
+    path = os.path.join(tempfile.mkdtemp(), "catalog.json")
+    with open(path, "w") as f:
+        json.dump(records, f)
+    return path
+
+
+def timed_clicks(at, key, clicks):
+    """Click one button repeatedly and return per-click server times in ms"""
+    times = []
+    for _ in range(clicks):
+        started = time.perf_counter()
+        at.button(key=key).click().run()
+        times.append((time.perf_counter() - started) * 1000)
+        # A keyed fragment rerun leaves only the fragment's elements in the
+        # test tree; a full run restores the page before the next click.
+        at.run()
+    return times
+
+
+def report(label, times):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"{label:<28} p50 {statistics.median(times):7.1f} ms   p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--app", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--clicks", type=int, default=30)
+    parser.add_argument("--skus", type=int, default=60)
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    os.environ["HUB_CATALOG_PATH"] = synthetic_catalog(args.skus)
+    os.environ.setdefault("HUB_DATA_DIR", tempfile.mkdtemp())
+    sys.path.insert(0, os.path.dirname(os.path.abspath(args.app)))
+
+    at = AppTest.from_file(os.path.abspath(args.app), default_timeout=60).run()
+    at.session_state.view = "filament"
+    at.run()
+    product = [b.key for b in at.button if b.key and b.key.startswith("add_")][0].removeprefix("add_")
+
+    full = []
+    for _ in range(args.clicks):
+        started = time.perf_counter()
+        at.run()
+        full.append((time.perf_counter() - started) * 1000)
+
+    print(f"{args.app} · {args.skus} products · {args.clicks} clicks each")
+    report("full script run", full)
+    report("Add to Cart", timed_clicks(at, f"add_{product}", args.clicks))
+    remove = []
+    for _ in range(args.clicks):
+        at.button(key=f"add_{product}").click().run()
+        at.run()
+        remove.extend(timed_clicks(at, f"remove_{product}", 1))
+    report("Remove", remove)
+    report("Next page", [t for _ in range(args.clicks) for t in (timed_clicks(at, "page_next", 1) + timed_clicks(at, "page_prev", 1))])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark STL parsing, mesh analysis and quoting on a large mesh.
+
+    python benchmarks/bench_stl_quote.py --triangles 2000000
+
+Tessellates a sphere into about ``--triangles`` facets, writes it as binary
+STL (and as ASCII for ``--ascii``), then times ``parse_stl``, ``analyze``,
+quoting every material, and a cached repeat through ``StlQuoter``. Volume
+and area are checked against the exact values for the tessellated sphere.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import load_catalog  # noqa: E402
+from stl_quote import StlQuoter, analyze, material_prices, parse_stl  # noqa: E402
+
+
+def sphere(n_triangles, radius):
+    """Closed UV sphere with about ``n_triangles`` facets, as an (n, 3, 3) float32 array"""
+    stacks = max(2, int(np.sqrt(n_triangles / 4)))
+    slices = max(3, n_triangles // (2 * stacks))
+    theta = np.linspace(0, np.pi, stacks + 1)
+    phi = np.linspace(0, 2 * np.pi, slices + 1)
+    t, p = np.meshgrid(theta, phi, indexing="ij")
+    points = radius * np.stack([np.sin(t) * np.cos(p), np.sin(t) * np.sin(p), np.cos(t)], axis=-1)
+    a, b = points[:-1, :-1], points[:-1, 1:]
+    c, d = points[1:, :-1], points[1:, 1:]
+    # Two outward-facing triangles per quad; the pole ones are degenerate but harmless
+    first = np.stack([a, c, d], axis=-2).reshape(-1, 3, 3)
+    second = np.stack([a, d, b], axis=-2).reshape(-1, 3, 3)
+    return np.concatenate([first, second]).astype(np.float32)
+
+
+def binary_stl(triangles):
+    facets = np.zeros(len(triangles), dtype=[("normal", "<f4", (3,)), ("vertices", "<f4", (3, 3)), ("attributes", "<u2")])
+    facets["vertices"] = triangles
+    return b"benchmark".ljust(80, b" ") + np.uint32(len(triangles)).tobytes() + facets.tobytes()
+
+
+def ascii_stl(triangles):
+    lines = ["solid benchmark"]
+    for tri in triangles:
+        lines.append("facet normal 0 0 0\nouter loop")
+        lines.extend(f"vertex {x:.6e} {y:.6e} {z:.6e}" for x, y, z in tri)
+        lines.append("endloop\nendfacet")
+    lines.append("endsolid benchmark")
+    return "\n".join(lines).encode()
+
+
+def timed(label, fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    print(f"{label:24} {(time.perf_counter() - started) * 1000:9.1f} ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--triangles", type=int, default=2_000_000)
+    parser.add_argument("--radius", type=float, default=40.0, help="mm")
+    parser.add_argument("--ascii", type=int, default=0, help="also time an ASCII file of this many triangles")
+    args = parser.parse_args()
+
+    triangles = sphere(args.triangles, args.radius)
+    data = binary_stl(triangles)
+    print(f"{len(triangles)} triangles, {len(data) / 1e6:.1f} MB binary STL")
+
+    parsed = timed("parse (binary)", parse_stl, data)
+    stats = timed("analyze", analyze, parsed)
+    prices = material_prices(load_catalog())
+    quoter = StlQuoter()
+    timed("quote all materials", quoter.quote_all, stats, prices)
+    timed("quoter, first upload", quoter.analyze, data)
+    timed("quoter, same file again", quoter.analyze, data)
+
+    # Exact volume/area of the polyhedron, computed independently per triangle in float64
+    v = triangles.astype(np.float64)
+    cross = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    volume = np.einsum("ij,ij->", v[:, 0], np.cross(v[:, 1], v[:, 2])) / 6
+    area = 0.5 * np.linalg.norm(cross, axis=1).sum()
+    print(f"volume {stats.volume / 1000:.3f} cm3 (expected {volume / 1000:.3f}, "
+          f"sphere {4 / 3 * np.pi * args.radius ** 3 / 1000:.3f})")
+    print(f"area   {stats.area / 100:.3f} cm2 (expected {area / 100:.3f})")
+    assert abs(stats.volume - volume) <= 1e-6 * volume and abs(stats.area - area) <= 1e-6 * area
+
+    if args.ascii:
+        text = ascii_stl(sphere(args.ascii, args.radius))
+        print(f"{args.ascii} triangles, {len(text) / 1e6:.1f} MB ASCII STL")
+        timed("parse (ascii)", parse_stl, text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+"""Load test: many simulated shoppers against one real ``streamlit run app.py`` process.
+
+    python benchmarks/loadtest.py --sessions 20 --duration 60
+    python benchmarks/loadtest.py --sessions 20 --save-baseline benchmarks/loadtest_baseline.json
+    python benchmarks/loadtest.py --sessions 20 --compare benchmarks/loadtest_baseline.json
+
+Starts the app as a headless server (with a local stub LLM, throwaway data
+directory and response cache) and connects N scripted clients to its
+websocket. Each client speaks Streamlit's protocol the way the browser does:
+it sends ``rerun_script`` back-messages carrying widget states, including
+fragment ids, so a click reruns only its fragment. Clients loop over the
+real flows:
+
+* shop: open the store, add products, go to checkout, fill in contact
+  details and view the invoice (its PDF/HTML render runs on the server);
+* chat: open the assistant and send questions answered by the stub model.
+
+Every interaction is timed from sending the back-message to the server's
+``script_finished``. The report gives p50/p95/p99 latency per interaction and
+overall, throughput, and server memory per session (RSS growth divided by
+sessions, plus the app's own session store estimate from ``/metrics.json``).
+``AppTest`` is not used here because it cannot run sessions concurrently in
+one process.
+
+``--save-baseline`` writes the results as JSON; ``--compare`` checks a run
+against a saved baseline and exits non-zero if p95 latency or memory per
+session regressed by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from websockets.sync.client import connect  # noqa: E402
+from streamlit.proto.BackMsg_pb2 import BackMsg  # noqa: E402
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg  # noqa: E402
+
+import stub_llm  # noqa: E402
+from catalog import FILAMENTS  # noqa: E402
+
+FINISHED = {ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY}
+QUESTIONS = [
+    "How do I stop {} from warping on a large flat part?",
+    "What layer height and speed should I use for {} functional brackets?",
+    "My {} prints are stringing between towers, what should I change?",
+    "Which orientation gives the strongest {} hook?",
+]
+CONTACT = {"fil_name": "Load Test", "fil_email": "load@example.com", "fil_phone": "+65 5555 0100",
+           "fil_addr": "1 Example Road\nSingapore 000001"}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def rss_bytes(pid):
+    """Resident memory of a process (Linux), or 0 if unavailable"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class AppServer:
+    """``streamlit run app.py`` in a subprocess with throwaway data and secrets"""
+
+    def __init__(self, llm_url, app=os.path.join(ROOT, "app.py")):
+        self.workdir = tempfile.mkdtemp(prefix="hub-loadtest-")
+        self.port = free_port()
+        self.metrics_port = free_port()
+        os.makedirs(os.path.join(self.workdir, ".streamlit"))
+        with open(os.path.join(self.workdir, ".streamlit", "secrets.toml"), "w") as f:
+            f.write(f'OpenAI_Key = "loadtest"\nOpenAI_Base_URL = "{llm_url}"\n\n'
+                    f'[response_cache]\npath = "{os.path.join(self.workdir, "response_cache.json")}"\n')
+        env = dict(os.environ, HUB_DATA_DIR=os.path.join(self.workdir, "data"),
+                   HUB_METRICS_PORT=str(self.metrics_port))
+        self.log = open(os.path.join(self.workdir, "server.log"), "w")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "streamlit", "run", app, "--server.headless", "true",
+             "--server.port", str(self.port), "--server.enableStaticServing", "true",
+             "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none"],
+            cwd=self.workdir, env=env, stdout=self.log, stderr=subprocess.STDOUT,
+        )
+        self.url = f"ws://127.0.0.1:{self.port}/_stcore/stream"
+        self._wait_ready()
+
+    def _wait_ready(self, timeout=60):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"app server exited; see {self.log.name}")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{self.port}/_stcore/health", timeout=1)
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise RuntimeError("app server did not become healthy")
+
+    def rss(self):
+        return rss_bytes(self.process.pid)
+
+    def metrics(self):
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{self.metrics_port}/metrics.json", timeout=5) as r:
+                return json.load(r)
+        except OSError:
+            return {}
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class Widget:
+    __slots__ = ("id", "kind", "label", "fragment_id", "disabled")
+
+    def __init__(self, id, kind, label, fragment_id, disabled):
+        self.id = id
+        self.kind = kind
+        self.label = label
+        self.fragment_id = fragment_id
+        self.disabled = disabled
+
+
+class Client:
+    """One browser session speaking Streamlit's websocket protocol"""
+
+    def __init__(self, url, timeout=120):
+        self.ws = connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=30, legacy=True)
+        self.timeout = timeout
+        self.widgets = {}    # delta path -> Widget
+        self.values = {}     # widget id -> WidgetState with the value we typed
+        self.rerun()
+
+    def close(self):
+        self.ws.close()
+
+    def _find(self, key=None, label=None):
+        for widget in self.widgets.values():
+            if key is not None and widget.id.endswith(f"-{key}"):
+                return widget
+            if label is not None and widget.label.startswith(label):
+                return widget
+        raise LookupError(key or label)
+
+    def has(self, key=None, label=None):
+        try:
+            self._find(key, label)
+            return True
+        except LookupError:
+            return False
+
+    def rerun(self, trigger=None):
+        """Send one rerun and wait for its script to finish; returns seconds"""
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.SetInParent()
+        for value in self.values.values():
+            state.widget_states.widgets.add().CopyFrom(value)
+        if trigger is not None:
+            state.widget_states.widgets.add(id=trigger.id, trigger_value=True)
+            if trigger.fragment_id:
+                state.fragment_id = trigger.fragment_id
+        started = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        self._receive()
+        return time.perf_counter() - started
+
+    def _receive(self):
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(self.ws.recv(timeout=self.timeout))
+            kind = forward.WhichOneof("type")
+            if kind == "new_session" and not forward.new_session.fragment_ids_this_run:
+                # A full script run redraws the page; fragment runs keep the rest of it
+                self.widgets = {}
+            elif kind == "delta":
+                self._apply(forward)
+            elif kind == "script_finished":
+                if forward.script_finished in FINISHED:
+                    return
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    raise RuntimeError("app failed to compile")
+            elif kind == "session_event" and forward.session_event.WhichOneof("type") == "script_compilation_exception":
+                raise RuntimeError("app raised during compilation")
+
+    def _apply(self, forward):
+        delta = forward.delta
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            raise RuntimeError(f"app raised: {element.exception.message}")
+        path = tuple(forward.metadata.delta_path)
+        widget = getattr(element, kind)
+        widget_id = getattr(widget, "id", "")
+        if widget_id and isinstance(widget_id, str):
+            self.widgets[path] = Widget(widget_id, kind, getattr(widget, "label", ""), delta.fragment_id,
+                                        getattr(widget, "disabled", False))
+        else:
+            self.widgets.pop(path, None)
+
+    def click(self, key=None, label=None):
+        return self.rerun(self._find(key, label))
+
+    def type(self, key, text):
+        """Set a text input's value (sent with every later rerun) without a rerun"""
+        widget = self._find(key)
+        state = self.values.setdefault(widget.id, BackMsg().rerun_script.widget_states.widgets.add())
+        state.id = widget.id
+        state.string_value = text
+
+
+def shop_flow(client, rng, timings):
+    def timed(name, seconds):
+        timings.setdefault(name, []).append(seconds)
+
+    timed("open store", client.click(key="btn_filament"))
+    for product in rng.sample(FILAMENTS, rng.randint(1, 3)):
+        key = f"add_{product['id']}"
+        if client.has(key=key):
+            timed("add to cart", client.click(key=key))
+    if not client.has(label="🛒 Cart"):
+        timed("back home", client.click(key="back_fil"))
+        return
+    timed("open checkout", client.click(label="🛒 Cart"))
+    for key, value in CONTACT.items():
+        client.type(key, value)
+    timed("view invoice", client.click(key="gen_inv"))
+    client.values.clear()
+    timed("back to checkout", client.click(key="back_to_checkout2"))
+    timed("back home", client.click(key="back_fil_check") if client.has(key="back_fil_check") else client.rerun())
+    if client.has(key="back_fil"):
+        timed("back home", client.click(key="back_fil"))
+
+
+def chat_flow(client, rng, timings, messages):
+    def timed(name, seconds):
+        timings.setdefault(name, []).append(seconds)
+
+    timed("open assistant", client.click(key="btn_print"))
+    for _ in range(messages):
+        question = rng.choice(QUESTIONS).format(rng.choice(FILAMENTS)["material"])
+        client.type("chat_input", f"{question} (#{rng.randint(1, 10**6)})")
+        timed("chat send", client.click(label="Send"))
+    client.values.clear()
+    timed("back home", client.click(label="← Back"))
+
+
+def session_worker(url, index, deadline, chat_share, chat_messages, results, errors):
+    rng = random.Random(index)
+    timings = {}
+    flows = 0
+    try:
+        started = time.perf_counter()
+        client = Client(url)
+        timings["connect"] = [time.perf_counter() - started]
+        while time.monotonic() < deadline:
+            if rng.random() < chat_share:
+                chat_flow(client, rng, timings, chat_messages)
+            else:
+                shop_flow(client, rng, timings)
+            flows += 1
+        client.close()
+    except Exception as e:  # report and keep the other sessions going
+        errors.append(f"session {index}: {e!r}")
+    results.append((timings, flows))
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def summarize(timings):
+    rows = {}
+    for name, values in sorted(timings.items()):
+        if values:
+            rows[name] = {
+                "count": len(values),
+                "p50_ms": round(statistics.median(values) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            }
+    return rows
+
+
+def compare(result, baseline, tolerance):
+    """Return regression messages for p95 latency and memory per session"""
+    problems = []
+    for name, row in result["interactions"].items():
+        base = baseline["interactions"].get(name)
+        if base and row["p95_ms"] > base["p95_ms"] * (1 + tolerance) and row["p95_ms"] - base["p95_ms"] > 5:
+            problems.append(f"{name}: p95 {row['p95_ms']} ms vs baseline {base['p95_ms']} ms")
+    for key in ("rss_per_session_bytes", "session_store_mean_bytes"):
+        if baseline.get(key) and result.get(key, 0) > baseline[key] * (1 + tolerance):
+            problems.append(f"{key}: {result[key]:,} vs baseline {baseline[key]:,}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent simulated sessions")
+    parser.add_argument("--duration", type=float, default=30, help="seconds each session keeps looping")
+    parser.add_argument("--chat-share", type=float, default=0.3, help="fraction of flows that are chat")
+    parser.add_argument("--chat-messages", type=int, default=3, help="questions per chat flow")
+    parser.add_argument("--ramp", type=float, default=0.1, help="seconds between session starts")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression vs baseline")
+    args = parser.parse_args()
+
+    llm = stub_llm.start_stub_server(first_token_delay=0.3, token_delay=0.01)
+    server = AppServer(llm.base_url)
+    try:
+        # One warm-up session fills the process-wide caches before measuring
+        warmup = Client(server.url)
+        shop_flow(warmup, random.Random(0), {})
+        warmup.close()
+        rss_before = server.rss()
+
+        results, errors, threads = [], [], []
+        started = time.perf_counter()
+        deadline = time.monotonic() + args.duration
+        for i in range(args.sessions):
+            thread = threading.Thread(
+                target=session_worker,
+                args=(server.url, i + 1, deadline, args.chat_share, args.chat_messages, results, errors),
+            )
+            thread.start()
+            threads.append(thread)
+            time.sleep(args.ramp)
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        rss_after = server.rss()
+        gauges = server.metrics().get("gauges", {})
+    finally:
+        server.stop()
+        llm.shutdown()
+
+    timings, flows = {}, 0
+    for session_timings, session_flows in results:
+        flows += session_flows
+        for name, values in session_timings.items():
+            timings.setdefault(name, []).extend(values)
+    everything = [v for values in timings.values() for v in values]
+    session_store = gauges.get("session_store_mean_bytes", [{}])[0].get("value", 0)
+    result = {
+        "sessions": args.sessions,
+        "duration_s": round(elapsed, 1),
+        "flows": flows,
+        "interactions": summarize(timings),
+        "overall": summarize({"all": everything}).get("all", {}),
+        "throughput_rps": round(len(everything) / elapsed, 1),
+        "rss_per_session_bytes": max(rss_after - rss_before, 0) // max(args.sessions, 1),
+        "session_store_mean_bytes": session_store,
+        "errors": errors,
+    }
+
+    print(f"{args.sessions} sessions · {elapsed:.1f}s · {flows} flows · {len(everything):,} reruns "
+          f"· {result['throughput_rps']} reruns/s")
+    print(f"{'interaction':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, row in list(result["interactions"].items()) + [("ALL", result["overall"])]:
+        print(f"{name:<18}{row['count']:>7}{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    print(f"server RSS growth per session: {result['rss_per_session_bytes'] / 1024:,.0f} KiB · "
+          f"session store: {session_store / 1024:,.1f} KiB/session")
+    for error in errors:
+        print(f"ERROR {error}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+    if args.compare:
+        with open(args.compare) as f:
+            problems = compare(result, json.load(f), args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            sys.exit(1)
+        print("no regressions vs baseline")
+    if errors:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Estimate memory per session for capacity planning.
+
+    python benchmarks/session_footprint.py --sessions 1000 --cart-lines 6 --turns 100
+
+Builds the same simulated sessions twice: in the old layout (dict cart,
+full chat history and the finished invoice dict in ``st.session_state``) and
+in the current one (``sessions.SessionData``: compact cart, chat capped at
+``MAX_CHAT_MESSAGES`` with older turns folded into the summary, invoice kept
+as its number only). Reports bytes per session and the projected total.
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from catalog import FILAMENTS  # noqa: E402
+from chat_history import HistoryManager  # noqa: E402
+from sessions import MAX_CHAT_MESSAGES, SessionStore, deep_sizeof  # noqa: E402
+
+QUESTION = "What nozzle and bed temperature should I use for {} on a direct drive printer?"
+ANSWER = "For {0} start around 240°C nozzle and 90°C bed, print slowly and keep the enclosure closed. " * 4
+
+
+def simulated_session(rng, cart_lines, turns):
+    cart = {p["id"]: rng.randint(1, 4) for p in rng.sample(FILAMENTS, min(cart_lines, len(FILAMENTS)))}
+    messages = []
+    for _ in range(turns):
+        material = rng.choice(FILAMENTS)["material"]
+        messages.append({"role": "user", "content": QUESTION.format(material)})
+        messages.append({"role": "assistant", "content": ANSWER.format(material), "ttft": 0.4, "latency": 2.1,
+                         "prompt_tokens": 900, "completion_tokens": 120})
+    invoice = {
+        "invoice_number": f"INV-20260101-{rng.randint(1, 999999):06d}",
+        "customer_name": "Alex Example", "customer_email": "alex@example.com", "customer_phone": "+65 5555 0100",
+        "customer_address": "1 Example Road<br>Singapore 000001", "order_type": "Filament Order",
+        "items": [{"description": pid, "quantity": q, "unit_price": 28.0, "total": 28.0 * q} for pid, q in cart.items()],
+        "subtotal": 100.0, "shipping": 0.0, "tax": 9.0, "discount": 0.0, "discount_code": "", "total": 109.0,
+    }
+    return cart, messages, invoice
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--cart-lines", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=100, help="chat exchanges per session")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    store = SessionStore(sweep_interval=0)
+    legacy = []
+    for i in range(args.sessions):
+        cart, messages, invoice = simulated_session(rng, args.cart_lines, args.turns)
+        legacy.append({
+            "filament_cart": dict(cart), "chat_messages": list(messages), "chat_history_state": {},
+            "invoice_data": invoice, "stock_notice": {}, "discount_code": "", "discount_amount": 0,
+        })
+        data = store.get(f"session-{i}")
+        for product_id, quantity in cart.items():
+            data.cart[product_id] = quantity
+        history = HistoryManager(data.chat_history_state)
+        for message in messages:
+            data.chat_messages.append(message)
+            history.trim(data.chat_messages, MAX_CHAT_MESSAGES)
+
+    legacy_sizes = [deep_sizeof(state) for state in legacy]
+    report = store.report()
+    legacy_mean = sum(legacy_sizes) // len(legacy_sizes)
+    print(f"{args.sessions:,} sessions · {args.cart_lines} cart lines · {args.turns} chat exchanges each")
+    print(f"  old layout      {legacy_mean:>9,} bytes/session  max {max(legacy_sizes):>9,}  "
+          f"total {sum(legacy_sizes) / 2**20:8.1f} MiB")
+    print(f"  session store   {report['mean_bytes']:>9,} bytes/session  max {report['max_bytes']:>9,}  "
+          f"total {report['total_bytes'] / 2**20:8.1f} MiB")
+    print(f"  reduction       {legacy_mean / max(report['mean_bytes'], 1):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
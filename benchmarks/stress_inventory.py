@@ -0,0 +1,148 @@
+"""Concurrency stress test for inventory reservations.
+
+    python benchmarks/stress_inventory.py --processes 4 --threads 8 --seconds 10
+
+Many simulated shoppers (threads in several processes, like sessions spread
+over Streamlit workers) race for a few scarce products: they reserve, grow
+their carts, abandon some, release others and check out the rest. Afterwards
+the units sold must equal the drop in on-hand stock, no product may go
+negative and no holder may be left with a reservation it never released.
+Exits non-zero if any invariant is violated.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inventory import Inventory, OutOfStock  # noqa: E402
+
+PRODUCTS = {"hot_1": 25, "hot_2": 10, "warm": 200, "cold": 1000}
+
+
+def shopper(inventory, worker, deadline, seed, results):
+    rng = random.Random(seed)
+    sold = dict.fromkeys(PRODUCTS, 0)
+    latencies = []
+    rejected = 0
+    n = 0
+    while time.monotonic() < deadline:
+        holder = f"{worker}-{n}"
+        n += 1
+        cart = {}
+        for product_id in rng.sample(list(PRODUCTS), rng.randint(1, 3)):
+            quantity = rng.randint(1, 3)
+            started = time.perf_counter()
+            ok, _ = inventory.reserve(holder, product_id, quantity)
+            latencies.append(time.perf_counter() - started)
+            if ok:
+                cart[product_id] = quantity
+            else:
+                rejected += 1
+        action = rng.random()
+        started = time.perf_counter()
+        if cart and action < 0.6:
+            try:
+                inventory.commit(holder, cart)
+                for product_id, quantity in cart.items():
+                    sold[product_id] += quantity
+            except OutOfStock:
+                # Only possible if a reservation expired; release what's left
+                inventory.release(holder)
+        elif action < 0.9:
+            inventory.release(holder)
+        else:
+            pass  # abandoned cart: left to expire
+        latencies.append(time.perf_counter() - started)
+    results.append((sold, latencies, rejected, n))
+
+
+def run_process(path, worker, threads, seconds, ttl, seed):
+    inventory = Inventory(path, reservation_ttl=ttl)
+    deadline = time.monotonic() + seconds
+    results = []
+    pool = [
+        threading.Thread(target=shopper, args=(inventory, f"p{worker}t{i}", deadline, seed * 1000 + i, results))
+        for i in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    sold = dict.fromkeys(PRODUCTS, 0)
+    latencies, rejected, carts = [], 0, 0
+    for s, lat, rej, n in results:
+        for product_id, quantity in s.items():
+            sold[product_id] += quantity
+        latencies.extend(lat)
+        rejected += rej
+        carts += n
+    return sold, latencies, rejected, carts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--ttl", type=float, default=2.0, help="reservation TTL, short so abandoned carts expire mid-run")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "inventory.db")
+    inventory = Inventory(path, reservation_ttl=args.ttl)
+    for product_id, quantity in PRODUCTS.items():
+        inventory.set_stock(product_id, quantity, low_threshold=5)
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.processes) as pool:
+        futures = [
+            pool.submit(run_process, path, w, args.threads, args.seconds, args.ttl, w + 1)
+            for w in range(args.processes)
+        ]
+        outcomes = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+
+    sold = dict.fromkeys(PRODUCTS, 0)
+    latencies, rejected, carts = [], 0, 0
+    for s, lat, rej, n in outcomes:
+        for product_id, quantity in s.items():
+            sold[product_id] += quantity
+        latencies.extend(lat)
+        rejected += rej
+        carts += n
+
+    time.sleep(args.ttl + 0.1)
+    inventory.expire()
+    levels = Inventory(path, snapshot_ttl=0).levels()
+
+    sessions = args.processes * args.threads
+    latencies.sort()
+    print(f"{sessions} concurrent shoppers · {carts:,} carts · {len(latencies):,} operations in {elapsed:.1f}s "
+          f"({len(latencies) / elapsed:,.0f} ops/s)")
+    print(f"latency p50 {statistics.median(latencies) * 1000:.2f} ms · "
+          f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms · {rejected:,} reservations refused")
+
+    failures = []
+    for product_id, initial in PRODUCTS.items():
+        available, on_hand, _ = levels[product_id]
+        print(f"  {product_id:<6} initial {initial:5}  sold {sold[product_id]:5}  on hand {on_hand:5}  available {available:5}")
+        if on_hand < 0:
+            failures.append(f"{product_id} went negative")
+        if initial - on_hand != sold[product_id]:
+            failures.append(f"{product_id}: sold {sold[product_id]} but stock dropped {initial - on_hand}")
+        if available != on_hand:
+            failures.append(f"{product_id}: {on_hand - available} units still reserved after expiry")
+    if failures:
+        print("FAILED: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK: no overselling, stock and sales agree")
+
+
+if __name__ == "__main__":
+    main()
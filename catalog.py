@@ -0,0 +1,297 @@
+"""Product catalog with hash indexes.
+
+``FILAMENTS`` is the built-in catalog. ``Catalog`` wraps it (or a catalog
+loaded from a CSV/JSON file) once per process and answers id, material,
+color and stock lookups from dict indexes instead of scanning the list.
+"""
+import csv
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+FILAMENTS = [
+    {
+        "id": "pla_white",
+        "name": "PLA Filament - White",
+        "material": "PLA",
+        "price": 25.00,
+        "color": "White",
+        "stock": "In Stock",
+        "rating": 4.8,
+        "image": "white.png"
+    },
+    {
+        "id": "pla_black",
+        "name": "PLA Filament - Black",
+        "material": "PLA",
+        "price": 25.00,
+        "color": "Black",
+        "stock": "In Stock",
+        "rating": 4.9,
+        "image": "black.png"
+    },
+    {
+        "id": "abs_red",
+        "name": "ABS Filament - Red",
+        "material": "ABS",
+        "price": 28.00,
+        "color": "Red",
+        "stock": "In Stock",
+        "rating": 4.7,
+        "image": "red.png"
+    },
+    {
+        "id": "petg_blue",
+        "name": "PETG Filament - Blue",
+        "material": "PETG",
+        "price": 30.00,
+        "color": "Blue",
+        "stock": "In Stock",
+        "rating": 4.6,
+        "image": "blue.png"
+    },
+    {
+        "id": "tpu_clear",
+        "name": "TPU Flexible - Clear",
+        "material": "TPU",
+        "price": 35.00,
+        "color": "Clear",
+        "stock": "Low Stock",
+        "rating": 4.5,
+        "image": "transparent.png"
+    },
+    {
+        "id": "nylon_natural",
+        "name": "Nylon Filament - Natural",
+        "material": "Nylon",
+        "price": 40.00,
+        "color": "Natural",
+        "stock": "In Stock",
+        "rating": 4.8,
+        "image": "tpu.png"
+    }
+]
+
+
+class Product:
+    """A single catalog entry"""
+
+    __slots__ = ("index", "id", "name", "material", "price", "color", "stock", "rating", "image")
+
+    def __init__(self, index, id, name, material, price, color, stock, rating, image):
+        self.index = index
+        self.id = id
+        self.name = name
+        self.material = material
+        self.price = float(price)
+        self.color = color
+        self.stock = stock
+        self.rating = float(rating or 0)  # blank CSV cells mean "not rated"
+        self.image = image
+
+    def to_dict(self):
+        """Return the product as a plain dict (the ``FILAMENTS`` record shape)"""
+        return {field: getattr(self, field) for field in self.__slots__ if field != "index"}
+
+    def __repr__(self):
+        return f"Product({self.id!r}, {self.price:.2f})"
+
+
+# Stock labels that count as purchasable for the "in stock only" filter
+IN_STOCK_LABELS = ("In Stock", "Low Stock")
+
+SORT_OPTIONS = {
+    "featured": None,
+    "price_asc": (lambda p: p.price, False),
+    "price_desc": (lambda p: p.price, True),
+    "rating": (lambda p: p.rating, True),
+}
+
+
+class CartLine:
+    """A resolved cart line: product, quantity and line total"""
+
+    __slots__ = ("product", "quantity", "total")
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+        self.total = product.price * quantity
+
+
+class Catalog:
+    """Immutable product catalog with an id index and secondary indexes"""
+
+    def __init__(self, records):
+        self.products = []
+        self.by_id = {}
+        self.by_material = {}
+        self.by_color = {}
+        self.by_stock = {}
+        # Optional numeric stock from the catalog file, used to seed inventory.py
+        self.stock_levels = {}
+
+        for row, record in enumerate(records, 1):
+            try:
+                self._add(record)
+            except (KeyError, TypeError, ValueError) as e:
+                detail = f"missing column {e}" if isinstance(e, KeyError) else str(e)
+                product_id = record.get("id") if isinstance(record, dict) else None
+                raise ValueError(f"Catalog row {row} ({product_id or 'no id'}): {detail}") from e
+
+        # Dense columns for vectorized pricing (see pricing.py)
+        self.index_of = {product.id: product.index for product in self.products}
+        self.price_cents = np.array([round(product.price * 100) for product in self.products], dtype=np.int64)
+
+        # Per-catalog result cache so paging back and forth never re-filters
+        self._query_cached = lru_cache(maxsize=256)(self._query)
+
+    def _add(self, record):
+        if record["price"] in (None, ""):
+            raise ValueError("price is empty")
+        product = Product(
+            index=len(self.products),
+            id=record["id"],
+            name=record["name"],
+            material=record["material"],
+            price=record["price"],
+            color=record["color"],
+            stock=record["stock"],
+            rating=record.get("rating", 0),
+            image=record.get("image", ""),
+        )
+        if product.id in self.by_id:
+            raise ValueError(f"Duplicate product id in catalog: {product.id}")
+        self.products.append(product)
+        self.by_id[product.id] = product
+        self.by_material.setdefault(product.material, []).append(product)
+        self.by_color.setdefault(product.color, []).append(product)
+        self.by_stock.setdefault(product.stock, []).append(product)
+        if record.get("quantity") not in (None, ""):
+            threshold = record.get("low_stock_threshold")
+            self.stock_levels[product.id] = (
+                int(record["quantity"]),
+                int(threshold) if threshold not in (None, "") else None,
+            )
+
+    def __len__(self):
+        return len(self.products)
+
+    def __iter__(self):
+        return iter(self.products)
+
+    def __contains__(self, product_id):
+        return product_id in self.by_id
+
+    def get(self, product_id):
+        """Return the product with the given id, or ``None``"""
+        return self.by_id.get(product_id)
+
+    def __getitem__(self, product_id):
+        return self.by_id[product_id]
+
+    @property
+    def materials(self):
+        return list(self.by_material)
+
+    @property
+    def colors(self):
+        return list(self.by_color)
+
+    @property
+    def price_range(self):
+        prices = [p.price for p in self.products]
+        return (min(prices), max(prices)) if prices else (0.0, 0.0)
+
+    def query(self, materials=(), colors=(), min_price=None, max_price=None, in_stock_only=False, sort="featured"):
+        """Return the products matching the filters, in the requested order
+
+        Results are cached per distinct query, so the same filter combination
+        is only evaluated once per process.
+        """
+        if sort not in SORT_OPTIONS:
+            raise ValueError(f"Unknown sort option: {sort}")
+        key = (
+            tuple(sorted(materials)),
+            tuple(sorted(colors)),
+            min_price,
+            max_price,
+            bool(in_stock_only),
+            sort,
+        )
+        return self._query_cached(*key)
+
+    def _query(self, materials, colors, min_price, max_price, in_stock_only, sort):
+        # Intersect the applicable secondary indexes, then range-filter on price
+        candidates = []
+        if materials:
+            candidates.append({p.index for m in materials for p in self.by_material.get(m, ())})
+        if colors:
+            candidates.append({p.index for c in colors for p in self.by_color.get(c, ())})
+        if in_stock_only:
+            candidates.append({p.index for s in IN_STOCK_LABELS for p in self.by_stock.get(s, ())})
+
+        if candidates:
+            indexes = set.intersection(*candidates)
+            products = [self.products[i] for i in sorted(indexes)]
+        else:
+            products = self.products
+
+        if min_price is not None:
+            products = [p for p in products if p.price >= min_price]
+        if max_price is not None:
+            products = [p for p in products if p.price <= max_price]
+
+        order = SORT_OPTIONS[sort]
+        if order is not None:
+            products = sorted(products, key=order[0], reverse=order[1])
+        return tuple(products)
+
+    def resolve_cart(self, cart):
+        """Turn a ``{product_id: qty}`` cart into ``CartLine`` objects
+
+        Ids that are no longer in the catalog are skipped.
+        """
+        lines = []
+        for product_id, qty in cart.items():
+            product = self.by_id.get(product_id)
+            if product is not None and qty > 0:
+                lines.append(CartLine(product, qty))
+        return lines
+
+    @classmethod
+    def from_file(cls, path):
+        """Load a catalog from a ``.json`` or ``.csv`` file"""
+        return cls(load_records(path))
+
+
+def paginate(products, page, page_size):
+    """Slice one page out of a query result; returns ``(items, page, page_count)``"""
+    page_count = max(1, -(-len(products) // page_size))
+    page = min(max(page, 1), page_count)
+    start = (page - 1) * page_size
+    return products[start:start + page_size], page, page_count
+
+
+def load_records(path):
+    """Read raw product records from a JSON list or a CSV file with a header row"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        # Accept either a bare list or {"products": [...]}
+        return data["products"] if isinstance(data, dict) else data
+    if ext == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+    raise ValueError(f"Unsupported catalog format: {path}")
+
+
+def load_catalog(path=None):
+    """Build the process catalog from ``path`` (or ``$HUB_CATALOG_PATH``), else ``FILAMENTS``"""
+    path = path or os.environ.get("HUB_CATALOG_PATH")
+    if path:
+        return Catalog.from_file(path)
+    return Catalog(FILAMENTS)
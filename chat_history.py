@@ -0,0 +1,157 @@
+"""Token budgeting for the assistant's chat history.
+
+The conversation shown on screen (capped, see ``trim``) is kept for
+display, but only what fits the prompt budget is sent to the model: the most
+recent turns verbatim, and everything older folded into a rolling summary
+that is carried forward between requests.
+"""
+import re
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character-based estimate
+    tiktoken = None
+
+PROMPT_BUDGET = 4000       # tokens for system prompt + summary + recent turns
+SUMMARY_BUDGET = 400       # tokens the rolling summary may grow to
+MIN_RECENT_MESSAGES = 4    # never fold the last two exchanges
+MESSAGE_OVERHEAD = 4       # per-message framing tokens in the chat format
+
+_encoding = None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken when available, else estimate ~4 chars per token"""
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.encoding_for_model("gpt-4o-mini")
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    return max(1, (len(text) + 3) // 4) if text else 0
+
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def _first_sentence(text, limit=160):
+    text = re.sub(r"\s+", " ", text).strip()
+    match = re.match(r"(.+?[.!?])(\s|$)", text)
+    sentence = match.group(1) if match else text
+    return sentence if len(sentence) <= limit else sentence[:limit - 1].rstrip() + "…"
+
+
+def extractive_summarizer(previous, messages):
+    """Fold messages into the summary as one short line per turn, without a model call"""
+    lines = previous.splitlines() if previous else []
+    for message in messages:
+        who = "User asked" if message["role"] == "user" else "Assistant answered"
+        lines.append(f"- {who}: {_first_sentence(message['content'])}")
+    return "\n".join(lines)
+
+
+def model_summarizer(client, complete):
+    """Return a summarizer that asks the model to condense the folded turns"""
+    def summarize(previous, messages):
+        transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+        prompt = (
+            "Update this running summary of a 3D printing support chat. Keep materials, "
+            "printer details, settings and open questions; drop pleasantries. Reply with "
+            f"the summary only, at most {SUMMARY_BUDGET // 2} words.\n\n"
+            f"Current summary:\n{previous or '(none)'}\n\nNew turns:\n{transcript}"
+        )
+        return complete(client, [{"role": "user", "content": prompt}], temperature=0.2, max_tokens=SUMMARY_BUDGET)
+    return summarize
+
+
+def _trim_summary(summary, budget):
+    """Drop the oldest summary lines until the summary fits its budget"""
+    lines = summary.splitlines()
+    while len(lines) > 1 and count_tokens("\n".join(lines)) > budget:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class HistoryManager:
+    """Build token-bounded prompts from a growing conversation
+
+    ``state`` is a dict holding the rolling summary and how many messages it
+    already covers; keep it in session state so it survives reruns.
+    """
+
+    def __init__(self, state, budget=PROMPT_BUDGET, summary_budget=SUMMARY_BUDGET,
+                 min_recent=MIN_RECENT_MESSAGES, summarizer=extractive_summarizer):
+        state.setdefault("summary", "")
+        state.setdefault("folded", 0)
+        self.state = state
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.min_recent = min_recent
+        self.summarizer = summarizer
+
+    def _summary_message(self):
+        return {"role": "system", "content": f"Summary of the earlier conversation:\n{self.state['summary']}"}
+
+    def build(self, system_prompt, messages):
+        """Return ``(api_messages, prompt_tokens)`` for the next request
+
+        Older turns are folded into the summary, oldest first, until the
+        prompt fits the budget or only ``min_recent`` messages remain. The
+        summary itself is capped separately at ``summary_budget`` tokens.
+        """
+        if self.state["folded"] > len(messages):
+            # History was cleared or truncated underneath us
+            self.state["summary"] = ""
+            self.state["folded"] = 0
+
+        system_tokens = count_tokens(system_prompt) + MESSAGE_OVERHEAD
+        recent = messages[self.state["folded"]:]
+        recent_tokens = [message_tokens(m) for m in recent]
+
+        def total():
+            summary_tokens = message_tokens(self._summary_message()) if self.state["summary"] else 0
+            return system_tokens + summary_tokens + sum(recent_tokens)
+
+        fold = 0
+        while total() - sum(recent_tokens[:fold]) > self.budget and len(recent) - fold > self.min_recent:
+            fold += 1
+        # Fold whole exchanges so the kept history never starts with an orphan reply
+        if 0 < fold < len(recent) and recent[fold]["role"] == "assistant":
+            fold -= 1
+        if fold:
+            summary = self.summarizer(self.state["summary"], recent[:fold])
+            self.state["summary"] = _trim_summary(summary, self.summary_budget)
+            self.state["folded"] += fold
+            recent = recent[fold:]
+            recent_tokens = recent_tokens[fold:]
+
+        api_messages = [{"role": "system", "content": system_prompt}]
+        if self.state["summary"]:
+            api_messages.append(self._summary_message())
+        api_messages.extend({"role": m["role"], "content": m["content"]} for m in recent)
+        return api_messages, sum(message_tokens(m) for m in api_messages)
+
+    def trim(self, messages, max_messages):
+        """Drop the oldest messages in place so at most ``max_messages`` remain
+
+        Dropped turns that are not in the summary yet are folded in first, so
+        the model keeps their gist. Returns how many messages were dropped.
+        """
+        if self.state["folded"] > len(messages):
+            self.state["summary"] = ""
+            self.state["folded"] = 0
+        drop = len(messages) - max_messages
+        if drop <= 0:
+            return 0
+        if drop < len(messages) and messages[drop]["role"] == "assistant":
+            drop += 1
+        if drop > self.state["folded"]:
+            summary = self.summarizer(self.state["summary"], messages[self.state["folded"]:drop])
+            self.state["summary"] = _trim_summary(summary, self.summary_budget)
+            self.state["folded"] = drop
+        self.state["folded"] -= drop
+        del messages[:drop]
+        return drop
@@ -0,0 +1,69 @@
+"""Order placement shared by the Streamlit checkout and the HTTP API.
+
+``place_order`` prices a cart against one store data snapshot, redeems its
+limited-use promotions, turns the holder's stock reservations into a
+deduction and queues the order and its invoice render. Either of the two
+contended steps can fail when another checkout gets there first; both
+raise without leaving anything changed.
+"""
+from datetime import datetime
+
+from inventory import OutOfStock
+
+CONTACT_FIELDS = ("customer_name", "customer_email", "customer_phone", "customer_address")
+
+
+def build_invoice(invoice_number, cart_lines, breakdown, customer, now, order_type="Filament Order"):
+    """Assemble the invoice dict that is stored with the order and rendered"""
+    amounts = breakdown.as_dollars()
+    return {
+        'invoice_number': invoice_number,
+        'date': now.strftime('%B %d, %Y'),
+        'created_at': now.isoformat(timespec='seconds'),
+        'customer_name': customer['customer_name'],
+        'customer_email': customer['customer_email'],
+        'customer_phone': customer['customer_phone'],
+        'customer_address': customer['customer_address'].replace('\n', '<br>'),
+        'order_type': order_type,
+        'items': [
+            {
+                'description': line.product.name,
+                'quantity': line.quantity,
+                'unit_price': line.product.price,
+                'total': line_total / 100,
+            }
+            for line, line_total in zip(cart_lines, breakdown.line_totals)
+        ],
+        'subtotal': amounts['subtotal'],
+        'shipping': amounts['shipping'],
+        'tax': amounts['tax'],
+        'discount': amounts['discount'],
+        'discount_code': ', '.join(applied.rule.label for applied in breakdown.promotions),
+        'total': amounts['total'],
+    }
+
+
+def place_order(snapshot, inventory, order_store, holder, cart, code, customer, renderer=None, analytics=None, now=None):
+    """Check out a ``{product_id: qty}`` cart and return its invoice dict
+
+    Raises ``promotions.PromotionExhausted`` or ``inventory.OutOfStock``; in
+    both cases no usage is counted and no stock is taken.
+    """
+    cart_lines = snapshot.catalog.resolve_cart(cart)
+    breakdown = snapshot.pricing.price_cart(cart_lines, code)
+    snapshot.promotions.redeem(breakdown.promotions)
+    try:
+        inventory.commit(holder, cart)
+    except OutOfStock:
+        snapshot.promotions.refund(breakdown.promotions)
+        raise
+
+    now = now or datetime.now()
+    invoice_data = build_invoice(order_store.next_invoice_number(now), cart_lines, breakdown, customer, now)
+    # Persisted by the store's background writer; checkout doesn't wait on disk
+    order_store.submit(invoice_data)
+    if renderer is not None:
+        renderer.submit(invoice_data)
+    if analytics is not None:
+        analytics.record(invoice_data, cart_lines, breakdown)
+    return invoice_data
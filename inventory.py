@@ -0,0 +1,241 @@
+"""Inventory levels and cart reservations.
+
+Stock is kept as numeric on-hand quantities in SQLite next to the order
+store. A cart holds *reservations* against that stock; ``reserve`` only
+succeeds while enough unreserved units remain, ``commit`` turns a holder's
+reservations into a permanent deduction at checkout and ``release`` hands
+them back. Every write runs in one ``BEGIN IMMEDIATE`` transaction, so
+concurrent sessions (threads or processes) can never sell the same spool
+twice. Reservations expire after ``RESERVATION_TTL`` seconds so abandoned
+carts return their stock automatically.
+
+The store's "In Stock" / "Low Stock" / "Out of Stock" labels are derived
+from the available quantity and each product's low-stock threshold.
+"""
+import os
+import threading
+import time
+
+from orders import DATA_DIR, connect
+
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "inventory.db")
+
+RESERVATION_TTL = 30 * 60   # seconds an untouched cart keeps its stock
+LOW_STOCK_THRESHOLD = 10    # available units at or below which a product is "Low Stock"
+SNAPSHOT_TTL = 1.0          # seconds the display snapshot of stock levels is reused
+
+IN_STOCK, LOW_STOCK, OUT_OF_STOCK = "In Stock", "Low Stock", "Out of Stock"
+
+# Starting quantities for catalogs that only carry a stock label
+SEED_QUANTITIES = {IN_STOCK: 50, LOW_STOCK: 5, OUT_OF_STOCK: 0}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock (
+    product_id TEXT PRIMARY KEY,
+    on_hand INTEGER NOT NULL CHECK (on_hand >= 0),
+    low_threshold INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reservations (
+    holder TEXT NOT NULL,
+    product_id TEXT NOT NULL,
+    quantity INTEGER NOT NULL CHECK (quantity > 0),
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (holder, product_id)
+);
+CREATE INDEX IF NOT EXISTS idx_reservations_product ON reservations (product_id, expires_at);
+CREATE INDEX IF NOT EXISTS idx_reservations_expiry ON reservations (expires_at);
+"""
+
+
+class OutOfStock(Exception):
+    """Raised by ``commit`` when a cart can no longer be fulfilled"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages  # {product_id: units available}
+        super().__init__(", ".join(f"{pid}: {n} available" for pid, n in shortages.items()))
+
+
+def stock_label(available, threshold):
+    if available <= 0:
+        return OUT_OF_STOCK
+    return LOW_STOCK if available <= threshold else IN_STOCK
+
+
+class Inventory:
+    """SQLite-backed stock levels with atomic, expiring reservations"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, reservation_ttl=RESERVATION_TTL, snapshot_ttl=SNAPSHOT_TTL):
+        self.path = path
+        self.reservation_ttl = reservation_ttl
+        self.snapshot_ttl = snapshot_ttl
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = connect(path)
+        with conn:
+            conn.executescript(SCHEMA)
+        conn.close()
+
+        self._local = threading.local()
+        self._snapshot_lock = threading.Lock()
+        self._snapshot = {}
+        self._snapshot_at = 0.0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            conn.isolation_level = None  # explicit transactions only
+        return conn
+
+    def _write(self, fn, *args):
+        """Run ``fn(conn, now, *args)`` in one immediate (write-locked) transaction"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            conn.execute("DELETE FROM reservations WHERE expires_at <= ?", (now,))
+            result = fn(conn, now, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self._snapshot_at = 0.0  # this process changed stock; refresh on next read
+        return result
+
+    # -- stock levels ------------------------------------------------------
+
+    def sync(self, catalog):
+        """Add catalog products that have no stock row yet
+
+        A record's ``quantity`` / ``low_stock_threshold`` fields win; otherwise
+        the quantity is seeded from its stock label.
+        """
+        rows = []
+        for product in catalog:
+            quantity, threshold = catalog.stock_levels.get(product.id, (None, None))
+            if quantity is None:
+                quantity = SEED_QUANTITIES.get(product.stock, 0)
+            rows.append((product.id, quantity, LOW_STOCK_THRESHOLD if threshold is None else threshold))
+        self._write(lambda conn, now: conn.executemany(
+            "INSERT OR IGNORE INTO stock (product_id, on_hand, low_threshold) VALUES (?, ?, ?)", rows
+        ))
+        return self
+
+    def set_stock(self, product_id, on_hand, low_threshold=None):
+        """Set a product's on-hand quantity (restock or stock count)"""
+        def apply(conn, now):
+            conn.execute(
+                "INSERT INTO stock (product_id, on_hand, low_threshold) VALUES (?, ?, ?) "
+                "ON CONFLICT (product_id) DO UPDATE SET on_hand = excluded.on_hand, "
+                "low_threshold = COALESCE(?, low_threshold)",
+                (product_id, on_hand, LOW_STOCK_THRESHOLD if low_threshold is None else low_threshold, low_threshold),
+            )
+        self._write(apply)
+
+    def levels(self):
+        """``{product_id: (available, on_hand, low_threshold)}``, at most ``snapshot_ttl`` old
+
+        This is the display path: one aggregate query shared by every
+        session, instead of one query per product card.
+        """
+        now = time.time()
+        if now - self._snapshot_at < self.snapshot_ttl:
+            return self._snapshot
+        with self._snapshot_lock:
+            if now - self._snapshot_at >= self.snapshot_ttl:
+                rows = self._conn().execute(
+                    "SELECT s.product_id, s.on_hand, s.low_threshold, COALESCE(SUM(r.quantity), 0) AS reserved "
+                    "FROM stock s LEFT JOIN reservations r ON r.product_id = s.product_id AND r.expires_at > ? "
+                    "GROUP BY s.product_id",
+                    (now,),
+                ).fetchall()
+                self._snapshot = {
+                    row["product_id"]: (row["on_hand"] - row["reserved"], row["on_hand"], row["low_threshold"])
+                    for row in rows
+                }
+                self._snapshot_at = now
+        return self._snapshot
+
+    def available(self, product_id):
+        return self.levels().get(product_id, (0, 0, 0))[0]
+
+    def label(self, product_id, default=OUT_OF_STOCK):
+        level = self.levels().get(product_id)
+        return default if level is None else stock_label(level[0], level[2])
+
+    def in_stock(self, products):
+        """Filter products to those with unreserved units left"""
+        levels = self.levels()
+        return [p for p in products if levels.get(p.id, (0,))[0] > 0]
+
+    # -- reservations ------------------------------------------------------
+
+    @staticmethod
+    def _free_units(conn, now, product_id, holder):
+        """Units of a product not reserved by anyone else"""
+        row = conn.execute(
+            "SELECT s.on_hand - COALESCE((SELECT SUM(quantity) FROM reservations "
+            "WHERE product_id = s.product_id AND holder != ? AND expires_at > ?), 0) "
+            "FROM stock s WHERE s.product_id = ?",
+            (holder, now, product_id),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def reserve(self, holder, product_id, quantity):
+        """Set ``holder``'s reservation for a product to ``quantity`` units
+
+        Returns ``(ok, available)``: ``ok`` is False (and nothing changes) if
+        fewer than ``quantity`` units are free. A successful call also
+        extends the expiry of the holder's other reservations.
+        """
+        def apply(conn, now):
+            free = self._free_units(conn, now, product_id, holder)
+            if quantity > free:
+                return False, free
+            expires_at = now + self.reservation_ttl
+            if quantity > 0:
+                conn.execute(
+                    "INSERT INTO reservations (holder, product_id, quantity, expires_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (holder, product_id) DO UPDATE SET quantity = excluded.quantity, "
+                    "expires_at = excluded.expires_at",
+                    (holder, product_id, quantity, expires_at),
+                )
+            else:
+                conn.execute("DELETE FROM reservations WHERE holder = ? AND product_id = ?", (holder, product_id))
+            conn.execute("UPDATE reservations SET expires_at = ? WHERE holder = ?", (expires_at, holder))
+            return True, free
+        return self._write(apply)
+
+    def release(self, holder, product_id=None):
+        """Drop a holder's reservation for one product, or all of them"""
+        def apply(conn, now):
+            if product_id is None:
+                conn.execute("DELETE FROM reservations WHERE holder = ?", (holder,))
+            else:
+                conn.execute("DELETE FROM reservations WHERE holder = ? AND product_id = ?", (holder, product_id))
+        self._write(apply)
+
+    def commit(self, holder, cart):
+        """Deduct a ``{product_id: qty}`` cart from stock and clear the holder's reservations
+
+        Quantities still covered by the holder's reservations always succeed;
+        lines whose reservation expired are re-checked against free stock.
+        Raises ``OutOfStock`` (and changes nothing) if any line can't be met.
+        """
+        def apply(conn, now):
+            shortages = {}
+            for product_id, quantity in cart.items():
+                free = self._free_units(conn, now, product_id, holder)
+                if quantity > free:
+                    shortages[product_id] = max(free, 0)
+            if shortages:
+                raise OutOfStock(shortages)
+            conn.executemany(
+                "UPDATE stock SET on_hand = on_hand - ? WHERE product_id = ?",
+                [(quantity, product_id) for product_id, quantity in cart.items() if quantity > 0],
+            )
+            conn.execute("DELETE FROM reservations WHERE holder = ?", (holder,))
+        self._write(apply)
+
+    def expire(self):
+        """Purge expired reservations now (writes also do this as they go)"""
+        self._write(lambda conn, now: None)
@@ -0,0 +1,414 @@
+"""Server-side invoice rendering (HTML and PDF).
+
+``render_html`` and ``render_pdf`` build a complete, archivable invoice
+document from ``invoice_data`` in one pass. ``InvoiceRenderer`` runs renders
+in a worker pool so checkout returns immediately, and caches the output
+under ``data/invoices/<invoice number>.<ext>`` so re-opening an invoice is a
+file read. Stored orders can be re-rendered in bulk, in parallel:
+
+    python invoices.py --from 2025-01-01 --to 2025-01-31 --format pdf html
+"""
+import argparse
+import html
+import os
+import threading
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from orders import DATA_DIR, DEFAULT_DB_PATH, OrderStore
+
+INVOICE_DIR = os.path.join(DATA_DIR, "invoices")
+FORMATS = ("html", "pdf")
+MAX_WORKERS = 2
+
+COMPANY = "3D PRINTING HUB"
+TAGLINE = "Professional 3D Printing Services & Premium Filaments"
+CONTACT = "3D Printing Hub | contact@3dprintinghub.sg | +65 9876 5432"
+BANK = "DBS Singapore"
+ACCOUNT = "123-456789-0"
+
+
+def _address_lines(invoice_data):
+    """The checkout stores the address with ``<br>`` line breaks"""
+    return [line for line in invoice_data["customer_address"].split("<br>") if line.strip()]
+
+
+# -- HTML -------------------------------------------------------------------
+
+HTML_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>Invoice {invoice_number}</title>
+<style>
+body {{ font-family: -apple-system, "Segoe UI", Helvetica, Arial, sans-serif; color: #111827; margin: 2rem auto; max-width: 800px; }}
+.header {{ text-align: center; padding: 1.5rem; background: #4f46e5; color: white; border-radius: 12px; -webkit-print-color-adjust: exact; print-color-adjust: exact; }}
+.header h1 {{ margin: 0; }}
+.columns {{ display: flex; gap: 2rem; margin: 1.5rem 0; }}
+.columns > div {{ flex: 1; background: #f8fafc; border-left: 4px solid #4f46e5; padding: 0.75rem 1rem; border-radius: 8px; }}
+h3 {{ color: #4f46e5; border-bottom: 2px solid #4f46e5; padding-bottom: 0.25rem; }}
+table {{ width: 100%; border-collapse: collapse; }}
+th {{ background: #f8fafc; text-align: left; padding: 0.6rem; border-bottom: 2px solid #e5e7eb; }}
+td {{ padding: 0.6rem; border-bottom: 1px solid #f3f4f6; }}
+.num {{ text-align: right; }}
+.totals {{ width: 50%; margin-left: auto; margin-top: 1rem; }}
+.totals td {{ border: none; padding: 0.3rem 0.6rem; }}
+.grand td {{ font-size: 1.3rem; font-weight: 700; border-top: 2px solid #4f46e5; }}
+.discount td {{ color: #10b981; }}
+.payment {{ margin-top: 2rem; background: #f0f9ff; border: 2px solid #0ea5e9; border-radius: 12px; padding: 1rem 1.5rem; }}
+</style>
+</head>
+<body>
+<div class="header">
+<h1>{company}</h1>
+<p>{tagline}</p>
+<p><strong>Invoice #{invoice_number} | {date}</strong></p>
+</div>
+<div class="columns">
+<div>
+<h3>Bill To</h3>
+<p><strong>Name:</strong> {customer_name}<br><strong>Email:</strong> {customer_email}<br><strong>Phone:</strong> {customer_phone}<br><strong>Address:</strong> {customer_address}</p>
+</div>
+<div>
+<h3>Order Details</h3>
+<p><strong>Type:</strong> {order_type}<br><strong>Date:</strong> {date}<br><strong>Terms:</strong> Due on Receipt<br><strong>Status:</strong> Pending Payment</p>
+</div>
+</div>
+<h3>Items</h3>
+<table>
+<thead><tr><th>Description</th><th class="num">Quantity</th><th class="num">Unit Price</th><th class="num">Total</th></tr></thead>
+<tbody>
+{item_rows}
+</tbody>
+</table>
+<table class="totals">
+{total_rows}
+<tr class="grand"><td>TOTAL</td><td class="num">${total:.2f} SGD</td></tr>
+</table>
+<div class="payment">
+<h4>Payment Information</h4>
+<p><strong>Thank you for your business!</strong></p>
+<p>Payment Instructions: Please transfer to <strong>{bank}</strong><br>Account Number: <strong>{account}</strong><br>Reference: <strong>Invoice #{invoice_number}</strong></p>
+<p>{contact}</p>
+</div>
+</body>
+</html>
+"""
+
+ITEM_ROW = '<tr><td>{description}</td><td class="num">{quantity}</td><td class="num">${unit_price:.2f}</td><td class="num">${total:.2f}</td></tr>'
+TOTAL_ROW = '<tr{css}><td>{label}</td><td class="num">{amount}</td></tr>'
+
+
+def _total_rows(invoice_data):
+    """``(label, amount text, is_discount)`` for the summary block"""
+    rows = [("Subtotal", f"${invoice_data['subtotal']:.2f}", False)]
+    if invoice_data.get("shipping", 0) > 0:
+        rows.append(("Shipping", f"${invoice_data['shipping']:.2f}", False))
+    if invoice_data.get("tax", 0) > 0:
+        rows.append(("Tax (9%)", f"${invoice_data['tax']:.2f}", False))
+    if invoice_data.get("discount", 0) > 0:
+        rows.append((f"Discount ({invoice_data['discount_code']})", f"-${invoice_data['discount']:.2f}", True))
+    return rows
+
+
+def render_html(invoice_data):
+    """Render a standalone, printable HTML invoice"""
+    esc = html.escape
+    item_rows = "\n".join(
+        ITEM_ROW.format(
+            description=esc(str(item["description"])),
+            quantity=item["quantity"],
+            unit_price=item["unit_price"],
+            total=item["total"],
+        )
+        for item in invoice_data["items"]
+    )
+    total_rows = "\n".join(
+        TOTAL_ROW.format(css=' class="discount"' if is_discount else "", label=esc(label), amount=amount)
+        for label, amount, is_discount in _total_rows(invoice_data)
+    )
+    return HTML_TEMPLATE.format(
+        company=COMPANY,
+        tagline=esc(TAGLINE),
+        invoice_number=esc(invoice_data["invoice_number"]),
+        date=esc(invoice_data["date"]),
+        customer_name=esc(invoice_data["customer_name"]),
+        customer_email=esc(invoice_data["customer_email"]),
+        customer_phone=esc(invoice_data["customer_phone"]),
+        customer_address=", ".join(esc(line) for line in _address_lines(invoice_data)),
+        order_type=esc(invoice_data["order_type"]),
+        item_rows=item_rows,
+        total_rows=total_rows,
+        total=invoice_data["total"],
+        bank=BANK,
+        account=ACCOUNT,
+        contact=esc(CONTACT),
+    ).encode("utf-8")
+
+
+# -- PDF --------------------------------------------------------------------
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 50
+
+
+def _pdf_text(text):
+    """Escape a string for a PDF literal, limited to the WinAnsi character set"""
+    text = str(text).encode("cp1252", "replace").decode("cp1252")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+class _PdfPage:
+    """Accumulates drawing operators for one page"""
+
+    def __init__(self):
+        self.ops = []
+
+    def text(self, x, y, value, size=10, bold=False, right=False, color=None):
+        font = "F2" if bold else "F1"
+        if right:
+            # Helvetica averages ~0.5em per glyph; good enough to right-align numbers
+            x -= len(str(value)) * size * 0.52
+        if color:
+            self.ops.append("%.3f %.3f %.3f rg" % color)
+        self.ops.append(f"BT /{font} {size} Tf {x:.1f} {y:.1f} Td ({_pdf_text(value)}) Tj ET")
+        if color:
+            self.ops.append("0 0 0 rg")
+
+    def rect(self, x, y, w, h, color):
+        self.ops.append("%.3f %.3f %.3f rg %.1f %.1f %.1f %.1f re f 0 0 0 rg" % (*color, x, y, w, h))
+
+    def line(self, x1, y1, x2, y2):
+        self.ops.append(f"0.85 0.87 0.9 RG {x1:.1f} {y1:.1f} m {x2:.1f} {y2:.1f} l S 0 0 0 RG")
+
+
+def _pdf_document(pages):
+    """Serialize pages into a PDF file with the standard Helvetica fonts"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for page in pages:
+        stream = zlib.compress("\n".join(page.ops).encode("cp1252"))
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Contents %d 0 R "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> >>" % (PAGE_WIDTH, PAGE_HEIGHT, content_id)
+        )
+        kids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % k for k in kids), len(kids)
+    )
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def render_pdf(invoice_data):
+    """Render the invoice as a self-contained PDF (no external dependencies)"""
+    indigo = (0.31, 0.27, 0.9)
+    pages = [_PdfPage()]
+    page = pages[0]
+    right = PAGE_WIDTH - MARGIN
+
+    # Header band
+    page.rect(MARGIN, PAGE_HEIGHT - 130, PAGE_WIDTH - 2 * MARGIN, 90, indigo)
+    page.text(MARGIN + 20, PAGE_HEIGHT - 75, COMPANY, size=20, bold=True, color=(1, 1, 1))
+    page.text(MARGIN + 20, PAGE_HEIGHT - 95, TAGLINE, size=10, color=(1, 1, 1))
+    page.text(MARGIN + 20, PAGE_HEIGHT - 115, f"Invoice #{invoice_data['invoice_number']} | {invoice_data['date']}", size=11, bold=True, color=(1, 1, 1))
+
+    # Bill to / order details
+    y = PAGE_HEIGHT - 165
+    page.text(MARGIN, y, "Bill To", size=12, bold=True, color=indigo)
+    page.text(PAGE_WIDTH / 2, y, "Order Details", size=12, bold=True, color=indigo)
+    left = [
+        invoice_data["customer_name"],
+        invoice_data["customer_email"],
+        invoice_data["customer_phone"],
+        *_address_lines(invoice_data),
+    ]
+    details = [
+        f"Type: {invoice_data['order_type']}",
+        f"Date: {invoice_data['date']}",
+        "Terms: Due on Receipt",
+        "Status: Pending Payment",
+    ]
+    for i in range(max(len(left), len(details))):
+        y -= 15
+        if i < len(left):
+            page.text(MARGIN, y, left[i])
+        if i < len(details):
+            page.text(PAGE_WIDTH / 2, y, details[i])
+
+    # Items table
+    columns = (MARGIN, right - 190, right - 95, right)
+
+    def table_header(page, y):
+        page.rect(MARGIN, y - 6, PAGE_WIDTH - 2 * MARGIN, 20, (0.97, 0.98, 0.99))
+        page.text(columns[0] + 4, y, "Description", bold=True)
+        page.text(columns[1], y, "Quantity", bold=True, right=True)
+        page.text(columns[2], y, "Unit Price", bold=True, right=True)
+        page.text(columns[3] - 4, y, "Total", bold=True, right=True)
+        return y - 22
+
+    y = table_header(page, y - 40)
+    for item in invoice_data["items"]:
+        if y < MARGIN + 180:
+            page = _PdfPage()
+            pages.append(page)
+            y = table_header(page, PAGE_HEIGHT - MARGIN)
+        page.text(columns[0] + 4, y, str(item["description"])[:60])
+        page.text(columns[1], y, str(item["quantity"]), right=True)
+        page.text(columns[2], y, f"${item['unit_price']:.2f}", right=True)
+        page.text(columns[3] - 4, y, f"${item['total']:.2f}", right=True)
+        page.line(MARGIN, y - 6, right, y - 6)
+        y -= 20
+
+    # Totals
+    y -= 10
+    for label, amount, is_discount in _total_rows(invoice_data):
+        color = (0.06, 0.73, 0.51) if is_discount else None
+        page.text(right - 230, y, label, color=color)
+        page.text(right - 4, y, amount, right=True, color=color)
+        y -= 16
+    page.rect(right - 240, y - 14, 240, 26, indigo)
+    page.text(right - 230, y - 5, "TOTAL", size=12, bold=True, color=(1, 1, 1))
+    page.text(right - 8, y - 5, f"${invoice_data['total']:.2f} SGD", size=12, bold=True, right=True, color=(1, 1, 1))
+
+    # Payment information
+    y -= 50
+    page.text(MARGIN, y, "Payment Information", size=12, bold=True, color=(0.01, 0.41, 0.63))
+    for line in (
+        "Thank you for your business!",
+        f"Payment Instructions: Please transfer to {BANK}",
+        f"Account Number: {ACCOUNT}",
+        f"Reference: Invoice #{invoice_data['invoice_number']}",
+        CONTACT,
+    ):
+        y -= 15
+        page.text(MARGIN, y, line, size=9 if line == CONTACT else 10)
+
+    return _pdf_document(pages)
+
+
+RENDERERS = {"html": render_html, "pdf": render_pdf}
+
+
+def _safe_name(invoice_number):
+    return "".join(c for c in invoice_number if c.isalnum() or c in "-_")
+
+
+def write_invoice(invoice_data, fmt, out_dir=INVOICE_DIR):
+    """Render one format to the cache directory (atomically); returns the path"""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, f"{_safe_name(invoice_data['invoice_number'])}.{fmt}")
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(RENDERERS[fmt](invoice_data))
+    os.replace(tmp, path)
+    return path
+
+
+def _render_all(invoice_data, formats, out_dir):
+    return [write_invoice(invoice_data, fmt, out_dir) for fmt in formats]
+
+
+class InvoiceRenderer:
+    """Background invoice rendering with an on-disk cache keyed by invoice number"""
+
+    def __init__(self, out_dir=INVOICE_DIR, max_workers=MAX_WORKERS, formats=FORMATS):
+        self.out_dir = out_dir
+        self.formats = formats
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="invoice-render")
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def path_for(self, invoice_number, fmt):
+        return os.path.join(self.out_dir, f"{_safe_name(invoice_number)}.{fmt}")
+
+    def submit(self, invoice_data):
+        """Queue all formats for rendering; returns a Future"""
+        invoice_number = invoice_data["invoice_number"]
+        with self._lock:
+            future = self._inflight.get(invoice_number)
+            if future is not None:
+                return future
+            future = self._inflight[invoice_number] = self._pool.submit(
+                _render_all, invoice_data, self.formats, self.out_dir
+            )
+        # Outside the lock: a render that already finished runs the callback right here
+        future.add_done_callback(lambda done: self._forget(invoice_number, done))
+        return future
+
+    def _forget(self, invoice_number, future):
+        with self._lock:
+            if self._inflight.get(invoice_number) is future:
+                del self._inflight[invoice_number]
+
+    def get(self, invoice_data, fmt, wait=5.0):
+        """Return the rendered document bytes, reading the cached file when present
+
+        Waits up to ``wait`` seconds for an in-flight render, then renders
+        inline as a last resort.
+        """
+        path = self.path_for(invoice_data["invoice_number"], fmt)
+        with self._lock:
+            future = self._inflight.get(invoice_data["invoice_number"])
+        if future is not None:
+            try:
+                future.result(timeout=wait)
+            except Exception:
+                pass
+        if not os.path.exists(path):
+            write_invoice(invoice_data, fmt, self.out_dir)
+        with open(path, "rb") as f:
+            return f.read()
+
+
+def render_range(start, end, formats=FORMATS, db_path=DEFAULT_DB_PATH, out_dir=INVOICE_DIR, workers=None):
+    """Re-render every stored order placed between two dates, in parallel processes
+
+    Returns the number of invoices rendered.
+    """
+    store = OrderStore(db_path)
+    try:
+        orders = store.by_date_range(start, end)
+    finally:
+        store.close()
+    if not orders:
+        return 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunk = max(1, len(orders) // ((workers or os.cpu_count() or 1) * 4))
+        list(pool.map(_render_all, orders, [formats] * len(orders), [out_dir] * len(orders), chunksize=chunk))
+    return len(orders)
+
+
+def main():
+    """Command-line entry point: bulk re-render stored invoices"""
+    parser = argparse.ArgumentParser(description="Re-render stored invoices for a date range")
+    parser.add_argument("--from", dest="start", required=True, help="First order date (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="end", required=True, help="Last order date (YYYY-MM-DD)")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--out", default=INVOICE_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    count = render_range(args.start, args.end, tuple(args.format), args.db, args.out, args.workers)
+    print(f"Rendered {count} invoices to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""Material knowledge base for the AI assistant.
+
+The material guidance that used to be pasted into every request as one big
+system prompt lives here as structured documents. A BM25 index over them
+picks the few chunks relevant to each question, and simple spec lookups
+("nozzle temp for PETG?") are answered straight from the data without a
+model call.
+
+Extra datasheets can be dropped into ``knowledge/`` (or ``$HUB_KNOWLEDGE_DIR``)
+as Markdown, where each ``#`` heading starts a chunk, or as JSON material
+records shaped like ``MATERIALS`` entries.
+"""
+import glob
+import json
+import math
+import os
+import re
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+KNOWLEDGE_DIR = os.path.join(BASE_DIR, "knowledge")
+TOP_K = 3
+
+MATERIALS = {
+    "PLA": {
+        "name": "PLA",
+        "aliases": ["pla"],
+        "nozzle_temp": "190-220°C",
+        "bed_temp": "0-60°C (optional heated bed)",
+        "enclosure": "Not needed",
+        "drying": "Rarely needed; 45-50°C for 4 hours if it gets brittle or stringy",
+        "properties": "Best for beginners, biodegradable, low warping, good detail.",
+        "uses": "Prototypes, decorative items, low-stress parts.",
+        "tips": "Use the part cooling fan at full speed.",
+    },
+    "ABS": {
+        "name": "ABS",
+        "aliases": ["abs"],
+        "nozzle_temp": "220-250°C",
+        "bed_temp": "80-110°C",
+        "enclosure": "Required - use a fully enclosed printer and avoid drafts",
+        "drying": "60-70°C for 2-4 hours if it has absorbed moisture",
+        "properties": "Strong, heat resistant, prone to warping.",
+        "uses": "Functional parts, mechanical components.",
+        "tips": (
+            "Use an enclosure, keep room temperature stable and avoid drafts. Use ABS juice/slurry "
+            "(ABS dissolved in acetone) for bed adhesion. Reduce or disable the cooling fan. "
+            "Print in a well-ventilated area."
+        ),
+    },
+    "PETG": {
+        "name": "PETG",
+        "aliases": ["petg", "pet-g"],
+        "nozzle_temp": "220-250°C",
+        "bed_temp": "70-85°C (not too hot or it can stick too well)",
+        "enclosure": "Not needed",
+        "drying": "65°C for 4 hours if it strings or pops",
+        "properties": "Chemical resistant, strong, slightly flexible, minimal warping.",
+        "uses": "Outdoor parts, mechanical parts, water bottles.",
+        "tips": (
+            "Clean the bed thoroughly, reduce print speed, avoid an over-hot bed (it can stick too well) "
+            "and use lower retraction than PLA to limit stringing."
+        ),
+    },
+    "TPU": {
+        "name": "TPU / Flexible",
+        "aliases": ["tpu", "flexible", "flex", "tpe"],
+        "nozzle_temp": "210-230°C",
+        "bed_temp": "40-60°C",
+        "enclosure": "Not needed",
+        "drying": "50°C for 4-6 hours",
+        "properties": "Elastic, impact resistant, challenging to print.",
+        "uses": "Gaskets, phone cases, flexible and shock-absorbing parts.",
+        "tips": (
+            "Print slow (20-30mm/s), use a direct drive extruder if possible, reduce retraction "
+            "distance and increase flow rate slightly."
+        ),
+    },
+    "Nylon": {
+        "name": "Nylon",
+        "aliases": ["nylon", "pa", "polyamide"],
+        "nozzle_temp": "240-260°C",
+        "bed_temp": "70-80°C",
+        "enclosure": "Recommended",
+        "drying": "70°C for 4-6 hours before printing - it is hygroscopic and absorbs moisture",
+        "properties": "Very strong, abrasion resistant, hygroscopic (absorbs moisture).",
+        "uses": "Gears, hinges, wear parts, functional mechanical parts.",
+        "tips": "Dry the filament before use, use glue stick or a garolite bed surface, raise bed temp to 70-80°C.",
+    },
+    "ASA": {
+        "name": "ASA",
+        "aliases": ["asa"],
+        "nozzle_temp": "240-260°C",
+        "bed_temp": "80-110°C",
+        "enclosure": "Required - same challenges as ABS",
+        "drying": "60-70°C for 2-4 hours",
+        "properties": "Like ABS but UV resistant; better for outdoor use.",
+        "uses": "Outdoor and UV-exposed functional parts.",
+        "tips": "Same approach as ABS: enclosure, heated bed 80-110°C, no drafts, reduced cooling, ventilation.",
+    },
+}
+
+GUIDES = [
+    {
+        "id": "guide:orientation",
+        "title": "Print orientation for maximum strength",
+        "text": (
+            "Layer lines are the weakest point - orient parts so stress is parallel to layers, not perpendicular. "
+            "For mechanical parts, position them so functional surfaces align with the layer direction. "
+            "Overhangs over 45° need supports - minimize them by smart orientation. "
+            "Parts are anisotropic and weakest in the Z axis (layer separation)."
+        ),
+    },
+    {
+        "id": "guide:first-layer",
+        "title": "First layer and bed adhesion",
+        "text": (
+            "The first layer is critical - level the bed carefully and adjust the Z-offset. "
+            "Clean the bed, slow the first layer down and use a brim for parts prone to lifting or warping."
+        ),
+    },
+    {
+        "id": "guide:tuning",
+        "title": "General tuning tips",
+        "text": (
+            "Print temperature towers to find the optimal temperature for each filament. "
+            "Use the cooling fan for PLA; reduce or disable it for ABS/ASA. "
+            "Infill: 10-20% for most parts, 50%+ for mechanical strength. "
+            "Wall thickness: a minimum of 2-3 perimeters for strength."
+        ),
+    },
+]
+
+SPEC_FIELDS = {
+    "nozzle_temp": "Nozzle temperature",
+    "bed_temp": "Bed temperature",
+    "drying": "Drying",
+    "enclosure": "Enclosure",
+}
+
+
+def _requested_fields(text):
+    """Work out which spec fields a short question asks for"""
+    fields = []
+    if re.search(r"\b(nozzle|hotend|hot end|extru\w*|print(ing)?)\b.*\btemp", text) or (
+        re.search(r"\btemp", text) and "bed" not in text
+    ):
+        fields.append("nozzle_temp")
+    if re.search(r"\bbed\b.*\btemp|\bheated bed\b", text):
+        fields.append("bed_temp")
+    if re.search(r"\bdry(ing)?\b|\bmoisture\b", text):
+        fields.append("drying")
+    if re.search(r"\benclos(ure|ed)\b", text):
+        fields.append("enclosure")
+    return fields
+
+
+# Words a plain spec lookup may contain besides the material; anything else
+# ("soften", "warping", "without") means the question needs the model
+_SPEC_WORDS = frozenset(
+    "nozzle hotend hot end extruder extrusion print printing printed temp temps temperature temperatures "
+    "bed heated plate dry drying dried moisture enclosure enclosed need needs require required "
+    "setting settings recommended ideal best good right range degrees celsius c filament s".split()
+)
+# Troubleshooting phrasing, checked on the raw words since some are stopwords
+_TROUBLESHOOTING_WORDS = frozenset("why how stop fix prevent avoid problem issue help".split())
+
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:-[a-z0-9]+)?")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it my of on or should the "
+    "to use what when which with you your".split()
+)
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def material_documents(key, data):
+    """Split one material record into a spec chunk and a usage/tips chunk"""
+    name = data.get("name", key)
+    aliases = " ".join(data.get("aliases", []))
+    spec = (
+        f"{name} settings: nozzle temperature {data.get('nozzle_temp', 'n/a')}, bed temperature "
+        f"{data.get('bed_temp', 'n/a')}. Enclosure: {data.get('enclosure', 'n/a')}. "
+        f"Drying: {data.get('drying', 'n/a')}."
+    )
+    usage = (
+        f"{name} properties: {data.get('properties', '')} Use for: {data.get('uses', '')} "
+        f"Tips for printing {name}: {data.get('tips', '')}"
+    )
+    return [
+        {"id": f"material:{key}:spec", "title": f"{name} print settings", "text": spec, "keywords": aliases, "material": key},
+        {"id": f"material:{key}:usage", "title": f"{name} properties and tips", "text": usage, "keywords": aliases, "material": key},
+    ]
+
+
+def markdown_documents(path):
+    """Split a Markdown datasheet into one chunk per heading"""
+    with open(path, encoding="utf-8") as f:
+        content = f.read()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    documents = []
+    title, lines = stem, []
+    for line in content.splitlines() + ["# "]:
+        if line.startswith("#"):
+            text = "\n".join(lines).strip()
+            if text:
+                documents.append({"id": f"doc:{stem}:{len(documents)}", "title": title, "text": text, "keywords": ""})
+            title, lines = line.lstrip("#").strip() or stem, []
+        else:
+            lines.append(line)
+    return documents
+
+
+class KnowledgeBase:
+    """BM25 index over material documents and datasheets"""
+
+    k1 = 1.5
+    b = 0.75
+
+    def __init__(self, materials=None, guides=None, directory=None):
+        self.materials = dict(MATERIALS if materials is None else materials)
+        self.documents = list(GUIDES if guides is None else guides)
+
+        directory = directory or os.environ.get("HUB_KNOWLEDGE_DIR", KNOWLEDGE_DIR)
+        if directory and os.path.isdir(directory):
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                with open(path, encoding="utf-8") as f:
+                    for key, data in json.load(f).items():
+                        self.materials[key] = {**self.materials.get(key, {}), **data}
+            for path in sorted(glob.glob(os.path.join(directory, "*.md"))):
+                self.documents.extend(markdown_documents(path))
+
+        for key, data in self.materials.items():
+            self.documents.extend(material_documents(key, data))
+
+        # Alias -> material key, for spec lookups and material boosting
+        self.aliases = {}
+        for key, data in self.materials.items():
+            for alias in data.get("aliases", [key.lower()]):
+                self.aliases[alias.lower()] = key
+
+        self._build_index()
+
+    def _build_index(self):
+        self.doc_terms = []
+        document_frequency = Counter()
+        for doc in self.documents:
+            terms = Counter(tokenize(f"{doc['title']} {doc['title']} {doc.get('keywords', '')} {doc['text']}"))
+            self.doc_terms.append(terms)
+            document_frequency.update(terms.keys())
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = sum(self.doc_lengths) / len(self.doc_lengths) if self.doc_lengths else 0
+        n = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+        # Inverted index so a query only scores documents sharing a term with it
+        self.postings = {}
+        for i, terms in enumerate(self.doc_terms):
+            for term in terms:
+                self.postings.setdefault(term, []).append(i)
+
+    def search(self, query, k=TOP_K):
+        """Return the top-k ``(score, document)`` pairs for a query"""
+        scores = Counter()
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i in self.postings[term]:
+                tf = self.doc_terms[i][term]
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return [(score, self.documents[i]) for i, score in scores.most_common(k)]
+
+    def mentioned_materials(self, text):
+        words = set(_TOKEN_RE.findall(text.lower()))
+        return [key for alias, key in self.aliases.items() if alias in words]
+
+    def direct_answer(self, question):
+        """Answer a short spec question (one material, one setting) from the data
+
+        Only plain lookups qualify: any word beyond the material and the
+        setting, or troubleshooting phrasing, leaves the question to the
+        model. Returns Markdown, or ``None`` when the question needs the model.
+        """
+        words = _TOKEN_RE.findall(question.lower())
+        if len(words) > 12 or _TROUBLESHOOTING_WORDS.intersection(words):
+            return None
+        materials = set(self.mentioned_materials(question))
+        if len(materials) != 1:
+            return None
+        key = materials.pop()
+        aliases = {alias for alias, material in self.aliases.items() if material == key}
+        if any(term not in _SPEC_WORDS and term not in aliases for term in tokenize(question)):
+            return None
+        data = self.materials[key]
+        fields = [field for field in _requested_fields(question.lower()) if data.get(field)]
+        if not fields:
+            return None
+        lines = [f"**{data.get('name', key)}**"]
+        lines.extend(f"- **{SPEC_FIELDS[field]}:** {data[field]}" for field in fields)
+        return "\n".join(lines)
+
+    def context_for(self, query, k=TOP_K):
+        """Return the reference notes to inject into the system prompt"""
+        return "\n\n".join(f"### {doc['title']}\n{doc['text']}" for _, doc in self.search(query, k))
@@ -0,0 +1,330 @@
+"""Process-wide metrics: render timings, rerun counts, chat latency and cache stats.
+
+The app records into one ``Registry`` per server process; nothing here
+depends on Streamlit. Three optional outputs are switched on by environment
+variables so a plain ``streamlit run app.py`` stays quiet:
+
+``HUB_METRICS_PORT``
+    Serve ``/metrics`` (Prometheus text format) and ``/metrics.json`` on this
+    port from a background thread.
+``HUB_METRICS_LOG=1``
+    Log one JSON line per rerun and per chat completion to the
+    ``printing_hub.metrics`` logger.
+``HUB_PROFILE_SLOW_MS``
+    Sample the script thread's stack during every rerun and log the hottest
+    stacks of reruns slower than this many milliseconds.
+
+Histograms use fixed buckets, so recording is a lock and a few integer
+increments.
+"""
+import bisect
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "hub_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PROFILE_INTERVAL = 0.005   # seconds between stack samples
+PROFILE_TOP = 5            # stacks logged per slow rerun
+PROFILE_DEPTH = 12         # innermost frames kept per stack
+
+logger = logging.getLogger("printing_hub.metrics")
+
+
+def _env_flag(name):
+    return os.environ.get(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def _labels_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class Registry:
+    """Thread-safe counters, gauges and histograms with Prometheus text export"""
+
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}     # name -> {labels_key: value}
+        self._gauges = {}
+        self._histograms = {}   # name -> (buckets, {labels_key: [bucket_counts, sum, count]})
+        self._help = {}
+        self._collectors = {}   # name -> fn() returning {stat: number}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def inc(self, name, value=1, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS, **labels):
+        key = _labels_key(labels)
+        with self._lock:
+            bounds, series = self._histograms.setdefault(name, (tuple(buckets), {}))
+            state = series.get(key)
+            if state is None:
+                state = series[key] = [[0] * len(bounds), 0.0, 0]
+            i = bisect.bisect_left(bounds, value)
+            if i < len(bounds):
+                state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, name, **labels):
+        """Observe the duration of the ``with`` block in seconds"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Decorator form of ``time``"""
+        def decorate(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.time(name, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def register_collector(self, name, fn):
+        """Export ``fn()``'s ``{stat: number}`` dict as ``<name>_<stat>`` gauges at scrape time"""
+        self._collectors[name] = fn
+
+    def _collected(self):
+        gauges = {}
+        for name, fn in list(self._collectors.items()):
+            try:
+                stats = fn()
+            except Exception:
+                logger.exception("Metrics collector %s failed", name)
+                continue
+            for stat, value in stats.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    gauges[f"{name}_{stat}"] = {(): value}
+        return gauges
+
+    def snapshot(self):
+        """All series as plain data (the ``/metrics.json`` body)"""
+        with self._lock:
+            counters = {n: dict(s) for n, s in self._counters.items()}
+            gauges = {n: dict(s) for n, s in self._gauges.items()}
+            histograms = {
+                n: (bounds, {k: (list(v[0]), v[1], v[2]) for k, v in s.items()})
+                for n, (bounds, s) in self._histograms.items()
+            }
+        gauges.update(self._collected())
+
+        def series(values):
+            return [{"labels": dict(k), "value": v} for k, v in values.items()]
+
+        return {
+            "counters": {n: series(s) for n, s in counters.items()},
+            "gauges": {n: series(s) for n, s in gauges.items()},
+            "histograms": {
+                n: [
+                    {"labels": dict(k), "buckets": dict(zip(map(str, bounds), counts)), "sum": total, "count": count}
+                    for k, (counts, total, count) in s.items()
+                ]
+                for n, (bounds, s) in histograms.items()
+            },
+        }
+
+    def render_prometheus(self):
+        """Prometheus text exposition format"""
+        data = self.snapshot()
+        lines = []
+
+        def header(name, kind):
+            full = self.prefix + name
+            if name in self._help:
+                lines.append(f"# HELP {full} {self._help[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        for kind in ("counters", "gauges"):
+            for name, series in sorted(data[kind].items()):
+                full = header(name, "counter" if kind == "counters" else "gauge")
+                for s in series:
+                    lines.append(f"{full}{_format_labels(_labels_key(s['labels']))} {s['value']}")
+        for name, series in sorted(data["histograms"].items()):
+            full = header(name, "histogram")
+            for s in series:
+                key = _labels_key(s["labels"])
+                cumulative = 0
+                for bound, count in s["buckets"].items():
+                    cumulative += count
+                    lines.append(f"{full}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                lines.append(f"{full}_bucket{_format_labels(key, [('le', '+Inf')])} {s['count']}")
+                lines.append(f"{full}_sum{_format_labels(key)} {s['sum']}")
+                lines.append(f"{full}_count{_format_labels(key)} {s['count']}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+for _name, _help in {
+    "reruns_total": "Full script runs by view",
+    "view_render_seconds": "Full script run duration by view",
+    "fragment_render_seconds": "Fragment render duration (full and fragment-only reruns)",
+    "image_bytes_total": "Image bytes referenced by rendered product cards",
+    "chat_ttft_seconds": "Time to first token of model replies",
+    "chat_latency_seconds": "Total latency of assistant answers by source",
+    "chat_tokens_total": "Model tokens by kind",
+    "chat_answers_total": "Assistant answers by source",
+    "stl_analyze_seconds": "STL upload parse and analysis time (cache hits included)",
+}.items():
+    REGISTRY.describe(_name, _help)
+
+
+# -- structured logs --------------------------------------------------------
+
+def log_event(event, **fields):
+    """Emit a JSON log line if ``HUB_METRICS_LOG`` is set"""
+    if _env_flag("HUB_METRICS_LOG"):
+        logger.info(json.dumps({"event": event, "ts": round(time.time(), 3), **fields}, default=str))
+
+
+# -- sampling profiler ------------------------------------------------------
+
+class StackSampler:
+    """Sample one thread's stack on a background thread while it runs"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL, depth=PROFILE_DEPTH):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.depth = depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rerun-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = traceback.extract_stack(frame, limit=self.depth)
+            self.samples[tuple(f"{os.path.basename(f.filename)}:{f.lineno} {f.name}" for f in stack)] += 1
+
+    def report(self, top=PROFILE_TOP):
+        total = sum(self.samples.values())
+        return [
+            {"share": round(count / total, 3), "samples": count, "stack": list(stack)}
+            for stack, count in self.samples.most_common(top)
+        ]
+
+
+def _slow_threshold():
+    value = os.environ.get("HUB_PROFILE_SLOW_MS")
+    return float(value) / 1000 if value else None
+
+
+@contextmanager
+def rerun(view, registry=REGISTRY):
+    """Count and time one full script run; profile it if it turns out slow"""
+    threshold = _slow_threshold()
+    sampler = StackSampler(threading.get_ident()).start() if threshold is not None else None
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        registry.inc("reruns_total", view=view)
+        registry.observe("view_render_seconds", elapsed, view=view)
+        log_event("rerun", view=view, seconds=round(elapsed, 4))
+        if sampler is not None:
+            sampler.stop()
+            if elapsed >= threshold:
+                logger.warning(json.dumps({
+                    "event": "slow_rerun", "view": view, "seconds": round(elapsed, 4),
+                    "hot_stacks": sampler.report(),
+                }))
+
+
+# -- HTTP endpoint ----------------------------------------------------------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.registry.render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(self.registry.snapshot(), default=str), "application/json"
+        else:
+            self.send_error(404)
+            return
+        payload = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the app log
+
+
+def serve(port, host="0.0.0.0", registry=REGISTRY):
+    """Start the metrics endpoint on a daemon thread and return the server"""
+    handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def serve_from_env(registry=REGISTRY):
+    """Start the endpoint if ``HUB_METRICS_PORT`` is set; returns the server or ``None``"""
+    port = os.environ.get("HUB_METRICS_PORT")
+    if not port:
+        return None
+    try:
+        return serve(int(port), registry=registry)
+    except OSError:
+        # Another server process already owns the port
+        logger.warning("Metrics port %s unavailable; endpoint not started", port)
+        return None
+
+
+# Shortcuts for the default registry
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timed = REGISTRY.timed
+register_collector = REGISTRY.register_collector
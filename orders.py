@@ -0,0 +1,318 @@
+"""Durable order and invoice store.
+
+Orders are written to SQLite (WAL mode) by a background writer thread that
+batches inserts into a single transaction, so checkout never waits on disk
+I/O. Invoice numbers come from a monotonic sequence kept in the database and
+handed out in blocks, which keeps them collision-free across threads and
+processes.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.environ.get("HUB_DATA_DIR", os.path.join(BASE_DIR, "data"))
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "orders.db")
+
+BATCH_SIZE = 100          # max orders per write transaction
+FLUSH_INTERVAL = 0.2      # seconds the writer waits to fill a batch
+SEQUENCE_BLOCK = 20       # invoice numbers reserved from the database at a time
+DEAD_LETTER_SUFFIX = ".failed.jsonl"
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoice_sequence (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS orders (
+    invoice_number TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL UNIQUE,
+    created_at TEXT NOT NULL,
+    order_date TEXT NOT NULL,
+    customer_email TEXT NOT NULL COLLATE NOCASE,
+    customer_name TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    total REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_email ON orders (customer_email);
+CREATE INDEX IF NOT EXISTS idx_orders_date ON orders (order_date);
+"""
+
+
+def connect(path):
+    """Open a connection with the pragmas every store connection uses"""
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+class OrderStore:
+    """SQLite-backed order store with an asynchronous batched writer"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, sequence_block=SEQUENCE_BLOCK):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.sequence_block = sequence_block
+        self.dead_letter_path = path + DEAD_LETTER_SUFFIX  # orders that could not be committed
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = connect(path)
+        with conn:
+            conn.executescript(SCHEMA)
+            conn.execute("INSERT OR IGNORE INTO invoice_sequence (name, value) VALUES ('invoice', 0)")
+        conn.close()
+
+        self._local = threading.local()
+        self._seq_lock = threading.Lock()
+        self._seq_next = 0
+        self._seq_end = 0
+
+        # Orders accepted but not yet committed, so lookups see them immediately
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, name="order-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+        self._replay_dead_letters()
+
+    # -- invoice numbers -------------------------------------------------
+
+    def _reserve_block(self):
+        """Claim the next block of sequence values in one write transaction"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE invoice_sequence SET value = value + ? WHERE name = 'invoice'", (self.sequence_block,))
+            end = conn.execute("SELECT value FROM invoice_sequence WHERE name = 'invoice'").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return end - self.sequence_block + 1, end + 1
+
+    def next_sequence(self):
+        with self._seq_lock:
+            if self._seq_next >= self._seq_end:
+                self._seq_next, self._seq_end = self._reserve_block()
+            value = self._seq_next
+            self._seq_next += 1
+            return value
+
+    def next_invoice_number(self, when=None):
+        """Return a new, never-reused invoice number like ``INV-20250101-000042``"""
+        when = when or datetime.now()
+        return f"INV-{when.strftime('%Y%m%d')}-{self.next_sequence():06d}"
+
+    # -- writes ------------------------------------------------------------
+
+    def submit(self, invoice_data):
+        """Queue an invoice for writing and return immediately"""
+        if self._closed:
+            raise RuntimeError("Order store is closed")
+        invoice_number = invoice_data["invoice_number"]
+        with self._pending_lock:
+            self._pending[invoice_number] = invoice_data
+        self._queue.put(invoice_data)
+        return invoice_number
+
+    def flush(self):
+        """Block until every submitted order has been committed"""
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self):
+        conn = connect(self.path)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(conn, batch)
+            except Exception:
+                # Never let one bad batch kill the writer: flush() and later orders depend on it
+                logger.exception("Failed to write %d orders to %s", len(batch), self.path)
+            for _ in batch:
+                self._queue.task_done()
+            if stop:
+                break
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        written, failed, rows = [], [], []
+        for order in batch:
+            try:
+                rows.append(self._row(order))
+                written.append(order)
+            except Exception:
+                logger.exception("Order %s cannot be stored", order.get("invoice_number"))
+                failed.append(order)
+        try:
+            self._insert(conn, rows)
+        except sqlite3.OperationalError:
+            logger.exception("Failed to write %d orders to %s", len(rows), self.path)
+            failed.extend(written)
+            written = []
+        except sqlite3.Error:
+            # One bad row (e.g. an integrity error) fails the whole transaction; isolate it
+            written, rejected = self._insert_each(conn, written)
+            failed.extend(rejected)
+        if failed:
+            self._dead_letter(failed)
+        with self._pending_lock:
+            for order in written:
+                self._pending.pop(order["invoice_number"], None)
+
+    def _insert(self, conn, rows):
+        for attempt in range(5):
+            try:
+                with conn:
+                    conn.executemany(
+                        "INSERT OR REPLACE INTO orders (invoice_number, seq, created_at, order_date, customer_email,"
+                        " customer_name, order_type, total, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                return
+            except sqlite3.OperationalError:
+                # Database locked by another process beyond busy_timeout; back off and retry
+                if attempt == 4:
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+
+    def _insert_each(self, conn, orders):
+        """Insert orders one at a time; returns ``(written, rejected)``"""
+        written, rejected = [], []
+        for order in orders:
+            try:
+                self._insert(conn, [self._row(order)])
+                written.append(order)
+            except sqlite3.Error:
+                logger.exception("Order %s was rejected by %s", order["invoice_number"], self.path)
+                rejected.append(order)
+        return written, rejected
+
+    def _dead_letter(self, orders):
+        """Append orders that could not be committed to the dead-letter file
+
+        They stay readable from memory for this process and are retried by the
+        next ``OrderStore`` opened on the same database.
+        """
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            for order in orders:
+                f.write(json.dumps(order, default=str) + "\n")
+        logger.error("Moved %d orders to %s", len(orders), self.dead_letter_path)
+
+    def _replay_dead_letters(self):
+        """Resubmit orders a previous process could not write"""
+        replay = self.dead_letter_path + ".replay"
+        if os.path.exists(self.dead_letter_path) and not os.path.exists(replay):
+            os.replace(self.dead_letter_path, replay)
+        if not os.path.exists(replay):
+            return
+        with open(replay, encoding="utf-8") as f:
+            orders = [json.loads(line) for line in f if line.strip()]
+        for order in orders:
+            self.submit(order)
+        # Anything failing again is dead-lettered afresh before the replay file goes
+        self.flush()
+        os.remove(replay)
+        logger.warning("Replayed %d dead-lettered orders into %s", len(orders), self.path)
+
+    @staticmethod
+    def _row(order):
+        created_at = order.get("created_at") or datetime.now().isoformat(timespec="seconds")
+        return (
+            order["invoice_number"],
+            int(order["invoice_number"].rsplit("-", 1)[-1]),
+            created_at,
+            created_at[:10],
+            order.get("customer_email", ""),
+            order.get("customer_name", ""),
+            order.get("order_type", ""),
+            float(order.get("total", 0)),
+            json.dumps(order),
+        )
+
+    # -- reads -------------------------------------------------------------
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            conn.isolation_level = None  # explicit transactions only
+        return conn
+
+    def get(self, invoice_number):
+        """Return the invoice with this number, or ``None``"""
+        with self._pending_lock:
+            if invoice_number in self._pending:
+                return self._pending[invoice_number]
+        row = self._conn().execute("SELECT data FROM orders WHERE invoice_number = ?", (invoice_number,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def _pending_matching(self, predicate):
+        with self._pending_lock:
+            return [order for order in self._pending.values() if predicate(order)]
+
+    def _merge(self, rows, pending):
+        """Combine committed rows with pending orders, newest first"""
+        orders = {json.loads(row["data"])["invoice_number"]: json.loads(row["data"]) for row in rows}
+        for order in pending:
+            orders[order["invoice_number"]] = order
+        return sorted(orders.values(), key=lambda o: int(o["invoice_number"].rsplit("-", 1)[-1]), reverse=True)
+
+    def by_email(self, email, limit=100):
+        """Return a customer's orders, newest first"""
+        rows = self._conn().execute(
+            "SELECT data FROM orders WHERE customer_email = ? ORDER BY seq DESC LIMIT ?", (email, limit)
+        ).fetchall()
+        pending = self._pending_matching(lambda o: o.get("customer_email", "").lower() == email.lower())
+        return self._merge(rows, pending)[:limit]
+
+    def by_date_range(self, start, end, limit=None):
+        """Return orders placed between two dates (inclusive, ``date`` or ISO strings)"""
+        start, end = str(start)[:10], str(end)[:10]
+        sql = "SELECT data FROM orders WHERE order_date BETWEEN ? AND ? ORDER BY seq DESC"
+        params = [start, end]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self._conn().execute(sql, params).fetchall()
+        pending = self._pending_matching(lambda o: start <= (o.get("created_at") or "")[:10] <= end)
+        merged = self._merge(rows, pending)
+        return merged if limit is None else merged[:limit]
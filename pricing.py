@@ -0,0 +1,239 @@
+"""Pricing engine for carts and quotes.
+
+All money is handled as integer cents in NumPy arrays, so thousands of carts
+(B2B quotes, a day's order replay) are priced in a handful of vectorized
+operations. Tax and percentage discounts are rounded half-up to the cent,
+matching ``decimal.Decimal(...).quantize(Decimal("0.01"), ROUND_HALF_UP)``.
+The checkout page prices its single cart through the same code path.
+"""
+import numpy as np
+
+from promotions import PromotionBook
+
+TAX_RATE = 0.09
+# (minimum subtotal, shipping fee) in dollars, ascending; the highest tier reached applies
+SHIPPING_TIERS = [(0.00, 5.00), (100.00, 0.00)]
+
+DISCOUNT_CODES = {
+    "SAY-NO-TO-POLYMATE": 0.15,
+    "SKEM-FILAMENT-PRICE": 0.20,
+    "PARCEL-DEEZ-NUTS": 0.50
+}
+
+PPM = 1_000_000  # rates are applied as integer parts-per-million
+
+
+def to_cents(amount):
+    """Convert dollar amounts (scalar or array) to integer cents, rounding half-up"""
+    return np.floor(np.asarray(amount, dtype=np.float64) * 100 + 0.5 + 1e-9).astype(np.int64)
+
+
+def rate_ppm(rate):
+    return np.rint(np.asarray(rate, dtype=np.float64) * PPM).astype(np.int64)
+
+
+def apply_rate(cents, ppm):
+    """Multiply cents by a ppm rate, rounding half-up to whole cents (non-negative inputs)"""
+    return (cents * ppm + PPM // 2) // PPM
+
+
+def discount_rate(code, codes=None):
+    """Return the percentage rate for a discount code, or 0"""
+    return (DISCOUNT_CODES if codes is None else codes).get((code or "").strip().upper(), 0.0)
+
+
+class PriceBreakdown:
+    """Priced cart; all amounts in integer cents
+
+    ``promotions`` lists the ``promotions.Applied`` discounts behind ``discount``.
+    """
+
+    __slots__ = ("line_totals", "subtotal", "shipping", "tax", "discount", "total", "promotions")
+
+    def __init__(self, line_totals, subtotal, shipping, tax, discount, total, promotions=()):
+        self.line_totals = line_totals
+        self.subtotal = subtotal
+        self.shipping = shipping
+        self.tax = tax
+        self.discount = discount
+        self.total = total
+        self.promotions = promotions
+
+    def as_dollars(self):
+        return {
+            "subtotal": self.subtotal / 100,
+            "shipping": self.shipping / 100,
+            "tax": self.tax / 100,
+            "discount": self.discount / 100,
+            "total": self.total / 100,
+        }
+
+
+class PricingEngine:
+    """Vectorized subtotal, shipping tier, tax and discount computation
+
+    Discounts come from a ``promotions.PromotionBook``; by default one built
+    from ``discount_codes`` (plain cart-wide percentage codes).
+    """
+
+    def __init__(self, tax_rate=TAX_RATE, shipping_tiers=SHIPPING_TIERS, discount_codes=None, promotions=None):
+        tiers = sorted(shipping_tiers)
+        codes = DISCOUNT_CODES if discount_codes is None else discount_codes
+        self.discount_codes = {code.strip().upper(): float(rate) for code, rate in codes.items()}
+        self.promotions = promotions if promotions is not None else PromotionBook.from_discount_codes(self.discount_codes)
+        self.tax_ppm = int(rate_ppm(tax_rate))
+        self.tier_thresholds = to_cents([t for t, _ in tiers])
+        self.tier_fees = to_cents([fee for _, fee in tiers])
+
+    def price_lines(self, cart_ids, unit_cents, quantities, discount_rates, n_carts=None, discounts=None):
+        """Price a flat batch of cart lines
+
+        ``cart_ids[i]`` says which cart line ``i`` belongs to (0..n_carts-1);
+        ``discount_rates`` has one percentage rate per cart, or ``discounts``
+        gives each cart's discount directly in cents. Returns a dict of int64
+        cent arrays: ``line_totals`` per line and ``subtotal``, ``shipping``,
+        ``tax``, ``discount`` and ``total`` per cart.
+        """
+        cart_ids = np.asarray(cart_ids, dtype=np.int64)
+        unit_cents = np.asarray(unit_cents, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        if discounts is None:
+            discount_ppm = rate_ppm(discount_rates)
+            if n_carts is None:
+                n_carts = len(discount_ppm)
+        elif n_carts is None:
+            n_carts = len(discounts)
+
+        line_totals = unit_cents * quantities
+        subtotal = np.bincount(cart_ids, weights=line_totals, minlength=n_carts).astype(np.int64)
+
+        # Highest tier whose threshold the subtotal reaches
+        tier = np.searchsorted(self.tier_thresholds, subtotal, side="right") - 1
+        shipping = self.tier_fees[np.clip(tier, 0, None)]
+        # Empty carts don't ship
+        shipping = np.where(subtotal > 0, shipping, 0)
+
+        tax = apply_rate(subtotal, self.tax_ppm)
+        if discounts is None:
+            discount = apply_rate(subtotal, discount_ppm)
+        else:
+            discount = np.asarray(discounts, dtype=np.int64)
+        total = subtotal + shipping + tax - discount
+        return {
+            "line_totals": line_totals,
+            "subtotal": subtotal,
+            "shipping": shipping,
+            "tax": tax,
+            "discount": discount,
+            "total": total,
+        }
+
+    def price_carts(self, carts, catalog):
+        """Price many ``(cart, discount_code)`` pairs; carts are ``{product_id: qty}``
+
+        Returns a ``QuoteBatch`` with one ``PriceBreakdown`` per cart, in
+        order. Unknown product ids and non-positive quantities are ignored,
+        like ``Catalog.resolve_cart``. Plain percentage codes stay fully
+        vectorized; carts with other promotions are evaluated line by line.
+        """
+        index_of = catalog.index_of
+        prices = catalog.price_cents
+        n_carts = len(carts)
+
+        # Flatten the carts into line columns with C-level comprehensions
+        lengths = np.fromiter((len(cart) for cart, _ in carts), dtype=np.int64, count=n_carts)
+        product_index = np.fromiter(
+            (index_of.get(pid, -1) for cart, _ in carts for pid in cart), dtype=np.int64, count=int(lengths.sum())
+        )
+        quantities = np.fromiter(
+            (qty for cart, _ in carts for qty in cart.values()), dtype=np.int64, count=len(product_index)
+        )
+        cart_ids = np.repeat(np.arange(n_carts, dtype=np.int64), lengths)
+        flat = self.promotions.flat_rate
+        rates = [flat(code) for _, code in carts]
+
+        valid = (product_index >= 0) & (quantities > 0)
+        if not valid.all():
+            cart_ids, product_index, quantities = cart_ids[valid], product_index[valid], quantities[valid]
+        unit_cents = prices[product_index]
+
+        if None not in rates:
+            result = self.price_lines(cart_ids, unit_cents, quantities, rates, n_carts=n_carts)
+            return QuoteBatch(result, cart_ids, n_carts)
+
+        # Some carts carry rule-based promotions: evaluate those carts individually
+        offsets = np.searchsorted(cart_ids, np.arange(n_carts + 1))
+        products = catalog.products
+        discounts = np.zeros(n_carts, dtype=np.int64)
+        for i, ((_, code), rate) in enumerate(zip(carts, rates)):
+            start, end = offsets[i], offsets[i + 1]
+            if rate is not None:
+                discounts[i] = apply_rate(int((unit_cents[start:end] * quantities[start:end]).sum()), int(rate_ppm(rate)))
+                continue
+            items = [
+                (products[p].id, products[p].material, int(u), int(q))
+                for p, u, q in zip(product_index[start:end], unit_cents[start:end], quantities[start:end])
+            ]
+            discounts[i] = self.promotions.evaluate(items, code)[0]
+        result = self.price_lines(cart_ids, unit_cents, quantities, None, n_carts=n_carts, discounts=discounts)
+        return QuoteBatch(result, cart_ids, n_carts)
+
+    def price_cart(self, lines, code="", now=None):
+        """Price one resolved cart (``CartLine`` objects) with optional discount codes"""
+        unit_cents = to_cents([line.product.price for line in lines]) if lines else np.zeros(0, dtype=np.int64)
+        discount, applied = self.promotions.evaluate(
+            [(line.product.id, line.product.material, int(u), line.quantity) for line, u in zip(lines, unit_cents)],
+            code,
+            now,
+        )
+        result = self.price_lines(
+            np.zeros(len(lines), dtype=np.int64),
+            unit_cents,
+            [line.quantity for line in lines],
+            None,
+            n_carts=1,
+            discounts=[discount],
+        )
+        breakdown = QuoteBatch(result, np.zeros(len(lines), dtype=np.int64), 1)[0]
+        breakdown.promotions = applied
+        return breakdown
+
+
+class QuoteBatch:
+    """Result of pricing many carts at once
+
+    Per-cart columns (``subtotal``, ``shipping``, ``tax``, ``discount``,
+    ``total``) are int64 cent arrays; indexing yields a ``PriceBreakdown``.
+    """
+
+    def __init__(self, result, cart_ids, n_carts):
+        self.line_totals = result["line_totals"]
+        self.subtotal = result["subtotal"]
+        self.shipping = result["shipping"]
+        self.tax = result["tax"]
+        self.discount = result["discount"]
+        self.total = result["total"]
+        # Lines are grouped by cart (cart_ids is non-decreasing), so offsets slice them
+        self.offsets = np.searchsorted(cart_ids, np.arange(n_carts + 1))
+
+    def __len__(self):
+        return len(self.total)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return PriceBreakdown(
+            self.line_totals[start:end].tolist(),
+            int(self.subtotal[i]),
+            int(self.shipping[i]),
+            int(self.tax[i]),
+            int(self.discount[i]),
+            int(self.total[i]),
+        )
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+default_engine = PricingEngine()
@@ -0,0 +1,385 @@
+"""Promotion rules engine.
+
+A promotion is a dict (loaded from JSON, see ``store_data``) such as::
+
+    {"id": "pla-week", "code": "PLA10", "type": "percent", "value": 0.10,
+     "materials": ["PLA"], "min_spend": 50, "starts": "2025-03-01",
+     "ends": "2025-03-08", "max_uses": 500, "stackable": false}
+
+``type`` is ``percent`` (``value`` is a rate), ``fixed`` (``value`` dollars
+off the matching lines, once per order) or ``bxgy`` (for every ``buy`` +
+``get`` matching units the ``get`` cheapest are discounted by ``value``,
+default 100%). ``skus`` / ``materials`` limit a rule to those lines; without
+them it applies to the whole cart. Rules without a ``code`` apply
+automatically. ``starts`` and ``ends`` are inclusive; a date-only ``ends``
+covers that whole day.
+
+Rules are compiled once into a ``PromotionBook``: code rules are indexed by
+upper-cased code and automatic rules by SKU and material, so evaluating a
+cart touches each line once plus the rules that can actually apply to it.
+Every stackable rule applies; of the non-stackable ones only the largest
+does. Usage limits are enforced at checkout by ``UsageCounter.redeem``,
+which is atomic across threads and processes.
+"""
+import os
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+from orders import DATA_DIR, connect
+
+PERCENT, FIXED, BXGY = "percent", "fixed", "bxgy"
+PPM = 1_000_000
+
+DEFAULT_USAGE_PATH = os.path.join(DATA_DIR, "promotions.db")
+
+
+class PromotionExhausted(Exception):
+    """Raised by ``redeem`` when a promotion has reached its usage limit"""
+
+    def __init__(self, rule_ids):
+        self.rule_ids = rule_ids
+        super().__init__(", ".join(rule_ids))
+
+
+def parse_codes(text):
+    """Split a discount code field into upper-cased codes ("a, b" -> ["A", "B"])"""
+    return [code.upper() for code in re.split(r"[\s,;]+", (text or "").strip()) if code]
+
+
+def _as_datetime(value):
+    if value in (None, ""):
+        return None
+    return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+
+
+def _end_of(value):
+    """Exclusive end of a promotion: a date-only ``ends`` covers that whole day"""
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, date) or len(str(value).strip()) == 10:
+        day = value if isinstance(value, date) else date.fromisoformat(str(value).strip())
+        return datetime.combine(day + timedelta(days=1), datetime.min.time())
+    # A timestamp is the last moment the promotion applies
+    return datetime.fromisoformat(str(value)) + timedelta(microseconds=1)
+
+
+def _cents(dollars):
+    return int(round(float(dollars) * 100))
+
+
+class Rule:
+    """One compiled promotion"""
+
+    __slots__ = (
+        "id", "code", "kind", "value", "rate_ppm", "value_cents", "skus", "materials", "buy", "get",
+        "min_spend", "starts", "ends", "max_uses", "stackable", "label",
+    )
+
+    def __init__(self, spec):
+        code = spec.get("code")
+        if code and not isinstance(code, str):
+            raise ValueError(f"Promotion {spec.get('id') or code!r} has a non-text code: {code!r}")
+        self.code = code.strip().upper() if code else None
+        self.id = str(spec.get("id") or self.code or "")
+        if not self.id:
+            raise ValueError(f"Automatic promotion needs an id: {spec}")
+        self.kind = spec.get("type", PERCENT)
+        if self.kind not in (PERCENT, FIXED, BXGY):
+            raise ValueError(f"Unknown promotion type {self.kind!r} in {self.id}")
+        self.value = float(spec.get("value", 1.0 if self.kind == BXGY else 0))
+        self.rate_ppm = int(round(self.value * PPM))
+        self.value_cents = _cents(self.value)
+        self.skus = frozenset(spec.get("skus") or ())
+        self.materials = frozenset(spec.get("materials") or ())
+        self.buy = int(spec.get("buy", 0))
+        self.get = int(spec.get("get", 0))
+        if self.kind == BXGY and (self.buy < 1 or self.get < 1):
+            raise ValueError(f"Buy-X-get-Y promotion {self.id} needs buy and get >= 1")
+        self.min_spend = _cents(spec.get("min_spend", 0))
+        self.starts = _as_datetime(spec.get("starts"))
+        self.ends = _end_of(spec.get("ends"))  # exclusive
+        max_uses = spec.get("max_uses")
+        try:
+            self.max_uses = None if max_uses in (None, "") else int(max_uses)
+        except (TypeError, ValueError):
+            raise ValueError(f"Promotion {self.id} has an invalid max_uses: {max_uses!r}")
+        self.stackable = bool(spec.get("stackable", False))
+        self.label = spec.get("label") or self.code or self.id
+
+    @property
+    def scoped(self):
+        return bool(self.skus or self.materials)
+
+    def matches(self, product_id, material):
+        return product_id in self.skus or material in self.materials
+
+    def active(self, now):
+        return (self.starts is None or now >= self.starts) and (self.ends is None or now < self.ends)
+
+    def is_flat_rate(self):
+        """True for a plain cart-wide percentage with no conditions"""
+        return (
+            self.kind == PERCENT and not self.scoped and not self.min_spend
+            and self.starts is None and self.ends is None and self.max_uses is None
+        )
+
+    def amount(self, items):
+        """Discount in cents for the matching ``(unit_cents, quantity)`` items"""
+        if self.kind == PERCENT:
+            base = sum(unit * qty for unit, qty in items)
+            return (base * self.rate_ppm + PPM // 2) // PPM
+        if self.kind == FIXED:
+            return min(self.value_cents, sum(unit * qty for unit, qty in items))
+        # Buy X get Y: the cheapest units in each group of buy + get are discounted
+        free = sum(qty for _, qty in items) // (self.buy + self.get) * self.get
+        discounted = 0
+        for unit, qty in sorted(items):
+            if free <= 0:
+                break
+            take = min(qty, free)
+            discounted += unit * take
+            free -= take
+        return (discounted * self.rate_ppm + PPM // 2) // PPM
+
+
+class Applied:
+    """A promotion applied to a cart and the discount it gave, in cents"""
+
+    __slots__ = ("rule", "amount")
+
+    def __init__(self, rule, amount):
+        self.rule = rule
+        self.amount = amount
+
+    def __repr__(self):
+        return f"Applied({self.rule.id!r}, {self.amount})"
+
+
+class PromotionBook:
+    """Compiled, indexed set of promotion rules"""
+
+    def __init__(self, specs=(), usage=None):
+        self.rules = [spec if isinstance(spec, Rule) else Rule(spec) for spec in specs]
+        self.usage = usage if usage is not None else MemoryUsageCounter()
+        self.by_code = {}
+        self.auto_by_sku = {}
+        self.auto_by_material = {}
+        self.auto_global = []
+        seen = set()
+        for rule in self.rules:
+            if rule.id in seen:
+                raise ValueError(f"Duplicate promotion id: {rule.id}")
+            seen.add(rule.id)
+            if rule.code:
+                self.by_code.setdefault(rule.code, []).append(rule)
+            elif not rule.scoped:
+                self.auto_global.append(rule)
+            else:
+                for sku in rule.skus:
+                    self.auto_by_sku.setdefault(sku, []).append(rule)
+                for material in rule.materials:
+                    self.auto_by_material.setdefault(material, []).append(rule)
+        self.has_automatic = bool(self.auto_global or self.auto_by_sku or self.auto_by_material)
+        self._flat_rates = {}
+
+    @classmethod
+    def from_discount_codes(cls, codes, promotions=(), usage=None):
+        """Book with the legacy ``{code: rate}`` table as cart-wide percentage codes
+
+        A promotion with the same code replaces the legacy entry.
+        """
+        promotions = list(promotions)
+        overridden = {str(spec.get("code", "")).strip().upper() for spec in promotions}
+        specs = [
+            {"code": code, "type": PERCENT, "value": rate}
+            for code, rate in codes.items() if code.strip().upper() not in overridden
+        ]
+        return cls(specs + promotions, usage=usage)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def flat_rate(self, code_text):
+        """Cart-wide rate for codes that need no per-line evaluation, else ``None``
+
+        Lets batch pricing keep its vectorized path for plain percentage codes.
+        """
+        try:
+            return self._flat_rates[code_text]
+        except KeyError:
+            pass
+        rate = self._flat_rate(code_text)
+        if len(self._flat_rates) < 10_000:
+            self._flat_rates[code_text] = rate
+        return rate
+
+    def _flat_rate(self, code_text):
+        if self.has_automatic:
+            return None
+        codes = parse_codes(code_text)
+        if not codes:
+            return 0.0
+        if len(codes) > 1:
+            return None
+        rules = self.by_code.get(codes[0], ())
+        if not rules:
+            return 0.0
+        if len(rules) == 1 and rules[0].is_flat_rate():
+            return rules[0].value
+        return None
+
+    def evaluate(self, items, code_text="", now=None):
+        """Discount a cart; returns ``(total_cents, [Applied, ...])``
+
+        ``items`` are ``(product_id, material, unit_cents, quantity)`` tuples.
+        """
+        now = now or datetime.now()
+        subtotal = 0
+        buckets = {}  # rule id -> (rule, [(unit, qty), ...])
+
+        code_rules = [rule for code in parse_codes(code_text) for rule in self.by_code.get(code, ())]
+        for rule in self.auto_global:
+            buckets[rule.id] = (rule, [])
+        for rule in code_rules:
+            if not rule.scoped:
+                buckets[rule.id] = (rule, [])
+        scoped_codes = [rule for rule in code_rules if rule.scoped]
+
+        for product_id, material, unit, qty in items:
+            if qty <= 0:
+                continue
+            subtotal += unit * qty
+            item = (unit, qty)
+            for rule in self.auto_by_sku.get(product_id, ()):
+                buckets.setdefault(rule.id, (rule, []))[1].append(item)
+            for rule in self.auto_by_material.get(material, ()):
+                # A rule indexed by both the SKU and its material counts the line once
+                if product_id not in rule.skus:
+                    buckets.setdefault(rule.id, (rule, []))[1].append(item)
+            for rule in scoped_codes:
+                if rule.matches(product_id, material):
+                    buckets.setdefault(rule.id, (rule, []))[1].append(item)
+        if not buckets or subtotal <= 0:
+            return 0, []
+
+        everything = [(unit, qty) for _, _, unit, qty in items if qty > 0]
+        limited = [rule.id for rule, _ in buckets.values() if rule.max_uses is not None]
+        uses = self.usage.uses(limited) if limited else {}
+
+        stacked, best = [], None
+        for rule, matched in buckets.values():
+            if not rule.active(now) or subtotal < rule.min_spend:
+                continue
+            if rule.max_uses is not None and uses.get(rule.id, 0) >= rule.max_uses:
+                continue
+            amount = rule.amount(matched if rule.scoped else everything)
+            if amount <= 0:
+                continue
+            if rule.stackable:
+                stacked.append(Applied(rule, amount))
+            elif best is None or amount > best.amount:
+                best = Applied(rule, amount)
+
+        applied = stacked + ([best] if best else [])
+        total = min(sum(a.amount for a in applied), subtotal)
+        return total, applied
+
+    def redeem(self, applied):
+        """Count one use of each applied promotion; raises ``PromotionExhausted``"""
+        limits = {a.rule.id: a.rule.max_uses for a in applied if a.rule.max_uses is not None}
+        if limits:
+            self.usage.redeem(limits)
+
+    def refund(self, applied):
+        """Give back the uses counted by ``redeem`` (e.g. the order then failed)"""
+        rule_ids = [a.rule.id for a in applied if a.rule.max_uses is not None]
+        if rule_ids:
+            self.usage.refund(rule_ids)
+
+
+class MemoryUsageCounter:
+    """Per-process usage counts (tests, benchmarks, batch quotes)"""
+
+    def __init__(self):
+        self._uses = {}
+        self._lock = threading.Lock()
+
+    def uses(self, rule_ids):
+        with self._lock:
+            return {rule_id: self._uses.get(rule_id, 0) for rule_id in rule_ids}
+
+    def redeem(self, limits):
+        with self._lock:
+            exhausted = [rule_id for rule_id, limit in limits.items() if self._uses.get(rule_id, 0) >= limit]
+            if exhausted:
+                raise PromotionExhausted(exhausted)
+            for rule_id in limits:
+                self._uses[rule_id] = self._uses.get(rule_id, 0) + 1
+
+    def refund(self, rule_ids):
+        with self._lock:
+            for rule_id in rule_ids:
+                self._uses[rule_id] = max(0, self._uses.get(rule_id, 0) - 1)
+
+
+class UsageCounter:
+    """Usage counts in SQLite, shared by every session and server process"""
+
+    SCHEMA = "CREATE TABLE IF NOT EXISTS promotion_usage (rule_id TEXT PRIMARY KEY, uses INTEGER NOT NULL)"
+
+    def __init__(self, path=DEFAULT_USAGE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = connect(path)
+        with conn:
+            conn.execute(self.SCHEMA)
+        conn.close()
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            conn.isolation_level = None  # explicit transactions only
+        return conn
+
+    def uses(self, rule_ids):
+        rule_ids = list(rule_ids)
+        rows = self._conn().execute(
+            f"SELECT rule_id, uses FROM promotion_usage WHERE rule_id IN ({','.join('?' * len(rule_ids))})", rule_ids
+        ).fetchall()
+        return {row["rule_id"]: row["uses"] for row in rows}
+
+    def redeem(self, limits):
+        """Atomically check every limit and count one use each, or change nothing"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = self.uses(limits)
+            exhausted = [rule_id for rule_id, limit in limits.items() if current.get(rule_id, 0) >= limit]
+            if exhausted:
+                raise PromotionExhausted(exhausted)
+            conn.executemany(
+                "INSERT INTO promotion_usage (rule_id, uses) VALUES (?, 1) "
+                "ON CONFLICT (rule_id) DO UPDATE SET uses = uses + 1",
+                [(rule_id,) for rule_id in limits],
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def refund(self, rule_ids):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany(
+                "UPDATE promotion_usage SET uses = MAX(uses - 1, 0) WHERE rule_id = ?", [(rule_id,) for rule_id in rule_ids]
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
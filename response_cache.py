@@ -0,0 +1,197 @@
+"""Response cache for repeated assistant questions.
+
+Lookups try an exact match on the normalized question first, then a cosine
+similarity search over local hashed n-gram embeddings, so "how do I dry
+nylon?" and "how to dry nylon filament" share one answer. Entries expire
+after a TTL, the least recently used are evicted beyond ``max_entries``, and
+the cache is persisted to a JSON file so it survives restarts.
+
+Answers are cached per question, independent of earlier turns in the
+conversation; short context-dependent follow-ups are only served on an
+exact match.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "response_cache.json")
+DEFAULT_TTL = 7 * 24 * 3600   # seconds
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_THRESHOLD = 0.75      # cosine similarity needed for a semantic hit
+MIN_SEMANTIC_WORDS = 3        # shorter questions only match exactly
+EMBEDDING_DIM = 1024
+
+_STOPWORDS = frozenset(
+    "a an the to for of on in with and or my i is it do does how what can should "
+    "me you any best way tips help fix stop avoid prevent filament please".split()
+)
+# A semantic hit must mention exactly the same materials as the cached question
+_MATERIALS = frozenset("pla abs petg tpu nylon asa pc pva hips".split())
+
+
+def normalize(question):
+    """Lower-case, strip punctuation and collapse whitespace"""
+    return " ".join(re.findall(r"[a-z0-9]+", question.lower()))
+
+
+def materials(text):
+    """Return the set of filament materials a question mentions"""
+    return frozenset(w for w in normalize(text).split() if w in _MATERIALS)
+
+
+def embed(text):
+    """Embed text as an L2-normalized hashed bag of words and character trigrams"""
+    vector = np.zeros(EMBEDDING_DIM, dtype=np.float32)
+    words = [w for w in normalize(text).split() if w not in _STOPWORDS]
+    features = [f"w:{w}" for w in words]
+    for word in words:
+        padded = f" {word} "
+        features.extend(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], "little") % EMBEDDING_DIM
+        sign = 1.0 if digest[4] & 1 else -1.0
+        # Whole words weigh more than the trigrams that make them up
+        vector[bucket] += sign * (2.0 if feature.startswith("w:") else 1.0)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ResponseCache:
+    """Thread-safe exact + semantic answer cache shared by all sessions"""
+
+    def __init__(self, path=DEFAULT_PATH, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, threshold=DEFAULT_THRESHOLD):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # normalized question -> {"question", "answer", "created", "hits"}
+        self._entries = OrderedDict()
+        # Preallocated embedding matrix; each entry owns one row, free rows are all-zero
+        self._vectors = np.zeros((max_entries + 1, EMBEDDING_DIM), dtype=np.float32)
+        self._row_keys = [None] * (max_entries + 1)
+        self._rows = {}
+        self._free_rows = list(range(max_entries, -1, -1))
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, question):
+        """Return ``(answer, kind)`` with kind ``"exact"``/``"semantic"``, or ``None``"""
+        key = normalize(question)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                self._remove(key)
+                self.stats["expirations"] += 1
+                entry = None
+            if entry is not None:
+                self._touch(key, entry)
+                self.stats["exact_hits"] += 1
+                return entry["answer"], "exact"
+
+            if len(key.split()) >= MIN_SEMANTIC_WORDS and self._rows:
+                scores = self._vectors @ embed(key)
+                wanted = materials(key)
+                for i in np.argsort(scores)[::-1]:
+                    if scores[i] < self.threshold:
+                        break
+                    match = self._row_keys[i]
+                    entry = self._entries[match]
+                    if self._expired(entry, now) or materials(match) != wanted:
+                        continue
+                    self._touch(match, entry)
+                    self.stats["semantic_hits"] += 1
+                    return entry["answer"], "semantic"
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, question, answer):
+        """Store an answer and persist the cache"""
+        key = normalize(question)
+        if not key or not answer:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._add(key, {"question": question, "answer": answer, "created": time.time(), "hits": 0})
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+        self._save()
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+        self._save()
+
+    def metrics(self):
+        """Return hit/miss counters plus size and hit rate"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        lookups = stats["exact_hits"] + stats["semantic_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["exact_hits"] + stats["semantic_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _expired(self, entry, now):
+        return self.ttl is not None and now - entry["created"] > self.ttl
+
+    def _touch(self, key, entry):
+        entry["hits"] += 1
+        self._entries.move_to_end(key)
+
+    def _add(self, key, entry):
+        row = self._free_rows.pop()
+        self._entries[key] = entry
+        self._rows[key] = row
+        self._row_keys[row] = key
+        self._vectors[row] = embed(key)
+
+    def _remove(self, key):
+        del self._entries[key]
+        row = self._rows.pop(key)
+        self._row_keys[row] = None
+        self._vectors[row] = 0
+        self._free_rows.append(row)
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        live = [e for e in entries if not self._expired(e, now)][-self.max_entries:]
+        for entry in live:
+            key = normalize(entry["question"])
+            if key not in self._entries:
+                self._add(key, entry)
+
+    def _save(self):
+        if not self.path:
+            return
+        # Snapshot and write under one lock so an older snapshot never lands last
+        with self._save_lock:
+            with self._lock:
+                entries = [dict(entry) for entry in self._entries.values()]
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entries, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
@@ -0,0 +1,539 @@
+"""Print-job queue and printer-fleet scheduler.
+
+Quoted prints become jobs in a SQLite queue (``JobQueue``) next to the
+order store. ``simulate`` is the scheduler: a discrete-event simulation
+that hands each job to a printer that can run it: the printer must take
+the material, carry the job's nozzle size if it asks for one, and fit the
+part in its build volume. Printers take jobs as they come free:
+
+* an arriving job goes to an idle capable printer, preferring one that
+  already has its material loaded, then the least versatile one (so the
+  enclosed printers stay free for ABS and Nylon);
+* a printer that comes free takes the waiting job due soonest (longest
+  first on ties, which keeps the makespan short), except that a job in the
+  material already loaded may go ahead of jobs due up to
+  ``MATERIAL_HOLD`` earlier, to save changeovers.
+
+Waiting jobs are kept in one heap per (material, capable printers) group,
+so each dispatch is a few heap operations and thousands of historical jobs
+replay in well under a second. The same engine plans the live queue
+(``JobQueue.plan``) from the printers' current state, and answers "when
+would a new job be ready" on the quote page.
+
+``python scheduler.py simulate --synthetic 5000 --fleet-sizes 4,6,8`` sizes
+the fleet; ``--history jobs.csv`` replays exported jobs instead. ``plan``,
+``start`` and ``finish`` manage the live queue.
+"""
+import argparse
+import csv
+import heapq
+import json
+import os
+import random
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from orders import DATA_DIR, connect
+from stl_quote import PRINT_MATERIALS, fits
+
+DEFAULT_DB_PATH = os.path.join(DATA_DIR, "print_jobs.db")
+
+CHANGEOVER_SECONDS = 10 * 60    # unload, load and purge a different filament
+BED_CLEAR_SECONDS = 5 * 60      # remove the part and prepare the bed between jobs
+MATERIAL_HOLD = 2 * 3600        # how far a loaded-material job may jump the due-date order
+TURNAROUND = 48 * 3600          # due time for jobs that don't set one (the home page promise)
+
+DEFAULT_FLEET = [
+    {"id": "mk4-1", "name": "Prusa MK4 #1", "materials": ["PLA", "PETG", "TPU"], "nozzle": 0.4,
+     "build_volume": [250, 210, 220]},
+    {"id": "mk4-2", "name": "Prusa MK4 #2", "materials": ["PLA", "PETG", "TPU"], "nozzle": 0.4,
+     "build_volume": [250, 210, 220]},
+    {"id": "mk4-3", "name": "Prusa MK4 #3 (0.6 mm)", "materials": ["PLA", "PETG", "TPU"], "nozzle": 0.6,
+     "build_volume": [250, 210, 220]},
+    {"id": "x1c-1", "name": "Bambu X1C #1 (enclosed)", "materials": ["PLA", "ABS", "PETG", "Nylon"], "nozzle": 0.4,
+     "build_volume": [256, 256, 256]},
+    {"id": "x1c-2", "name": "Bambu X1C #2 (enclosed)", "materials": ["PLA", "ABS", "PETG", "Nylon"], "nozzle": 0.4,
+     "build_volume": [256, 256, 256]},
+]
+
+QUEUED, PRINTING, DONE, CANCELLED = "queued", "printing", "done", "cancelled"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS print_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    material TEXT NOT NULL,
+    size_x REAL NOT NULL,
+    size_y REAL NOT NULL,
+    size_z REAL NOT NULL,
+    print_seconds REAL NOT NULL,
+    nozzle REAL,
+    quantity INTEGER NOT NULL DEFAULT 1,
+    submitted_at REAL NOT NULL,
+    due_at REAL NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('queued', 'printing', 'done', 'cancelled')),
+    printer_id TEXT,
+    started_at REAL,
+    finished_at REAL,
+    customer_name TEXT NOT NULL DEFAULT '',
+    customer_email TEXT NOT NULL DEFAULT '',
+    total_cents INTEGER NOT NULL DEFAULT 0,
+    file_name TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs (status);
+"""
+
+
+class Printer:
+    """One printer's capabilities"""
+
+    __slots__ = ("id", "name", "materials", "nozzle", "build_volume")
+
+    def __init__(self, id, name, materials, nozzle, build_volume):
+        self.id = id
+        self.name = name
+        self.materials = frozenset(materials)
+        self.nozzle = float(nozzle)
+        self.build_volume = tuple(float(b) for b in build_volume)
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(record["id"], record.get("name", record["id"]), record["materials"], record["nozzle"],
+                   record["build_volume"])
+
+    def can_print(self, job):
+        return (job.material in self.materials
+                and (job.nozzle is None or abs(job.nozzle - self.nozzle) < 1e-6)
+                and fits(job.size, self.build_volume))
+
+    def __repr__(self):
+        return f"Printer({self.id!r})"
+
+
+class PrintJob:
+    """A print waiting for, or assigned to, a printer; times are epoch seconds"""
+
+    __slots__ = ("id", "material", "size", "print_seconds", "nozzle", "release", "due")
+
+    def __init__(self, id, material, size, print_seconds, nozzle=None, release=0.0, due=None):
+        self.id = id
+        self.material = material
+        self.size = tuple(size)
+        self.print_seconds = print_seconds
+        self.nozzle = nozzle            # required nozzle diameter, or None for any
+        self.release = release          # earliest start
+        self.due = release + TURNAROUND if due is None else due
+
+    def __repr__(self):
+        return f"PrintJob({self.id!r}, {self.material!r}, {self.print_seconds / 3600:.1f}h)"
+
+
+def load_fleet(path=None):
+    """Printers from a JSON list (``HUB_PRINTERS_PATH``), or ``DEFAULT_FLEET``"""
+    path = path or os.environ.get("HUB_PRINTERS_PATH")
+    records = DEFAULT_FLEET
+    if path:
+        with open(path, encoding="utf-8") as f:
+            records = json.load(f)
+    return Fleet([Printer.from_dict(record) for record in records])
+
+
+def _timestamp(value):
+    """Epoch seconds from a number or an ISO date/time string"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def load_jobs(path):
+    """Historical jobs from a ``.csv`` or ``.json`` export
+
+    Fields: ``id``, ``material``, ``size_x``/``size_y``/``size_z`` (mm),
+    ``print_seconds``, ``submitted_at`` (epoch or ISO) and optional
+    ``nozzle`` and ``due_at``.
+    """
+    with open(path, encoding="utf-8", newline="") as f:
+        records = json.load(f) if path.endswith(".json") else list(csv.DictReader(f))
+    jobs = []
+    for record in records:
+        due = record.get("due_at")
+        nozzle = record.get("nozzle")
+        jobs.append(PrintJob(
+            record["id"],
+            record["material"],
+            (float(record["size_x"]), float(record["size_y"]), float(record["size_z"])),
+            float(record["print_seconds"]),
+            float(nozzle) if nozzle not in (None, "") else None,
+            _timestamp(record["submitted_at"]),
+            _timestamp(due) if due not in (None, "") else None,
+        ))
+    return jobs
+
+
+class Fleet:
+    """Printers plus the capable-printer lookup the scheduler uses per job"""
+
+    def __init__(self, printers):
+        self.printers = list(printers)
+        self.by_id = {printer.id: i for i, printer in enumerate(self.printers)}
+        # Build volumes sorted per printer, so a part fits where its sorted size is smaller on every axis
+        self._volumes = np.sort(np.array([p.build_volume for p in self.printers], dtype=np.float64).reshape(-1, 3), axis=1)
+        self._masks = {}
+
+    def __len__(self):
+        return len(self.printers)
+
+    def _mask(self, material, nozzle):
+        key = (material, nozzle)
+        mask = self._masks.get(key)
+        if mask is None:
+            mask = self._masks[key] = np.array([
+                material in p.materials and (nozzle is None or abs(nozzle - p.nozzle) < 1e-6) for p in self.printers
+            ], dtype=bool)
+        return mask
+
+    def capable(self, job):
+        """Indexes of the printers that can run ``job``, as a tuple"""
+        mask = self._mask(job.material, job.nozzle) & (self._volumes >= sorted(job.size)).all(axis=1)
+        return tuple(np.flatnonzero(mask).tolist())
+
+    def resized(self, n):
+        """A fleet of ``n`` printers cycling through this fleet's models (for sizing runs)"""
+        printers = []
+        for i in range(n):
+            model = self.printers[i % len(self.printers)]
+            printers.append(Printer(f"{model.id}.{i // len(self.printers)}", model.name, model.materials,
+                                    model.nozzle, model.build_volume))
+        return Fleet(printers)
+
+
+class Assignment:
+    """When and where one job runs; ``start`` is after any filament change"""
+
+    __slots__ = ("job", "printer", "start", "end", "changeover")
+
+    def __init__(self, job, printer, start, end, changeover):
+        self.job = job
+        self.printer = printer
+        self.start = start
+        self.end = end
+        self.changeover = changeover
+
+
+class Schedule:
+    """Result of one simulation run"""
+
+    def __init__(self, fleet, assignments, unschedulable, started_at):
+        self.fleet = fleet
+        self.assignments = assignments
+        self.unschedulable = unschedulable
+        self.started_at = started_at
+        self.by_job = {a.job.id: a for a in assignments}
+
+    @property
+    def makespan(self):
+        """Seconds from the start of the run to the last job's completion"""
+        return max((a.end for a in self.assignments), default=self.started_at) - self.started_at
+
+    @property
+    def changeovers(self):
+        return sum(a.changeover for a in self.assignments)
+
+    def report(self):
+        """Summary statistics for fleet sizing (hours and shares)"""
+        if not self.assignments:
+            return {"printers": len(self.fleet), "jobs": 0, "unschedulable": len(self.unschedulable)}
+        release = np.array([a.job.release for a in self.assignments])
+        start = np.array([a.start for a in self.assignments])
+        end = np.array([a.end for a in self.assignments])
+        due = np.array([a.job.due for a in self.assignments])
+        busy = np.zeros(len(self.fleet))
+        np.add.at(busy, [a.printer for a in self.assignments], end - start)
+        turnaround = (end - release) / 3600
+        wait = (start - release) / 3600
+        return {
+            "printers": len(self.fleet),
+            "jobs": len(self.assignments),
+            "unschedulable": len(self.unschedulable),
+            "makespan_hours": round(self.makespan / 3600, 2),
+            "changeovers": self.changeovers,
+            "utilization": round(float(busy.sum() / (len(self.fleet) * self.makespan)), 3) if self.makespan else 0.0,
+            "wait_p50_hours": round(float(np.percentile(wait, 50)), 2),
+            "wait_p95_hours": round(float(np.percentile(wait, 95)), 2),
+            "turnaround_p50_hours": round(float(np.percentile(turnaround, 50)), 2),
+            "turnaround_p95_hours": round(float(np.percentile(turnaround, 95)), 2),
+            "turnaround_max_hours": round(float(turnaround.max()), 2),
+            "on_time": round(float((end <= due).mean()), 3),
+        }
+
+
+_FINISH, _ARRIVAL = 0, 1   # printers free up before same-instant arrivals are placed
+
+
+def simulate(jobs, fleet, start=None, busy_until=None, loaded=None, changeover=CHANGEOVER_SECONDS,
+             bed_clear=BED_CLEAR_SECONDS, hold=MATERIAL_HOLD):
+    """Run ``jobs`` through the fleet and return a ``Schedule``
+
+    ``busy_until`` and ``loaded`` give each printer's state at ``start``
+    (``{printer_id: epoch seconds}`` / ``{printer_id: material}``); by default
+    every printer is idle and empty at the first release.
+    """
+    jobs = sorted(jobs, key=lambda job: job.release)
+    if start is None:
+        start = jobs[0].release if jobs else time.time()
+    busy_until = busy_until or {}
+    loaded = [(loaded or {}).get(p.id) for p in fleet.printers]
+
+    events = []
+    seq = 0
+    idle = set()
+    for i, printer in enumerate(fleet.printers):
+        free_at = busy_until.get(printer.id, start)
+        if free_at > start:
+            events.append((free_at, _FINISH, seq, i))
+            seq += 1
+        else:
+            idle.add(i)
+    for job in jobs:
+        events.append((max(job.release, start), _ARRIVAL, seq, job))
+        seq += 1
+    heapq.heapify(events)
+
+    waiting = {}    # (material, capable printers) -> heap of (due, -duration, seq, job)
+    assignments = []
+    unschedulable = []
+
+    def run(i, job, now):
+        nonlocal seq
+        switch = loaded[i] is not None and loaded[i] != job.material
+        begin = now + (changeover if switch else 0)
+        end = begin + job.print_seconds
+        loaded[i] = job.material
+        idle.discard(i)
+        assignments.append(Assignment(job, i, begin, end, switch))
+        heapq.heappush(events, (end + bed_clear, _FINISH, seq, i))
+        seq += 1
+
+    while events:
+        now, kind, order, subject = heapq.heappop(events)
+        if kind == _ARRIVAL:
+            job = subject
+            capable = fleet.capable(job)
+            if not capable:
+                unschedulable.append(job)
+                continue
+            free = [i for i in capable if i in idle]
+            if free:
+                best = min(free, key=lambda i: (loaded[i] != job.material, len(fleet.printers[i].materials), i))
+                run(best, job, now)
+            else:
+                heapq.heappush(waiting.setdefault((job.material, capable), []),
+                               (job.due, -job.print_seconds, order, job))
+            continue
+
+        i = subject
+        idle.add(i)
+        best_key, best_score = None, None
+        for key, heap in waiting.items():
+            material, capable = key
+            if i not in capable:
+                continue
+            score = heap[0][0] - (hold if material == loaded[i] else 0)
+            if best_score is None or (score, heap[0][1:3]) < best_score:
+                best_key, best_score = key, (score, heap[0][1:3])
+        if best_key is not None:
+            heap = waiting[best_key]
+            job = heapq.heappop(heap)[3]
+            if not heap:
+                del waiting[best_key]
+            run(i, job, now)
+
+    return Schedule(fleet, assignments, unschedulable, start)
+
+
+def synthetic_jobs(n, days=30, seed=7, start=None):
+    """Random jobs shaped like the shop's orders, for sizing runs without history"""
+    rng = random.Random(seed)
+    start = time.time() if start is None else start
+    materials = list(PRINT_MATERIALS)
+    weights = [{"PLA": 50, "PETG": 20, "ABS": 12, "TPU": 8, "Nylon": 10}.get(m, 5) for m in materials]
+    jobs = []
+    for i in range(n):
+        size = tuple(min(250.0, rng.lognormvariate(np.log(60), 0.6)) for _ in range(3))
+        jobs.append(PrintJob(
+            f"sim-{i}",
+            rng.choices(materials, weights)[0],
+            size,
+            min(30 * 3600, rng.lognormvariate(np.log(2 * 3600), 0.8)),
+            0.6 if rng.random() < 0.05 else None,
+            start + rng.random() * days * 86400,
+        ))
+    return jobs
+
+
+class JobQueue:
+    """SQLite-backed queue of print jobs shared by sessions and processes"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = connect(path)
+        with conn:
+            conn.executescript(SCHEMA)
+        conn.close()
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            conn.isolation_level = None  # explicit transactions only
+        return conn
+
+    def _write(self, sql, params):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            cursor = conn.execute(sql, params)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return cursor
+
+    @staticmethod
+    def _job(row, actual=False):
+        seconds = row["print_seconds"]
+        if actual and row["finished_at"] is not None:
+            seconds = row["finished_at"] - row["started_at"]
+        return PrintJob(row["id"], row["material"], (row["size_x"], row["size_y"], row["size_z"]), seconds,
+                        row["nozzle"], row["submitted_at"], row["due_at"])
+
+    def submit(self, material, size, print_seconds, customer_name="", customer_email="", total_cents=0,
+               quantity=1, nozzle=None, file_name="", now=None):
+        """Queue a quoted print and return its ``PrintJob``"""
+        now = time.time() if now is None else now
+        cursor = self._write(
+            "INSERT INTO print_jobs (material, size_x, size_y, size_z, print_seconds, nozzle, quantity, submitted_at, "
+            "due_at, status, customer_name, customer_email, total_cents, file_name) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (material, *size, print_seconds, nozzle, quantity, now, now + TURNAROUND, QUEUED, customer_name,
+             customer_email, total_cents, file_name),
+        )
+        return PrintJob(cursor.lastrowid, material, size, print_seconds, nozzle, now, now + TURNAROUND)
+
+    def start(self, job_id, printer_id, now=None):
+        """Mark a queued job as printing on a printer; returns whether it was queued"""
+        cursor = self._write(
+            "UPDATE print_jobs SET status = ?, printer_id = ?, started_at = ? WHERE id = ? AND status = ?",
+            (PRINTING, printer_id, time.time() if now is None else now, job_id, QUEUED),
+        )
+        return cursor.rowcount == 1
+
+    def finish(self, job_id, now=None):
+        cursor = self._write(
+            "UPDATE print_jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (DONE, time.time() if now is None else now, job_id, PRINTING),
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id):
+        cursor = self._write(
+            "UPDATE print_jobs SET status = ? WHERE id = ? AND status IN (?, ?)", (CANCELLED, job_id, QUEUED, PRINTING)
+        )
+        return cursor.rowcount == 1
+
+    def jobs(self, status=QUEUED):
+        rows = self._conn().execute("SELECT * FROM print_jobs WHERE status = ? ORDER BY id", (status,)).fetchall()
+        return [self._job(row) for row in rows]
+
+    def history(self, since=0.0):
+        """Finished jobs with their actual print durations, for replay in ``simulate``"""
+        rows = self._conn().execute(
+            "SELECT * FROM print_jobs WHERE status = ? AND submitted_at >= ? ORDER BY submitted_at", (DONE, since)
+        ).fetchall()
+        return [self._job(row, actual=True) for row in rows]
+
+    def plan(self, fleet, now=None, extra=()):
+        """Schedule the queued jobs (plus ``extra``) from the printers' current state"""
+        now = time.time() if now is None else now
+        busy_until, loaded = {}, {}
+        for row in self._conn().execute("SELECT * FROM print_jobs WHERE status = ?", (PRINTING,)):
+            busy_until[row["printer_id"]] = max(now, row["started_at"] + row["print_seconds"]) + BED_CLEAR_SECONDS
+            loaded[row["printer_id"]] = row["material"]
+        return simulate(self.jobs(QUEUED) + list(extra), fleet, start=now, busy_until=busy_until, loaded=loaded)
+
+    def estimate(self, fleet, material, size, print_seconds, now=None):
+        """Seconds from now until a new job would be finished, or ``None`` if no printer can run it"""
+        now = time.time() if now is None else now
+        job = PrintJob("estimate", material, size, print_seconds, release=now)
+        assignment = self.plan(fleet, now, extra=[job]).by_job.get("estimate")
+        return None if assignment is None else assignment.end - now
+
+
+def _print_plan(schedule):
+    printers = schedule.fleet.printers
+    for a in sorted(schedule.assignments, key=lambda a: (a.printer, a.start)):
+        start = datetime.fromtimestamp(a.start).strftime("%a %H:%M")
+        end = datetime.fromtimestamp(a.end).strftime("%a %H:%M")
+        swap = "  (filament change)" if a.changeover else ""
+        print(f"{printers[a.printer].id:10} job {a.job.id:<6} {a.job.material:6} {start} -> {end}{swap}")
+    for job in schedule.unschedulable:
+        print(f"{'-':10} job {job.id:<6} {job.material:6} no printer can run this job")
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Print-job queue and fleet scheduler")
+    parser.add_argument("--fleet", help="printer fleet JSON (default: HUB_PRINTERS_PATH or the built-in fleet)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("plan", help="show the planned schedule for the live queue")
+    start_cmd = sub.add_parser("start", help="mark a job as printing")
+    start_cmd.add_argument("job", type=int)
+    start_cmd.add_argument("printer")
+    finish_cmd = sub.add_parser("finish", help="mark a job as done")
+    finish_cmd.add_argument("job", type=int)
+    sim = sub.add_parser("simulate", help="replay jobs through fleets of different sizes")
+    source = sim.add_mutually_exclusive_group()
+    source.add_argument("--history", help="CSV/JSON job export to replay")
+    source.add_argument("--synthetic", type=int, default=600, help="number of random jobs (default)")
+    source.add_argument("--finished", action="store_true", help="replay the queue's finished jobs")
+    sim.add_argument("--days", type=float, default=30, help="spread of synthetic submissions")
+    sim.add_argument("--fleet-sizes", default="", help="comma-separated printer counts, e.g. 4,6,8")
+    sim.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    fleet = load_fleet(args.fleet)
+    if args.command == "simulate":
+        if args.history:
+            jobs = load_jobs(args.history)
+        elif args.finished:
+            jobs = JobQueue().history()
+        else:
+            jobs = synthetic_jobs(args.synthetic, args.days, args.seed)
+        sizes = [int(n) for n in args.fleet_sizes.split(",") if n] or [len(fleet)]
+        for n in sizes:
+            started = time.perf_counter()
+            schedule = simulate(jobs, fleet if n == len(fleet) else fleet.resized(n))
+            report = schedule.report()
+            report["simulated_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            print(json.dumps(report))
+        return
+
+    queue = JobQueue()
+    if args.command == "start":
+        if fleet.by_id.get(args.printer) is None:
+            parser.exit(1, f"Unknown printer {args.printer}\n")
+        ok = queue.start(args.job, args.printer)
+        print("started" if ok else f"job {args.job} is not queued")
+    elif args.command == "finish":
+        print("finished" if queue.finish(args.job) else f"job {args.job} is not printing")
+    else:
+        _print_plan(queue.plan(fleet))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,233 @@
+"""Per-session data with a compact cart, bounded chat and idle eviction.
+
+``st.session_state`` only keeps small scalars (current view, page, the
+session id, widget values). The parts of a session that grow - the cart,
+chat history and its rolling summary - live in a process-wide
+``SessionStore`` keyed by session id, so they can be measured and dropped
+when a tab goes idle. Finished invoices are not kept in the session at all;
+the session remembers the invoice number and reads it back from the order
+store.
+
+``Cart`` stores SKU indexes and quantities in two ``array`` columns instead
+of a dict of product-id strings. SKU indexes come from a process-wide
+registry, so they stay valid when the catalog is reloaded.
+"""
+import logging
+import sys
+import threading
+import time
+from array import array
+
+IDLE_TIMEOUT = 30 * 60      # seconds without a rerun before a session's data is evicted
+SWEEP_INTERVAL = 60         # seconds between idle sweeps
+MAX_CHAT_MESSAGES = 40      # messages kept verbatim; older ones live on in the chat summary
+
+logger = logging.getLogger(__name__)
+
+# -- SKU registry -------------------------------------------------------------
+
+_sku_ids = []
+_sku_index = {}
+_sku_lock = threading.Lock()
+
+
+def sku_index(product_id):
+    """Return the stable small integer for a product id"""
+    index = _sku_index.get(product_id)
+    if index is None:
+        with _sku_lock:
+            index = _sku_index.get(product_id)
+            if index is None:
+                index = _sku_index[product_id] = len(_sku_ids)
+                _sku_ids.append(product_id)
+    return index
+
+
+def sku_id(index):
+    return _sku_ids[index]
+
+
+class Cart:
+    """``{product_id: qty}``-like cart stored as two compact integer arrays"""
+
+    __slots__ = ("_skus", "_quantities")
+
+    def __init__(self, items=None):
+        self._skus = array("I")
+        self._quantities = array("H")
+        for product_id, quantity in (items or {}).items():
+            self[product_id] = quantity
+
+    def _find(self, product_id):
+        index = _sku_index.get(product_id)
+        if index is None:
+            return -1
+        try:
+            return self._skus.index(index)
+        except ValueError:
+            return -1
+
+    def get(self, product_id, default=0):
+        i = self._find(product_id)
+        return self._quantities[i] if i >= 0 else default
+
+    def __getitem__(self, product_id):
+        i = self._find(product_id)
+        if i < 0:
+            raise KeyError(product_id)
+        return self._quantities[i]
+
+    def __setitem__(self, product_id, quantity):
+        if quantity <= 0:
+            self.pop(product_id, None)
+            return
+        i = self._find(product_id)
+        if i >= 0:
+            self._quantities[i] = quantity
+        else:
+            self._skus.append(sku_index(product_id))
+            self._quantities.append(quantity)
+
+    def pop(self, product_id, default=None):
+        i = self._find(product_id)
+        if i < 0:
+            return default
+        quantity = self._quantities[i]
+        del self._skus[i]
+        del self._quantities[i]
+        return quantity
+
+    def __contains__(self, product_id):
+        return self._find(product_id) >= 0
+
+    def __len__(self):
+        return len(self._skus)
+
+    def __iter__(self):
+        return (sku_id(index) for index in self._skus)
+
+    def keys(self):
+        return list(self)
+
+    def values(self):
+        return list(self._quantities)
+
+    def items(self):
+        return [(sku_id(index), quantity) for index, quantity in zip(self._skus, self._quantities)]
+
+    def units(self):
+        return sum(self._quantities)
+
+    def clear(self):
+        del self._skus[:]
+        del self._quantities[:]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"Cart({self.to_dict()!r})"
+
+
+# -- Session data ---------------------------------------------------------------
+
+class SessionData:
+    """The growable part of one browser session"""
+
+    __slots__ = ("cart", "chat_messages", "chat_history_state", "chat_job", "stock_notice", "last_seen")
+
+    def __init__(self):
+        self.cart = Cart()
+        self.chat_messages = []
+        self.chat_history_state = {}
+        self.chat_job = None  # assistant.ChatJob streaming the reply to the last question
+        self.stock_notice = {}
+        self.last_seen = time.monotonic()
+
+
+def deep_sizeof(obj, seen=None):
+    """Approximate bytes reachable from ``obj`` (containers, slots objects, arrays)"""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__slots__") and not isinstance(obj, array):
+        size += sum(deep_sizeof(getattr(obj, name), seen) for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class SessionStore:
+    """Process-wide session data with idle eviction
+
+    ``on_evict(session_id, data)`` runs for every evicted session (e.g. to
+    release its stock reservations).
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, sweep_interval=SWEEP_INTERVAL, on_evict=None):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self.on_evict = on_evict
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self.evicted = 0
+        if sweep_interval:
+            threading.Thread(target=self._sweep_loop, name="session-sweeper", daemon=True).start()
+
+    def get(self, session_id):
+        """Return (creating if needed) a session's data and mark it active"""
+        with self._lock:
+            data = self._sessions.get(session_id)
+            if data is None:
+                data = self._sessions[session_id] = SessionData()
+        data.last_seen = time.monotonic()
+        return data
+
+    def drop(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sweep(self, now=None):
+        """Evict sessions idle longer than ``idle_timeout``; returns how many"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            idle = [sid for sid, data in self._sessions.items() if now - data.last_seen > self.idle_timeout]
+            evicted = [(sid, self._sessions.pop(sid)) for sid in idle]
+        for sid, data in evicted:
+            if self.on_evict is not None:
+                try:
+                    self.on_evict(sid, data)
+                except Exception:
+                    logger.exception("Session eviction hook failed for %s", sid)
+        self.evicted += len(evicted)
+        return len(evicted)
+
+    def report(self):
+        """Session count and memory footprint in bytes"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        sizes = [deep_sizeof(data) for data in sessions]
+        return {
+            "sessions": len(sizes),
+            "total_bytes": sum(sizes),
+            "mean_bytes": sum(sizes) // len(sizes) if sizes else 0,
+            "max_bytes": max(sizes, default=0),
+            "evicted": self.evicted,
+        }
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            evicted = self.sweep()
+            report = self.report()
+            logger.info(
+                "sessions=%d evicted=%d total_bytes=%d mean_bytes=%d max_bytes=%d",
+                report["sessions"], evicted, report["total_bytes"], report["mean_bytes"], report["max_bytes"],
+            )
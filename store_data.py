@@ -0,0 +1,166 @@
+"""Versioned, process-wide store data: catalog, prices and promotions.
+
+``StoreData`` loads the catalog (``$HUB_CATALOG_PATH`` or the built-in
+``FILAMENTS``), discount codes (``$HUB_DISCOUNTS_PATH`` or
+``pricing.DISCOUNT_CODES``) and promotion rules (``$HUB_PROMOTIONS_PATH``,
+see ``promotions.py``) once and hands every session the same immutable
+``Snapshot``. The source files are watched by modification time, at most
+every ``CHECK_INTERVAL`` seconds; when one changes, or a reload is requested,
+a new snapshot is built once with the next version number and sessions pick
+it up on their next rerun.
+
+A reload can be triggered without touching the data files, from any process:
+
+    python store_data.py reload
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import threading
+import time
+
+import pricing
+from catalog import load_catalog
+from orders import DATA_DIR
+from promotions import PromotionBook, UsageCounter
+
+CHECK_INTERVAL = 2.0  # seconds between source file checks
+RELOAD_STAMP = os.path.join(DATA_DIR, "store_data.reload")
+
+logger = logging.getLogger(__name__)
+
+
+def load_discount_codes(path=None):
+    """Read ``{code: rate}`` from a JSON object or a ``code,rate`` CSV, else the built-in codes"""
+    path = path or os.environ.get("HUB_DISCOUNTS_PATH")
+    if not path:
+        return dict(pricing.DISCOUNT_CODES)
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            return {row["code"]: float(row["rate"]) for row in csv.DictReader(f)}
+    with open(path, encoding="utf-8") as f:
+        return {code: float(rate) for code, rate in json.load(f).items()}
+
+
+def load_promotions(path=None):
+    """Read promotion rule dicts from a JSON list (or ``{"promotions": [...]}``)"""
+    path = path or os.environ.get("HUB_PROMOTIONS_PATH")
+    if not path:
+        return []
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data["promotions"] if isinstance(data, dict) else data
+
+
+class Snapshot:
+    """One immutable version of the store data"""
+
+    __slots__ = ("version", "catalog", "discount_codes", "promotions", "pricing", "loaded_at")
+
+    def __init__(self, version, catalog, discount_codes, promotions=(), usage=None):
+        self.version = version
+        self.catalog = catalog
+        self.discount_codes = discount_codes
+        # Rules are compiled once per version; usage counts outlive versions
+        self.promotions = PromotionBook.from_discount_codes(discount_codes, promotions, usage=usage)
+        self.pricing = pricing.PricingEngine(discount_codes=discount_codes, promotions=self.promotions)
+        self.loaded_at = time.time()
+
+
+def _signature(paths):
+    """Modification stamp of each source file (``None`` if missing)"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class StoreData:
+    """Shared holder of the current ``Snapshot``, rebuilt when its sources change"""
+
+    def __init__(self, catalog_path=None, discounts_path=None, promotions_path=None, reload_stamp=RELOAD_STAMP,
+                 check_interval=CHECK_INTERVAL, usage=None):
+        self.catalog_path = catalog_path or os.environ.get("HUB_CATALOG_PATH")
+        self.discounts_path = discounts_path or os.environ.get("HUB_DISCOUNTS_PATH")
+        self.promotions_path = promotions_path or os.environ.get("HUB_PROMOTIONS_PATH")
+        self.check_interval = check_interval
+        self.usage = usage if usage is not None else UsageCounter()
+        self._watched = [p for p in (self.catalog_path, self.discounts_path, self.promotions_path, reload_stamp) if p]
+        self._lock = threading.Lock()
+        self._checked_at = time.monotonic()
+        self._signature = _signature(self._watched)
+        self._snapshot = self._load(1)
+
+    def _load(self, version):
+        return Snapshot(
+            version,
+            load_catalog(self.catalog_path),
+            load_discount_codes(self.discounts_path),
+            load_promotions(self.promotions_path),
+            self.usage,
+        )
+
+    @property
+    def version(self):
+        return self._snapshot.version
+
+    def snapshot(self):
+        """Return the current snapshot, rebuilding it first if a source changed"""
+        if time.monotonic() - self._checked_at >= self.check_interval:
+            with self._lock:
+                if time.monotonic() - self._checked_at >= self.check_interval:
+                    self._checked_at = time.monotonic()
+                    signature = _signature(self._watched)
+                    if signature != self._signature:
+                        self._swap(signature)
+        return self._snapshot
+
+    def reload(self):
+        """Rebuild the snapshot now and return it"""
+        with self._lock:
+            self._swap(_signature(self._watched))
+        return self._snapshot
+
+    def _swap(self, signature):
+        # A file caught mid-write fails to parse; keep serving the old
+        # version and retry on the next check.
+        try:
+            snapshot = self._load(self._snapshot.version + 1)
+        except (OSError, ValueError, KeyError):
+            logger.warning("Store data reload failed; keeping version %d", self._snapshot.version, exc_info=True)
+            return
+        self._signature = signature
+        self._snapshot = snapshot
+
+
+def request_reload(stamp=RELOAD_STAMP):
+    """Ask every running app process to reload its store data"""
+    os.makedirs(os.path.dirname(stamp), exist_ok=True)
+    tmp = f"{stamp}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(str(time.time_ns()))
+    os.replace(tmp, stamp)
+
+
+def main():
+    """Command-line entry point"""
+    parser = argparse.ArgumentParser(description="Manage the shared store data")
+    parser.add_argument("command", choices=["reload", "show"])
+    args = parser.parse_args()
+
+    if args.command == "reload":
+        request_reload()
+        print(f"Reload requested; running apps pick it up within {CHECK_INTERVAL:g}s")
+    else:
+        snapshot = StoreData().snapshot()
+        print(f"{len(snapshot.catalog)} products, {len(snapshot.promotions)} promotions")
+
+
+if __name__ == "__main__":
+    main()
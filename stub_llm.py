@@ -0,0 +1,167 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Serves ``POST /v1/chat/completions`` in both the plain JSON and the
+``stream=True`` server-sent-events shape, replying with a canned answer a few
+tokens at a time. Point the assistant at it to exercise streaming, latency
+measurement and load tests without an API key or network access:
+
+    python stub_llm.py --port 8001 --token-delay 0.02
+
+and in ``.streamlit/secrets.toml``:
+
+    OpenAI_Key = "stub"
+    OpenAI_Base_URL = "http://127.0.0.1:8001/v1"
+"""
+import argparse
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = (
+    "For ABS, print at 230-250°C with the bed at 100°C inside an enclosure. "
+    "Keep the room draft-free, use a brim for large parts and slow the first "
+    "layer down to improve adhesion. Turn the part cooling fan off or keep it "
+    "below 20%."
+)
+
+
+def _tokens(text):
+    """Split a reply into word-sized chunks the way a model would stream it"""
+    words = text.split(" ")
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+
+def _usage(messages, reply):
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+    completion_tokens = len(_tokens(reply))
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Request handler; reply text and timings come from the server instance"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_error(404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        messages = body.get("messages", [])
+        model = body.get("model", "stub")
+        reply = self.server.reply
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        self.server.request_count += 1
+
+        time.sleep(self.server.first_token_delay)
+
+        if not body.get("stream"):
+            time.sleep(self.server.token_delay * len(_tokens(reply)))
+            payload = json.dumps({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": reply},
+                    "finish_reason": "stop",
+                }],
+                "usage": _usage(messages, reply),
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def send(data):
+            event = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        try:
+            send(chunk({"role": "assistant", "content": ""}))
+            for token in _tokens(reply):
+                send(chunk({"content": token}))
+                time.sleep(self.server.token_delay)
+            send(chunk({}, "stop"))
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send(json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": _usage(messages, reply),
+                }))
+            send("[DONE]")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream
+            pass
+
+
+def start_stub_server(host="127.0.0.1", port=0, reply=DEFAULT_REPLY, first_token_delay=0.05, token_delay=0.01, verbose=False):
+    """Start the stub in a daemon thread; returns the server (``server.base_url`` for clients)"""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.reply = reply
+    server.first_token_delay = first_token_delay
+    server.token_delay = token_delay
+    server.verbose = verbose
+    server.request_count = 0
+    server.base_url = f"http://{host}:{server.server_address[1]}/v1"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Command-line entry point: run the stub in the foreground"""
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible chat completions stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="Seconds between streamed tokens")
+    parser.add_argument("--reply", default=DEFAULT_REPLY, help="Canned reply text")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.host, args.port, args.reply, args.first_token_delay, args.token_delay, verbose=True)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
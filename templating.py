@@ -0,0 +1,252 @@
+"""Small HTML templating layer for the Streamlit views.
+
+Templates are plain ``str.format`` strings compiled once at import. Lists are
+rendered with a single ``"".join`` instead of repeated concatenation, and
+rendered fragments are memoized in a process-wide LRU keyed by a hash of the
+template and its values, so an unchanged chat message or invoice section is
+formatted once and then served from memory on every rerun.
+
+Template source is kept free of blank lines and leading indentation so
+``st.markdown`` treats it as one HTML block rather than Markdown code.
+"""
+import hashlib
+import html
+import threading
+from collections import OrderedDict
+
+FRAGMENT_CACHE_SIZE = 4096
+
+
+class Template:
+    """A named, precompiled format template"""
+
+    __slots__ = ("name", "render")
+
+    def __init__(self, name, source):
+        self.name = name
+        source = "".join(line.strip() for line in source.strip().splitlines())
+        self.render = source.format
+
+    def __call__(self, **values):
+        return self.render(**values)
+
+
+class FragmentCache:
+    """Thread-safe LRU of rendered fragments keyed by content hash"""
+
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(template, values):
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(template.name.encode())
+        for name in sorted(values):
+            digest.update(b"\0" + name.encode() + b"\1" + str(values[name]).encode())
+        return digest.digest()
+
+    def render(self, template, **values):
+        key = self.key(template, values)
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        fragment = template(**values)
+        with self._lock:
+            self._entries[key] = fragment
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self):
+        """Return hit/miss counters plus size and hit rate"""
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+
+fragments = FragmentCache()
+
+
+def render(template, **values):
+    """Render a template through the shared fragment cache"""
+    return fragments.render(template, **values)
+
+
+def escape(value):
+    return html.escape(str(value))
+
+
+# -- Chat ---------------------------------------------------------------------
+
+USER_BUBBLE = Template("chat.user", """
+    <div style="background: #4f46e5; color: white; padding: 1rem; border-radius: 8px; margin: 0.5rem 0; max-width: 80%; margin-left: auto;">
+        <strong>You:</strong><br>{content}
+    </div>
+""")
+
+ASSISTANT_BUBBLE = Template("chat.assistant", """
+    <div style="background: white; padding: 1rem; border-radius: 8px; margin: 0.5rem 0; max-width: 80%; border: 1px solid #e5e7eb;">
+        <strong>AI Assistant:</strong><br>{content}
+    </div>
+""")
+
+CHAT_META = Template("chat.meta", """
+    <div class="chat-meta">{caption}</div>
+""")
+
+
+def chat_bubble(role, content):
+    """HTML for one chat bubble (not cached; used for the live streaming reply)"""
+    return (USER_BUBBLE if role == "user" else ASSISTANT_BUBBLE)(content=content)
+
+
+def chat_caption(message):
+    """Timing/caching note shown under an assistant reply, or ``""``"""
+    if message.get("cached") == "knowledge":
+        return f"📚 From our material guide · {message['latency'] * 1000:.0f} ms"
+    if message.get("cached"):
+        match = "same question" if message["cached"] == "exact" else "similar question"
+        return f"⚡ Cached answer ({match}) · {message['latency'] * 1000:.0f} ms"
+    if message.get("latency") is not None:
+        ttft = f"{message['ttft']:.2f}s" if message.get("ttft") is not None else "n/a"
+        caption = f"⚡ First token {ttft} · total {message['latency']:.2f}s"
+        if message.get("prompt_tokens") is not None:
+            caption += f" · {message['prompt_tokens']} prompt + {message['completion_tokens']} completion tokens"
+        return caption
+    return ""
+
+
+def chat_message(message):
+    """Cached HTML for one stored chat message, including its caption"""
+    html_ = render(USER_BUBBLE if message["role"] == "user" else ASSISTANT_BUBBLE, content=message["content"])
+    caption = chat_caption(message)
+    return html_ + render(CHAT_META, caption=caption) if caption else html_
+
+
+def chat_history(messages):
+    """HTML for a whole conversation, joined in one pass"""
+    return "".join([chat_message(message) for message in messages])
+
+
+# -- Invoice ------------------------------------------------------------------
+
+INVOICE_HEADER = Template("invoice.header", """
+    <div class="invoice-header">
+        <h1>🖨️ 3D PRINTING HUB</h1>
+        <p>Professional 3D Printing Services & Premium Filaments</p>
+        <p style="font-size: 1.1rem; font-weight: 600;">Invoice #{invoice_number} | {date}</p>
+    </div>
+""")
+
+INVOICE_PARTIES = Template("invoice.parties", """
+    <div class="invoice-columns">
+        <div>
+            <h3 class="section-header">📋 Bill To</h3>
+            <div class="info-box">
+                <p><strong>Name:</strong> {customer_name}</p>
+                <p><strong>Email:</strong> {customer_email}</p>
+                <p><strong>Phone:</strong> {customer_phone}</p>
+                <p><strong>Address:</strong> {customer_address}</p>
+            </div>
+        </div>
+        <div>
+            <h3 class="section-header">📦 Order Details</h3>
+            <div class="info-box">
+                <p><strong>Type:</strong> {order_type}</p>
+                <p><strong>Date:</strong> {date}</p>
+                <p><strong>Terms:</strong> Due on Receipt</p>
+                <p><strong>Status:</strong> <span style="color: #f59e0b; font-weight: 600;">⏳ Pending Payment</span></p>
+            </div>
+        </div>
+    </div>
+""")
+
+INVOICE_ITEMS = Template("invoice.items", """
+    <h3 class="section-header">🛒 Items</h3>
+    <table class="invoice-table">
+        <thead>
+            <tr><th>Description</th><th>Quantity</th><th>Unit Price</th><th>Total</th></tr>
+        </thead>
+        <tbody>{rows}</tbody>
+    </table>
+""")
+
+INVOICE_ITEM_ROW = Template("invoice.item_row", """
+    <tr><td>{description}</td><td>{quantity}</td><td>${unit_price:.2f}</td><td>${total:.2f}</td></tr>
+""")
+
+INVOICE_SUMMARY = Template("invoice.summary", """
+    <div class="invoice-summary">
+        <h3 class="section-header">💰 Summary</h3>
+        <div style="font-size: 1.1rem; line-height: 2;">{rows}</div>
+        <div class="total-box"><h2>TOTAL: ${total:.2f} SGD</h2></div>
+    </div>
+""")
+
+INVOICE_SUMMARY_ROW = Template("invoice.summary_row", """
+    <p{style}><strong>{label}:</strong> <span style="float: right;">{amount}</span></p>
+""")
+
+INVOICE_PAYMENT = Template("invoice.payment", """
+    <div class="payment-info">
+        <h4>💳 Payment Information</h4>
+        <p><strong>Thank you for your business!</strong></p>
+        <p>Payment Instructions: Please transfer to <strong>DBS Singapore</strong></p>
+        <p>Account Number: <strong>123-456789-0</strong></p>
+        <p>Reference: <strong>Invoice #{invoice_number}</strong></p>
+        <hr style="border-color: #0ea5e9; margin: 1rem 0;">
+        <p style="font-size: 0.9rem; color: #0369a1;">3D Printing Hub | contact@3dprintinghub.sg | +65 9876 5432</p>
+    </div>
+""")
+
+
+def invoice(invoice_data):
+    """HTML for the on-screen invoice; each section is rendered once per distinct content"""
+    rows = "".join([
+        render(
+            INVOICE_ITEM_ROW,
+            description=escape(item["description"]),
+            quantity=item["quantity"],
+            unit_price=item["unit_price"],
+            total=item["total"],
+        )
+        for item in invoice_data["items"]
+    ])
+    summary = [("Subtotal", f"${invoice_data['subtotal']:.2f}", "")]
+    if invoice_data.get("shipping", 0) > 0:
+        summary.append(("Shipping", f"${invoice_data['shipping']:.2f}", ""))
+    if invoice_data.get("tax", 0) > 0:
+        summary.append(("Tax (9%)", f"${invoice_data['tax']:.2f}", ""))
+    if invoice_data.get("discount", 0) > 0:
+        summary.append((f"Discount ({escape(invoice_data['discount_code'])})", f"-${invoice_data['discount']:.2f}", ' style="color: #10b981;"'))
+    summary_rows = "".join([render(INVOICE_SUMMARY_ROW, label=label, amount=amount, style=style) for label, amount, style in summary])
+
+    return "".join([
+        render(INVOICE_HEADER, invoice_number=escape(invoice_data["invoice_number"]), date=escape(invoice_data["date"])),
+        render(
+            INVOICE_PARTIES,
+            customer_name=escape(invoice_data["customer_name"]),
+            customer_email=escape(invoice_data["customer_email"]),
+            customer_phone=escape(invoice_data["customer_phone"]),
+            customer_address=", ".join(escape(line) for line in invoice_data["customer_address"].split("<br>")),
+            order_type=escape(invoice_data["order_type"]),
+            date=escape(invoice_data["date"]),
+        ),
+        render(INVOICE_ITEMS, rows=rows),
+        render(INVOICE_SUMMARY, rows=summary_rows, total=invoice_data["total"]),
+        render(INVOICE_PAYMENT, invoice_number=escape(invoice_data["invoice_number"])),
+    ])
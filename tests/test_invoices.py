@@ -0,0 +1,54 @@
+import threading
+import time
+from concurrent.futures import Future
+
+from invoices import InvoiceRenderer
+
+
+def invoice(number):
+    return {
+        "invoice_number": number, "date": "January 01, 2025", "created_at": "2025-01-01T10:00:00",
+        "customer_name": "Ann", "customer_email": "ann@example.com", "customer_phone": "+65 5555 0100",
+        "customer_address": "1 Example Road<br>Singapore 000001", "order_type": "Filament Order",
+        "items": [{"description": "PLA Filament - White", "quantity": 2, "unit_price": 25.0, "total": 50.0}],
+        "subtotal": 50.0, "shipping": 5.0, "tax": 4.5, "discount": 0.0, "discount_code": "", "total": 59.5,
+    }
+
+
+def submit_all(renderer, invoices, timeout=10):
+    """Submit from another thread so a deadlock fails the test instead of hanging it"""
+    futures = []
+    thread = threading.Thread(target=lambda: futures.extend(renderer.submit(data) for data in invoices), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), "submit deadlocked"
+    return futures
+
+
+def test_submitted_invoices_finish_and_are_forgotten(tmp_path):
+    renderer = InvoiceRenderer(out_dir=str(tmp_path), max_workers=2)
+    futures = submit_all(renderer, [invoice("INV-20250101-000001"), invoice("INV-20250101-000002")])
+    for future in futures:
+        assert len(future.result(timeout=10)) == len(renderer.formats)
+    # Done callbacks run just after result() returns
+    deadline = time.monotonic() + 5
+    while renderer._inflight and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert renderer._inflight == {}
+    assert (tmp_path / "INV-20250101-000002.pdf").exists()
+
+
+class DonePool:
+    """Stands in for the pool when a render finishes before its callback is registered"""
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_render_finished_before_callback_does_not_deadlock(tmp_path):
+    renderer = InvoiceRenderer(out_dir=str(tmp_path))
+    renderer._pool = DonePool()
+    submit_all(renderer, [invoice("INV-20250101-000003"), invoice("INV-20250101-000004")])
+    assert renderer._inflight == {}
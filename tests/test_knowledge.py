@@ -0,0 +1,31 @@
+import pytest
+
+from knowledge import KnowledgeBase
+
+
+@pytest.fixture(scope="module")
+def kb():
+    return KnowledgeBase()
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("nozzle temp for PETG?", "Nozzle temperature"),
+    ("What's the best nozzle temperature for TPU?", "Nozzle temperature"),
+    ("ABS bed temperature?", "Bed temperature"),
+    ("Does ABS need an enclosure?", "Enclosure"),
+    ("Do I need to dry nylon?", "Drying"),
+])
+def test_direct_answer_for_spec_lookups(kb, question, expected):
+    answer = kb.direct_answer(question)
+    assert answer is not None and expected in answer
+
+
+@pytest.mark.parametrize("question", [
+    "What temperature does PLA soften at?",
+    "How do I stop ABS warping without an enclosure?",
+    "Why does my PLA string at high temperature?",
+    "How do I fix PETG stringing at this temperature?",
+    "Nozzle temperature for PLA or PETG?",
+])
+def test_troubleshooting_questions_go_to_the_model(kb, question):
+    assert kb.direct_answer(question) is None
@@ -0,0 +1,32 @@
+from datetime import datetime
+
+import pytest
+
+from promotions import Rule
+
+WEEK = {"id": "pla-week", "code": "PLA10", "value": 0.10, "starts": "2025-03-01", "ends": "2025-03-08"}
+
+
+def test_date_only_end_covers_the_last_day():
+    rule = Rule(WEEK)
+    assert rule.active(datetime(2025, 3, 1))
+    assert rule.active(datetime(2025, 3, 8, 12))
+    assert rule.active(datetime(2025, 3, 8, 23, 59, 59))
+    assert not rule.active(datetime(2025, 3, 9))
+    assert not rule.active(datetime(2025, 2, 28, 23, 59))
+
+
+def test_timestamp_end_is_inclusive():
+    rule = Rule(dict(WEEK, ends="2025-03-08T12:00:00"))
+    assert rule.active(datetime(2025, 3, 8, 12))
+    assert not rule.active(datetime(2025, 3, 8, 12, 0, 1))
+
+
+def test_max_uses_from_text_is_an_integer():
+    assert Rule(dict(WEEK, max_uses="500")).max_uses == 500
+
+
+@pytest.mark.parametrize("field, value", [("code", 10), ("max_uses", "lots")])
+def test_invalid_fields_raise_value_error_naming_the_rule(field, value):
+    with pytest.raises(ValueError, match="pla-week"):
+        Rule(dict(WEEK, **{field: value}))